@@ -0,0 +1,76 @@
+"""
+Бенчмарк бэкендов графиков: matplotlib против лёгкого рендерера на Pillow
+
+Запуск из корня проекта:
+    python -m benchmarks.chart_backends [рендеров]
+
+Каждый бэкенд измеряется в отдельном свежем процессе: холодный старт
+(импорт + первый рендер), среднее время рисования и кодирования под
+CHART_TARGET_WIDTH / CHART_MAX_BYTES, пиковый RSS и размер файла.
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+import warnings
+
+BACKENDS = ("matplotlib", "pillow")
+
+
+def measure(backend: str, renders: int) -> dict:
+    """Измерения внутри дочернего процесса"""
+    warnings.filterwarnings("ignore")  # нет глифов эмодзи в шрифте
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    from benchmarks.chart_render import sample_args
+    from config import CHART_TARGET_WIDTH, CHART_MAX_BYTES, CHART_FORMATS
+    from utils.charts import get_range_chart_drawer
+    from utils.image_encoding import encode_chart
+    from utils.series import build_week_series
+
+    water, food, workouts, water_goal, calorie_goal, *today = sample_args()
+    series = {**build_week_series(water, food, workouts, *today), 'bucket': 'day'}
+    drawer = get_range_chart_drawer(backend)
+    image = drawer(series, water_goal, calorie_goal, width=CHART_TARGET_WIDTH)
+    encoded = encode_chart(image, CHART_MAX_BYTES, CHART_FORMATS)
+    cold_start = time.perf_counter() - start
+
+    draw_total = encode_total = 0.0
+    for _ in range(renders):
+        start = time.perf_counter()
+        image = drawer(series, water_goal, calorie_goal, width=CHART_TARGET_WIDTH)
+        draw_total += time.perf_counter() - start
+        encode_total += encode_chart(image, CHART_MAX_BYTES, CHART_FORMATS)["encode_seconds"]
+
+    return {
+        "cold_start_ms": cold_start * 1000,
+        "render_ms": draw_total / renders * 1000,
+        "encode_ms": encode_total / renders * 1000,
+        "rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+        "file_kb": len(encoded["data"]) / 1024,
+        "format": encoded["format"],
+    }
+
+
+def main() -> None:
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'бэкенд':<12}{'холодный старт':>16}{'рендер':>10}{'кодирование':>13}"
+          f"{'+RSS':>10}{'файл':>16}")
+    for backend in BACKENDS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.chart_backends", "--child", backend, str(renders)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        r = json.loads(output)
+        print(f"{backend:<12}{r['cold_start_ms']:>13.0f} мс{r['render_ms']:>7.1f} мс"
+              f"{r['encode_ms']:>10.1f} мс{r['rss_mb']:>7.1f} МБ"
+              f"{r['file_kb']:>7.1f} КБ ({r['format']})")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(measure(sys.argv[2], int(sys.argv[3]))))
+    else:
+        main()
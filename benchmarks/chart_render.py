@@ -0,0 +1,63 @@
+"""
+Бенчмарк рендеринга графиков: рендеров в секунду на одно ядро
+
+Запуск из корня проекта:
+    python -m benchmarks.chart_render [секунд] [потоков]
+
+Сначала график рендерится в одном потоке (рендеров/с на ядро, CPU-время
+на рендер), затем из нескольких потоков одновременно — это проверка того,
+что шаблоны фигур не разделяются между потоками.
+"""
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from utils.charts import create_combined_progress_chart
+
+
+def sample_args() -> tuple:
+    """Данные за неделю, похожие на реальные"""
+    today = date.today()
+    water = [{'date': (today - timedelta(days=i)).isoformat(), 'amount': 1500 + i * 150}
+             for i in range(1, 7)]
+    food = [{'date': (today - timedelta(days=i)).isoformat(), 'calories': 1800 + i * 90}
+            for i in range(1, 7)]
+    workouts = [{'date': (today - timedelta(days=i)).isoformat(), 'calories': 300}
+                for i in range(1, 7, 2)]
+    return water, food, workouts, 2500, 2100, 900, 1200, 250
+
+
+def run(seconds: float) -> tuple:
+    """Рендерить в текущем потоке заданное время: (рендеров, CPU-секунд, байт)"""
+    args = sample_args()
+    create_combined_progress_chart(*args)  # создание шаблона не учитываем
+    count, size = 0, 0
+    cpu_start = time.thread_time()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        size = len(create_combined_progress_chart(*args).getvalue())
+        count += 1
+    return count, time.thread_time() - cpu_start, size
+
+
+def main() -> None:
+    warnings.filterwarnings("ignore")  # нет глифов эмодзи в шрифте
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    count, cpu, size = run(seconds)
+    print(f"1 поток:  {count / seconds:.1f} рендеров/с, "
+          f"{cpu / count * 1000:.1f} мс CPU на рендер, PNG {size // 1024} КБ")
+    print(f"          {count / cpu:.1f} рендеров/с на ядро")
+
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(run, [seconds] * threads))
+    total = sum(r[0] for r in results)
+    print(f"{threads} потока: {total / seconds:.1f} рендеров/с суммарно "
+          f"(все рендеры завершились без ошибок)")
+
+
+if __name__ == "__main__":
+    main()
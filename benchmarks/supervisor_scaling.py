@@ -0,0 +1,75 @@
+"""
+Бенчмарк супервизора: обновлений в секунду в зависимости от числа процессов
+
+Запуск из корня проекта:
+    python -m benchmarks.supervisor_scaling [обновлений] [процессов через запятую]
+
+Супервизор получает обновления из фальшивого Bot API (см.
+benchmarks.webhook_load) и раздаёт их рабочим процессам. Обновления
+выдаются после запуска процессов, поэтому время старта не учитывается.
+Рост пропускной способности ограничен числом ядер машины.
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+from benchmarks.webhook_load import FakeBotAPI, TOKEN, free_port, make_update
+
+# Сколько ждать запуска рабочих процессов перед выдачей обновлений (сек)
+WARMUP_SECONDS = 5.0
+
+
+async def measure(workers: int, count: int) -> float:
+    from supervisor import run_supervisor
+
+    api = FakeBotAPI([], rtt=0)
+    api.expected = count
+    port = free_port()
+    runner = web.AppRunner(api.app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    task = asyncio.create_task(run_supervisor(workers, f"http://127.0.0.1:{port}"))
+    await asyncio.sleep(WARMUP_SECONDS)
+    start = time.perf_counter()
+    api.pending = [make_update(i) for i in range(count)]
+    done = asyncio.create_task(api.done.wait())
+    await asyncio.wait([task, done], return_when=asyncio.FIRST_COMPLETED)
+    if task.done():
+        task.result()  # супервизор упал — показываем ошибку
+    elapsed = time.perf_counter() - start
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await runner.cleanup()
+    return count / elapsed
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    counts = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 2, 4]
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        "BOT_TOKEN": TOKEN,
+        "WEATHER_API_KEY": os.environ.get("WEATHER_API_KEY", "benchmark"),
+        "DATABASE_PATH": os.path.join(tmp, "bench.db"),
+        # У фальшивого API нет лимитов: измеряется сам супервизор
+        "OUTBOUND_GLOBAL_RATE": "100000/1",
+    })
+    logging.disable(logging.WARNING)
+
+    print(f"{count} обновлений, ядер: {os.cpu_count()}")
+    print(f"{'процессов':<12}{'обновлений/с':>15}")
+    for workers in counts:
+        rate = asyncio.run(measure(workers, count))
+        print(f"{workers:<12}{rate:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Нагрузочный тест приёма обновлений: polling против webhook
+
+Запуск из корня проекта:
+    python -m benchmarks.webhook_load [обновлений] [задержка сети, мс] [соединений]
+
+Вместо Telegram поднимается локальный фальшивый Bot API: он отдаёт
+обновления через getUpdates (polling) или сам отправляет их POST-запросами
+на webhook по нескольким keep-alive соединениям, как это делает Telegram.
+Каждое обновление — команда /help, ответ на неё (sendMessage) тоже приходит
+в фальшивый API. Замеряется время от первого обновления до последнего
+ответа. Каждый режим выполняется в отдельном процессе.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from aiohttp import ClientSession, TCPConnector, web
+
+TOKEN = "1:benchmark"
+SECRET = "benchmark_secret"
+MODES = ("polling", "webhook")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_update(i: int) -> Dict[str, Any]:
+    user = {"id": 1000 + i % 500, "is_bot": False, "first_name": "Test"}
+    return {
+        "update_id": i + 1,
+        "message": {
+            "message_id": i + 1,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": "/help",
+        },
+    }
+
+
+class FakeBotAPI:
+    """Фальшивый Bot API: очередь getUpdates и счётчик ответов бота"""
+
+    def __init__(self, updates: List[Dict[str, Any]], rtt: float):
+        self.pending = list(updates)
+        self.expected = len(updates)
+        self.rtt = rtt
+        self.replies = 0
+        self.done = asyncio.Event()
+        self.app = web.Application()
+        self.app.router.add_post(f"/bot{TOKEN}/{{method}}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        method = request.match_info["method"].lower()
+        if request.content_type == "application/json":
+            form = await request.json()
+        else:
+            form = await request.post()
+        result: Any = True
+
+        if method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "getupdates":
+            offset = int(form.get("offset", 0) or 0)
+            self.pending = [u for u in self.pending if u["update_id"] >= offset]
+            limit = int(form.get("limit", 100) or 100)
+            result = self.pending[:limit]
+            if not result:
+                await asyncio.sleep(0.05)
+        elif method == "sendmessage":
+            self.replies += 1
+            if self.replies >= self.expected:
+                self.done.set()
+            chat_id = int(form["chat_id"])
+            result = {"message_id": self.replies, "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "text": form.get("text", "")}
+
+        return web.json_response({"ok": True, "result": result})
+
+
+async def send_webhooks(updates: List[Dict[str, Any]], url: str,
+                        connections: int, rtt: float) -> None:
+    """Доставить обновления на webhook по нескольким keep-alive соединениям"""
+    queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async with ClientSession(connector=TCPConnector(limit=connections)) as session:
+        async def sender() -> None:
+            while not queue.empty():
+                update = queue.get_nowait()
+                if rtt:
+                    await asyncio.sleep(rtt)
+                async with session.post(url, json=update,
+                                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as r:
+                    await r.read()
+
+        await asyncio.gather(*(sender() for _ in range(connections)))
+
+
+async def measure(mode: str, count: int, rtt: float, connections: int) -> Dict[str, float]:
+    """Измерения внутри дочернего процесса"""
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from bot import create_dispatcher
+
+    logging.disable(logging.WARNING)
+    updates = [make_update(i) for i in range(count)]
+    api = FakeBotAPI(updates if mode == "polling" else [], rtt)
+    api.expected = count
+
+    api_port = free_port()
+    runner = web.AppRunner(api.app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", api_port).start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{api_port}"))
+    bot = Bot(TOKEN, session=session)
+    dp = create_dispatcher()
+
+    start = time.perf_counter()
+    if mode == "polling":
+        task = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+        await api.done.wait()
+        elapsed = time.perf_counter() - start
+        await dp.stop_polling()
+        await task
+    else:
+        from config import WEBHOOK_PATH, WEBHOOK_PORT
+        from webhook import run_webhook
+
+        task = asyncio.create_task(run_webhook(dp, bot))
+        await asyncio.sleep(0.5)  # сервер поднимается
+        start = time.perf_counter()
+        await send_webhooks(updates, f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}",
+                            connections, rtt)
+        await api.done.wait()
+        elapsed = time.perf_counter() - start
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    await bot.session.close()
+    await runner.cleanup()
+    return {"seconds": elapsed, "updates_per_second": count / elapsed}
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rtt_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    connections = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+
+    print(f"{count} обновлений, задержка сети {rtt_ms:.0f} мс, соединений webhook {connections}")
+    print(f"{'режим':<10}{'время':>10}{'обновлений/с':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "BOT_TOKEN": TOKEN,
+            "WEATHER_API_KEY": os.environ.get("WEATHER_API_KEY", "benchmark"),
+            "DATABASE_PATH": os.path.join(tmp, "bench.db"),
+            "WEBHOOK_URL": "http://127.0.0.1",
+            "WEBHOOK_SECRET": SECRET,
+            "WEBHOOK_HOST": "127.0.0.1",
+            "WEBHOOK_PORT": str(free_port()),
+        }
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.webhook_load", "--child", mode,
+                 str(count), str(rtt_ms), str(connections)],
+                capture_output=True, text=True, check=True, env=env
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<10}{r['seconds']:>8.2f} с{r['updates_per_second']:>15.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        result = asyncio.run(measure(sys.argv[2], int(sys.argv[3]),
+                                     float(sys.argv[4]) / 1000, int(sys.argv[5])))
+        print(json.dumps(result))
+    else:
+        main()
@@ -1,51 +1,117 @@
 import asyncio
 import logging
-import sys
-from datetime import datetime
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import BotCommand
+from aiogram.types import BotCommand, CallbackQuery, Message
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, BOT_MODE, THROTTLE_RATES, DIGEST_ENABLED, TRACING_ENABLED
 from handlers import all_routers
+from utils.reference_data import reload_catalog
+from utils.render_pool import start_render_pool, shutdown_render_pool
+from utils.fsm_storage import create_fsm_storage, TTLMemoryStorage
+from utils.command_classes import classify_event
+from utils.rate_limit import build_bucket_maps
+from utils.lanes import lanes
+from utils.outbound import outbound
+from utils.reminders import start_reminders, stop_reminders, get_reminder_stats
+from utils.digest import start_digest, stop_digest
+from utils.metrics import (
+    FSM_LIVE_DIALOGS, THROTTLE_SHED, LOGS_SAMPLED_OUT,
+    register_collector, start_metrics, stop_metrics
+)
+from utils.logging_setup import setup_logging, UpdateContextMiddleware
+from utils.profiling import install_signal_handler, stop_profiling
+from utils.tracing import TracingMiddleware, stop_tracing
+from webhook import run_webhook
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# JSON-логи через очередь: форматирование и вывод в отдельном потоке
+log_sampling = setup_logging()
 logger = logging.getLogger(__name__)
+update_logger = logging.getLogger("bot.updates")
 
 
 class LoggingMiddleware:
     """Middleware для логирования входящих сообщений"""
     
     async def __call__(self, handler, event, data):
-        # Логируем информацию о сообщении
-        if hasattr(event, 'from_user') and hasattr(event, 'text'):
-            user = event.from_user
-            logger.info(
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
-                f"User: {user.id} (@{user.username or 'no_username'}) | "
-                f"Message: {event.text[:100] if event.text else 'No text'}"
+        # Время и user_id добавляет сам логгер (см. utils.logging_setup);
+        # строка собирается, только если запись не отброшена выборкой
+        if isinstance(event, Message):
+            update_logger.info(
+                "@%s | Message: %s",
+                event.from_user.username or 'no_username',
+                event.text[:100] if event.text else 'No text'
             )
-        elif hasattr(event, 'from_user') and hasattr(event, 'data'):
-            user = event.from_user
-            logger.info(
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
-                f"User: {user.id} (@{user.username or 'no_username'}) | "
-                f"Callback: {event.data}"
+        elif isinstance(event, CallbackQuery):
+            update_logger.info(
+                "@%s | Callback: %s",
+                event.from_user.username or 'no_username',
+                event.data
             )
         
         return await handler(event, data)
 
 
+class ThrottlingMiddleware:
+    """Middleware для ограничения частоты запросов пользователя по классам команд"""
+    
+    def __init__(self, rates=THROTTLE_RATES):
+        self.buckets = build_bucket_maps(rates)
+        self.allowed = dict.fromkeys(self.buckets, 0)
+        self.shed = dict.fromkeys(self.buckets, 0)
+    
+    async def __call__(self, handler, event, data):
+        user = getattr(event, 'from_user', None)
+        if user is None:
+            return await handler(event, data)
+        
+        command_class = classify_event(event, data.get('raw_state'))
+        buckets = self.buckets[command_class]
+        allowed, retry_after = buckets.acquire(user.id)
+        if allowed:
+            self.allowed[command_class] += 1
+            return await handler(event, data)
+        
+        self.shed[command_class] += 1
+        logger.info(f"🚦 User: {user.id} | ограничение {command_class}, повтор через {retry_after:.0f} с")
+        
+        # Сообщаем об ограничении один раз, а не на каждый лишний запрос
+        # (у нажатия кнопки в любом случае снимаем «часики»)
+        if buckets.mark_notified(user.id):
+            await event.answer(
+                f"⏳ Слишком много запросов. Попробуйте через {max(1, round(retry_after))} сек."
+            )
+        elif isinstance(event, CallbackQuery):
+            await event.answer()
+        return None
+    
+    def get_stats(self):
+        """Счётчики пропущенных и отклонённых запросов по классам"""
+        return {
+            name: {
+                "allowed": self.allowed[name],
+                "shed": self.shed[name],
+                "tracked_users": len(buckets),
+            }
+            for name, buckets in self.buckets.items()
+        }
+
+
+throttling = ThrottlingMiddleware()
+
+
+def _collect_throttle_metrics():
+    for name, stats in throttling.get_stats().items():
+        THROTTLE_SHED.set_total(stats['shed'], bucket=name)
+    LOGS_SAMPLED_OUT.set_total(log_sampling.dropped)
+
+
+register_collector(_collect_throttle_metrics)
+
+
 async def set_bot_commands(bot: Bot):
     """Определение списка команд бота в меню"""
     commands = [
@@ -57,8 +123,9 @@ async def set_bot_commands(bot: Bot):
         BotCommand(command="log_food", description="🍎 Записать еду"),
         BotCommand(command="log_workout", description="🏃 Записать тренировку"),
         BotCommand(command="check_progress", description="📊 Проверить прогресс"),
-        BotCommand(command="show_charts", description="📈 Графики за неделю"),
+        BotCommand(command="show_charts", description="📈 Графики (7, 30, 90, 365 дней)"),
         BotCommand(command="recommendations", description="💡 Рекомендации"),
+        BotCommand(command="water_reminders", description="⏰ Напоминания о воде"),
     ]
     await bot.set_my_commands(commands)
 
@@ -70,6 +137,27 @@ async def on_startup(bot: Bot):
     await set_bot_commands(bot)
     logger.info("✅ Команды бота установлены")
     
+    # Собираем (при необходимости) и открываем справочник продуктов
+    catalog = reload_catalog()
+    logger.info(
+        f"📚 Справочник v{catalog.version}: {catalog.food_count} продуктов, "
+        f"{catalog.workout_count} тренировок"
+    )
+    
+    # Прогреваем пул процессов для графиков
+    start_render_pool()
+    
+    # Фоновые задачи: напоминания о воде и вечерние итоги дня
+    start_reminders(bot)
+    if DIGEST_ENABLED:
+        start_digest(bot)
+    
+    # Метрики — отдельным сервером, не на публичном порту webhook
+    await start_metrics()
+    
+    # Профилирование по SIGUSR1 (см. utils.profiling)
+    install_signal_handler()
+    
     # Получаем информацию о боте
     bot_info = await bot.get_me()
     logger.info(f"🤖 Бот: @{bot_info.username} (ID: {bot_info.id})")
@@ -82,37 +170,90 @@ async def on_shutdown(bot: Bot):
     """Действия при остановке бота"""
     logger.info("=" * 50)
     logger.info("🛑 Бот останавливается...")
+    await stop_reminders()
+    await stop_digest()
+    await stop_metrics()
+    await stop_profiling()
+    await lanes.stop()
+    await outbound.stop()
+    shutdown_render_pool()
+    stop_tracing()
+    for name, stats in lanes.get_stats().items():
+        logger.info(
+            f"🛣 {name}: обработано {stats['processed']}, отклонено {stats['rejected']}, "
+            f"ожидание ср. {stats['wait_seconds_avg'] * 1000:.0f} мс, "
+            f"макс. {stats['wait_seconds_max'] * 1000:.0f} мс"
+        )
+    stats = outbound.get_stats()
+    logger.info(
+        f"📤 Отправлено {stats['sent']}, слито правок {stats['coalesced']}, "
+        f"повторов после 429 {stats['retried']}, "
+        f"ожидание макс. {stats['wait_seconds_max'] * 1000:.0f} мс"
+    )
+    stats = get_reminder_stats()
+    logger.info(
+        f"⏰ Напоминаний отправлено {stats['sent']}, норма выполнена {stats['on_track']}, "
+        f"ошибок {stats['failed']}"
+    )
+    for name, stats in throttling.get_stats().items():
+        logger.info(f"🚦 {name}: пропущено {stats['allowed']}, отклонено {stats['shed']}")
     logger.info("=" * 50)
 
 
-async def main():
-    """Основная функция запуска бота"""
-    # Создаём бота с настройками по умолчанию
-    bot = Bot(
-        token=BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с хранилищем состояний, middleware и роутерами"""
+    # Хранилище состояний: память или Redis, см. FSM_STORAGE
+    storage = create_fsm_storage()
+    dp = Dispatcher(storage=storage)
+    if isinstance(storage, TTLMemoryStorage):
+        register_collector(lambda: FSM_LIVE_DIALOGS.set(storage.live_dialogs))
     
-    # Создаём диспетчер с хранилищем состояний в памяти
-    dp = Dispatcher(storage=MemoryStorage())
+    # update_id и user_id обновления во всех записях лога
+    dp.update.outer_middleware(UpdateContextMiddleware())
+    # Корневой спан трассы обновления (см. utils.tracing)
+    if TRACING_ENABLED:
+        dp.update.outer_middleware(TracingMiddleware())
     
-    # Регистрируем middleware для логирования
+    # Регистрируем middleware для логирования и ограничения частоты запросов;
+    # последним — распределение обработчиков по полосам
     dp.message.middleware(LoggingMiddleware())
     dp.callback_query.middleware(LoggingMiddleware())
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
+    dp.message.middleware(lanes)
+    dp.callback_query.middleware(lanes)
     
     # Регистрируем все роутеры
     for router in all_routers:
         dp.include_router(router)
+    return dp
+
+
+async def main():
+    """Основная функция запуска бота"""
+    # Создаём бота с настройками по умолчанию
+    bot = Bot(
+        token=BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    # Отправка сообщений через очередь с лимитами Telegram
+    bot.session.middleware(outbound)
+    
+    dp = create_dispatcher()
     
     # Регистрируем обработчики startup и shutdown
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
     try:
-        # Удаляем webhook и запускаем polling
-        await bot.delete_webhook(drop_pending_updates=True)
-        logger.info("🔄 Запуск polling...")
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            logger.info("🌐 Запуск webhook...")
+            await run_webhook(dp, bot)
+        else:
+            # Удаляем webhook и запускаем polling
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("🔄 Запуск polling...")
+            await dp.start_polling(bot)
     finally:
         await bot.session.close()
 
@@ -13,9 +13,155 @@ WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 # Используем /tmp для бесплатного плана Render
 DATABASE_PATH = os.getenv("DATABASE_PATH", "/tmp/bot_database.db")
 
+# Справочник продуктов и тренировок (JSON) и его скомпилированный индекс
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_DATA_PATH = os.getenv(
+    "REFERENCE_DATA_PATH", os.path.join(BASE_DIR, "resources", "reference_data.json")
+)
+REFERENCE_INDEX_PATH = os.getenv(
+    "REFERENCE_INDEX_PATH", os.path.join(BASE_DIR, "resources", "reference_data.bin")
+)
+
+# Бэкенд графиков: matplotlib или pillow (лёгкий рендерер utils/charts_pil.py)
+CHART_BACKEND = os.getenv("CHART_BACKEND", "matplotlib")
+
+# Пул процессов для рендеринга графиков
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_QUEUE_SIZE = int(os.getenv("CHART_QUEUE_SIZE", "8"))
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "30"))
+
+# Кодирование графиков: ширина в пикселях, целевой размер файла (байт; не
+# гарантируется для картинок минимальной ширины)
+# и форматы-кандидаты (png, jpeg, webp) — отправляется самый компактный
+CHART_TARGET_WIDTH = int(os.getenv("CHART_TARGET_WIDTH", "1080"))
+CHART_MAX_BYTES = int(os.getenv("CHART_MAX_BYTES", "150000"))
+CHART_FORMATS = [f.strip() for f in os.getenv("CHART_FORMATS", "png,jpeg").split(",") if f.strip()]
+
+# Общий дедлайн параллельных запросов в обработчиках (секунды):
+# погода, сводка из БД и история ждутся не дольше этого времени
+HANDLER_DEADLINE = float(os.getenv("HANDLER_DEADLINE", "5"))
+
+# Хранилище состояний диалогов: memory или redis (переживает перезапуск,
+# общее для нескольких процессов бота); TTL незавершённого диалога (сек)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "86400"))
+
+# Не больше стольких диалогов в памяти (FSM_STORAGE=memory), лишние вытесняются
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", "10000"))
+
+# Режим получения обновлений: polling или webhook (встроенный aiohttp-сервер)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Webhook: публичный адрес, путь, секрет для заголовка
+# X-Telegram-Bot-Api-Secret-Token и адрес, который слушает сервер
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+
+# Обработка webhook: размер очереди, keep-alive (сек) и сколько соединений
+# Telegram может держать одновременно (число обработчиков — WEBHOOK_WORKERS ниже)
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_KEEPALIVE = float(os.getenv("WEBHOOK_KEEPALIVE", "75"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Супервизор (supervisor.py): число рабочих процессов, размер очереди
+# каждого и через сколько секунд без heartbeat процесс перезапускается
+SUPERVISOR_WORKERS = int(os.getenv("SUPERVISOR_WORKERS", str(os.cpu_count() or 1)))
+SUPERVISOR_QUEUE_SIZE = int(os.getenv("SUPERVISOR_QUEUE_SIZE", "1000"))
+SUPERVISOR_HEARTBEAT_TIMEOUT = float(os.getenv("SUPERVISOR_HEARTBEAT_TIMEOUT", "30"))
+
+# Лимиты запросов пользователя по классам команд: "запросов/секунд"
+# (interactive — записи и диалоги, lookup — внешние API, render — графики)
+THROTTLE_RATES = {
+    "interactive": os.getenv("THROTTLE_INTERACTIVE", "30/60"),
+    "lookup": os.getenv("THROTTLE_LOOKUP", "10/60"),
+    "render": os.getenv("THROTTLE_RENDER", "3/60"),
+}
+
+# Лимиты исходящих сообщений Bot API: "сообщений/секунд" на бота и на чат
+OUTBOUND_GLOBAL_RATE = os.getenv("OUTBOUND_GLOBAL_RATE", "30/1")
+OUTBOUND_CHAT_RATE = os.getenv("OUTBOUND_CHAT_RATE", "3/3")
+
+# Кэш погоды для фоновых задач (сек)
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "1800"))
+
+# Напоминания о воде: часы, в которые их можно присылать (с-по),
+# размер пачки пользователей и максимальная пауза между проверками (сек)
+REMINDER_HOURS = os.getenv("REMINDER_HOURS", "9-21")
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+REMINDER_POLL_SECONDS = float(os.getenv("REMINDER_POLL_SECONDS", "60"))
+
+# Вечерние итоги дня: включены ли, время рассылки (ЧЧ:ММ) и размер пачки
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "true").lower() in ("1", "true", "yes")
+DIGEST_TIME = os.getenv("DIGEST_TIME", "21:00")
+DIGEST_CHUNK_SIZE = int(os.getenv("DIGEST_CHUNK_SIZE", "1000"))
+
+# Метрики Prometheus: отдельный сервер на METRICS_HOST:METRICS_PORT во всех режимах
+# (в супервизоре — METRICS_PORT + номер процесса)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+# Логирование: формат (json или text), уровень и выборочная запись логов
+# на каждое обновление: при нагрузке выше LOG_SAMPLE_THRESHOLD записей/с
+# сохраняется доля LOG_SAMPLE_RATES ("INFO=0.1,DEBUG=0.01")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATES = {
+    level.strip().upper(): float(rate)
+    for level, rate in (item.split("=", 1) for item in
+                        os.getenv("LOG_SAMPLE_RATES", "INFO=0.1,DEBUG=0.01").split(",") if item.strip())
+}
+LOG_SAMPLE_THRESHOLD = int(os.getenv("LOG_SAMPLE_THRESHOLD", "50"))
+
+# Администраторы бота (через запятую): команды /profiling и т.п.
+ADMIN_IDS = frozenset(int(item) for item in os.getenv("ADMIN_IDS", "").split(",") if item.strip())
+
+# Профилирование по запросу (/profiling или SIGUSR1): каталог для файлов,
+# окно по умолчанию (сек) и период сэмплера стеков (сек)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SECONDS = float(os.getenv("PROFILE_SECONDS", "30"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# Трассировка SQL: время и строки каждого запроса (отчёт /sql_report);
+# запросы дольше SQL_SLOW_MS мс пишутся в лог с планом выполнения
+SQL_TRACE_ENABLED = os.getenv("SQL_TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "100"))
+
+# Трассировка обновлений (спаны OpenTelemetry): экспорт в файл OTLP JSON
+# (file) или в stdout (console), доля трассируемых обновлений
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "fitness-bot")
+
+# Полосы обработки по классам команд: (обработчиков, размер очереди)
+LANES = {
+    "interactive": (int(os.getenv("LANE_INTERACTIVE_WORKERS", "32")),
+                    int(os.getenv("LANE_INTERACTIVE_QUEUE", "1000"))),
+    "lookup": (int(os.getenv("LANE_LOOKUP_WORKERS", "8")),
+               int(os.getenv("LANE_LOOKUP_QUEUE", "200"))),
+    "render": (int(os.getenv("LANE_RENDER_WORKERS", str(CHART_WORKERS))),
+               int(os.getenv("LANE_RENDER_QUEUE", "50"))),
+}
+
+# Сколько обновлений одновременно ждут или выполняются во всех полосах.
+# Столько по умолчанию обработчиков webhook: каждый ждёт свой обработчик
+# в полосе, и заполненная полоса render не должна занять их все
+LANE_CAPACITY = sum(workers + queue_size for workers, queue_size in LANES.values())
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(LANE_CAPACITY)))
+
 # Проверка наличия обязательных переменных
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не установлен! Добавьте его в .env файл")
 
 if not WEATHER_API_KEY:
     raise ValueError("WEATHER_API_KEY не установлен! Добавьте его в .env файл")
+
+if BOT_MODE == "webhook" and not (WEBHOOK_URL and WEBHOOK_SECRET):
+    raise ValueError("Для BOT_MODE=webhook нужны WEBHOOK_URL и WEBHOOK_SECRET! Добавьте их в .env файл")
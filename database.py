@@ -1,14 +1,55 @@
+import functools
 import sqlite3
-from datetime import datetime, date
-from typing import Optional, Dict, Any, List
-from config import DATABASE_PATH
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, List, Callable, Iterator
+from config import DATABASE_PATH, SQL_TRACE_ENABLED
+from utils.metrics import DB_QUERY_SECONDS, timed
+from utils.sql_trace import TracingConnection, db_function_var
+from utils.tracing import span
+
+
+# Подписчики на новые записи пользователя (например, сброс кэша графиков)
+_write_listeners: List[Callable[[int], None]] = []
+
+
+def _timed(func: Callable) -> Callable:
+    """
+    Замер времени функции в метрике bot_db_query_seconds{function=...}
+    и спан db.<имя> в трассе обновления; запросы функции попадают
+    в трассировку SQL под её именем
+    """
+    name = func.__name__
+    span_name = f"db.{name}"
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = db_function_var.set(name)
+        try:
+            with timed(DB_QUERY_SECONDS, function=name), span(span_name):
+                return func(*args, **kwargs)
+        finally:
+            db_function_var.reset(token)
+    return wrapper
 
 
 def get_connection():
-    """Получить соединение с базой данных"""
+    """Получить соединение с базой данных (с трассировкой запросов, см. utils.sql_trace)"""
+    if SQL_TRACE_ENABLED:
+        return sqlite3.connect(DATABASE_PATH, factory=TracingConnection)
     return sqlite3.connect(DATABASE_PATH)
 
 
+def on_user_write(listener: Callable[[int], None]) -> None:
+    """Подписаться на изменения данных пользователя"""
+    _write_listeners.append(listener)
+
+
+def _notify_write(user_id: int) -> None:
+    """Оповестить подписчиков об изменении данных пользователя"""
+    for listener in _write_listeners:
+        listener(user_id)
+
+
 def init_db():
     """Инициализация базы данных - создание таблиц"""
     conn = get_connection()
@@ -68,12 +109,59 @@ def init_db():
         )
     ''')
     
+    # Недавние продукты пользователя (для повторной записи в одно касание)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recent_foods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            food_name TEXT,
+            calories_per_100g REAL,
+            emoji TEXT,
+            typical_grams REAL,
+            use_count INTEGER DEFAULT 1,
+            last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, food_name),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    ''')
+    
+    # Напоминания о воде: интервал в минутах и время следующего напоминания
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS water_reminders (
+            user_id INTEGER PRIMARY KEY,
+            interval_minutes INTEGER,
+            next_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    ''')
+    # Очередь напоминаний: выборка ближайших по next_at идёт по индексу
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_water_reminders_next_at ON water_reminders (next_at)'
+    )
+    
+    # Индексы для выборок по пользователю и периоду
+    for table in ('water_logs', 'food_logs', 'workout_logs'):
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS idx_{table}_user_time ON {table} (user_id, logged_at)'
+        )
+    
+    # Покрывающие индексы для итогов дня всех пользователей (iter_daily_totals):
+    # диапазон по logged_at читается из индекса без обращения к таблице
+    for table, columns in (('water_logs', 'amount_ml'),
+                           ('food_logs', 'calories'),
+                           ('workout_logs', 'calories_burned, water_extra_ml')):
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS idx_{table}_time_user '
+            f'ON {table} (logged_at, user_id, {columns})'
+        )
+    
     conn.commit()
     conn.close()
 
 
 # ==================== ОПЕРАЦИИ С ПОЛЬЗОВАТЕЛЯМИ ====================
 
+@_timed
 def get_user(user_id: int) -> Optional[Dict[str, Any]]:
     """Получить данные пользователя"""
     conn = get_connection()
@@ -89,6 +177,7 @@ def get_user(user_id: int) -> Optional[Dict[str, Any]]:
     return None
 
 
+@_timed
 def create_or_update_user(user_id: int, **kwargs) -> None:
     """Создать или обновить пользователя"""
     conn = get_connection()
@@ -113,10 +202,12 @@ def create_or_update_user(user_id: int, **kwargs) -> None:
     
     conn.commit()
     conn.close()
+    _notify_write(user_id)
 
 
 # ==================== ОПЕРАЦИИ С ВОДОЙ ====================
 
+@_timed
 def log_water(user_id: int, amount_ml: int) -> None:
     """Записать потребление воды"""
     conn = get_connection()
@@ -127,8 +218,10 @@ def log_water(user_id: int, amount_ml: int) -> None:
     )
     conn.commit()
     conn.close()
+    _notify_write(user_id)
 
 
+@_timed
 def get_today_water(user_id: int) -> int:
     """Получить количество воды, выпитой сегодня"""
     conn = get_connection()
@@ -144,36 +237,83 @@ def get_today_water(user_id: int) -> int:
     return result
 
 
-def get_water_history(user_id: int, days: int = 7) -> List[Dict[str, Any]]:
-    """Получить историю потребления воды за последние N дней"""
+# ==================== ОПЕРАЦИИ С ЕДОЙ ====================
+
+@_timed
+def log_food(user_id: int, food_name: str, calories: float, grams: float,
+             emoji: str = "🍽️") -> None:
+    """Записать потребление еды и обновить список недавних продуктов"""
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute(
+        'INSERT INTO food_logs (user_id, food_name, calories, grams) VALUES (?, ?, ?, ?)',
+        (user_id, food_name, calories, grams)
+    )
+    
+    # Типичная порция — скользящее среднее по последним записям
+    calories_per_100g = calories * 100 / grams if grams else 0
     cursor.execute('''
-        SELECT DATE(logged_at) as day, SUM(amount_ml) as total
-        FROM water_logs
-        WHERE user_id = ? AND logged_at >= date('now', ?)
-        GROUP BY DATE(logged_at)
-        ORDER BY day
-    ''', (user_id, f'-{days} days'))
-    rows = cursor.fetchall()
+        INSERT INTO recent_foods 
+        (user_id, food_name, calories_per_100g, emoji, typical_grams) 
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, food_name) DO UPDATE SET
+            calories_per_100g = excluded.calories_per_100g,
+            emoji = excluded.emoji,
+            typical_grams = ROUND(recent_foods.typical_grams * 0.7 + excluded.typical_grams * 0.3),
+            use_count = recent_foods.use_count + 1,
+            last_used = CURRENT_TIMESTAMP
+    ''', (user_id, food_name, calories_per_100g, emoji, grams))
+    
+    conn.commit()
     conn.close()
-    return [{'date': row[0], 'amount': row[1]} for row in rows]
+    _notify_write(user_id)
 
 
-# ==================== ОПЕРАЦИИ С ЕДОЙ ====================
+@_timed
+def get_recent_foods(user_id: int, limit: int = 8) -> List[Dict[str, Any]]:
+    """Получить недавние и любимые продукты пользователя"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, food_name, calories_per_100g, emoji, typical_grams
+        FROM recent_foods
+        WHERE user_id = ?
+        ORDER BY use_count DESC, last_used DESC
+        LIMIT ?
+    ''', (user_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        {'id': row[0], 'name': row[1], 'calories': row[2],
+         'emoji': row[3], 'grams': row[4]}
+        for row in rows
+    ]
+
 
-def log_food(user_id: int, food_name: str, calories: float, grams: float) -> None:
-    """Записать потребление еды"""
+@_timed
+def rebuild_recent_foods(user_id: int) -> None:
+    """Пересобрать недавние продукты пользователя из истории food_logs"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO food_logs (user_id, food_name, calories, grams) VALUES (?, ?, ?, ?)',
-        (user_id, food_name, calories, grams)
-    )
+    cursor.execute('DELETE FROM recent_foods WHERE user_id = ?', (user_id,))
+    cursor.execute('''
+        INSERT INTO recent_foods 
+        (user_id, food_name, calories_per_100g, emoji, typical_grams, use_count, last_used)
+        SELECT user_id, food_name,
+               SUM(calories) * 100 / SUM(grams),
+               '🍽️',
+               ROUND(AVG(grams)),
+               COUNT(*),
+               MAX(logged_at)
+        FROM food_logs
+        WHERE user_id = ? AND grams > 0
+        GROUP BY user_id, food_name
+    ''', (user_id,))
     conn.commit()
     conn.close()
 
 
+@_timed
 def get_today_calories_consumed(user_id: int) -> float:
     """Получить количество калорий, потреблённых сегодня"""
     conn = get_connection()
@@ -189,24 +329,9 @@ def get_today_calories_consumed(user_id: int) -> float:
     return result
 
 
-def get_food_history(user_id: int, days: int = 7) -> List[Dict[str, Any]]:
-    """Получить историю потребления калорий за последние N дней"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT DATE(logged_at) as day, SUM(calories) as total
-        FROM food_logs
-        WHERE user_id = ? AND logged_at >= date('now', ?)
-        GROUP BY DATE(logged_at)
-        ORDER BY day
-    ''', (user_id, f'-{days} days'))
-    rows = cursor.fetchall()
-    conn.close()
-    return [{'date': row[0], 'calories': row[1]} for row in rows]
-
-
 # ==================== ОПЕРАЦИИ С ТРЕНИРОВКАМИ ====================
 
+@_timed
 def log_workout(user_id: int, workout_type: str, duration: int, 
                 calories_burned: float, water_extra: int) -> None:
     """Записать тренировку"""
@@ -219,8 +344,10 @@ def log_workout(user_id: int, workout_type: str, duration: int,
     ''', (user_id, workout_type, duration, calories_burned, water_extra))
     conn.commit()
     conn.close()
+    _notify_write(user_id)
 
 
+@_timed
 def get_today_calories_burned(user_id: int) -> float:
     """Получить количество сожжённых калорий за сегодня"""
     conn = get_connection()
@@ -236,6 +363,7 @@ def get_today_calories_burned(user_id: int) -> float:
     return result
 
 
+@_timed
 def get_today_extra_water(user_id: int) -> int:
     """Получить дополнительную норму воды от тренировок за сегодня"""
     conn = get_connection()
@@ -251,20 +379,230 @@ def get_today_extra_water(user_id: int) -> int:
     return result
 
 
-def get_workout_history(user_id: int, days: int = 7) -> List[Dict[str, Any]]:
-    """Получить историю тренировок за последние N дней"""
+# ==================== СВОДКА ЗА СЕГОДНЯ ====================
+
+@_timed
+def get_today_summary(user_id: int) -> Dict[str, Any]:
+    """
+    Получить все данные за сегодня одним запросом: выпитая вода,
+    потреблённые и сожжённые калории, дополнительная вода от тренировок
+    """
     conn = get_connection()
     cursor = conn.cursor()
+    today = date.today()
+    # Диапазон вместо DATE(logged_at) = ?, чтобы работал индекс (user_id, logged_at)
+    day_range = (user_id, today.isoformat(), (today + timedelta(days=1)).isoformat())
     cursor.execute('''
-        SELECT DATE(logged_at) as day, SUM(calories_burned) as total
+        SELECT water.total, food.total, workouts.burned, workouts.extra
+        FROM
+            (SELECT COALESCE(SUM(amount_ml), 0) AS total FROM water_logs
+             WHERE user_id = ? AND logged_at >= ? AND logged_at < ?) AS water,
+            (SELECT COALESCE(SUM(calories), 0) AS total FROM food_logs
+             WHERE user_id = ? AND logged_at >= ? AND logged_at < ?) AS food,
+            (SELECT COALESCE(SUM(calories_burned), 0) AS burned,
+                    COALESCE(SUM(water_extra_ml), 0) AS extra
+             FROM workout_logs
+             WHERE user_id = ? AND logged_at >= ? AND logged_at < ?) AS workouts
+    ''', day_range * 3)
+    water, consumed, burned, extra_water = cursor.fetchone()
+    conn.close()
+    return {
+        'water': water,
+        'calories_consumed': consumed,
+        'calories_burned': burned,
+        'extra_water': extra_water,
+    }
+
+
+def iter_daily_totals(day: date, chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Итоги дня всех пользователей, у которых за день есть записи, — за один
+    проход: суммы по каждой таблице считаются группировкой по user_id,
+    строки читаются из курсора пачками по chunk_size. Соединение открыто,
+    пока генератор не исчерпан, поэтому читать его нужно из одного потока
+    """
+    conn = get_connection()
+    day_range = (day.isoformat(), (day + timedelta(days=1)).isoformat())
+    # Генератор не оборачивается _timed: имя для трассировки SQL задаём сами
+    token = db_function_var.set('iter_daily_totals')
+    try:
+        cursor = conn.execute('''
+            SELECT u.user_id, u.weight, u.activity_minutes, u.city,
+                   COALESCE(u.calorie_goal, 2000),
+                   COALESCE(water.total, 0), COALESCE(food.total, 0),
+                   COALESCE(workouts.burned, 0), COALESCE(workouts.extra, 0)
+            FROM users u
+            LEFT JOIN (SELECT user_id, SUM(amount_ml) AS total FROM water_logs
+                       WHERE logged_at >= ? AND logged_at < ?
+                       GROUP BY user_id) AS water ON water.user_id = u.user_id
+            LEFT JOIN (SELECT user_id, SUM(calories) AS total FROM food_logs
+                       WHERE logged_at >= ? AND logged_at < ?
+                       GROUP BY user_id) AS food ON food.user_id = u.user_id
+            LEFT JOIN (SELECT user_id, SUM(calories_burned) AS burned,
+                              SUM(water_extra_ml) AS extra
+                       FROM workout_logs
+                       WHERE logged_at >= ? AND logged_at < ?
+                       GROUP BY user_id) AS workouts ON workouts.user_id = u.user_id
+            WHERE u.weight IS NOT NULL
+              AND (water.user_id IS NOT NULL OR food.user_id IS NOT NULL
+                   OR workouts.user_id IS NOT NULL)
+        ''', day_range * 3)
+        db_function_var.reset(token)
+        columns = ['user_id', 'weight', 'activity_minutes', 'city', 'calorie_goal',
+                   'water', 'calories_consumed', 'calories_burned', 'extra_water']
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [dict(zip(columns, row)) for row in rows]
+    finally:
+        conn.close()
+
+
+# ==================== ИСТОРИЯ ЗА ПЕРИОД ====================
+
+# Выражения для группировки по корзинам (неделя начинается с понедельника)
+BUCKET_EXPRESSIONS = {
+    'day': "DATE(logged_at)",
+    'week': "DATE(logged_at, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', logged_at)",
+}
+
+
+@_timed
+def get_range_totals(user_id: int, start: date, bucket: str = 'day') -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Получить суммы воды, еды и тренировок с даты start, сгруппированные
+    в SQL по дням, неделям или месяцам (одним запросом)
+    """
+    bucket_expr = BUCKET_EXPRESSIONS[bucket]
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT 'water', {bucket_expr} AS bucket, SUM(amount_ml)
+        FROM water_logs
+        WHERE user_id = ? AND logged_at >= ?
+        GROUP BY bucket
+        UNION ALL
+        SELECT 'food', {bucket_expr} AS bucket, SUM(calories)
+        FROM food_logs
+        WHERE user_id = ? AND logged_at >= ?
+        GROUP BY bucket
+        UNION ALL
+        SELECT 'workout', {bucket_expr} AS bucket, SUM(calories_burned)
         FROM workout_logs
-        WHERE user_id = ? AND logged_at >= date('now', ?)
-        GROUP BY DATE(logged_at)
-        ORDER BY day
-    ''', (user_id, f'-{days} days'))
+        WHERE user_id = ? AND logged_at >= ?
+        GROUP BY bucket
+    ''', (user_id, start.isoformat()) * 3)
+    rows = cursor.fetchall()
+    conn.close()
+    
+    totals = {'water': [], 'food': [], 'workout': []}
+    for kind, bucket_date, total in rows:
+        key = 'amount' if kind == 'water' else 'calories'
+        totals[kind].append({'date': bucket_date, key: total})
+    return totals
+
+
+# ==================== НАПОМИНАНИЯ О ВОДЕ ====================
+
+@_timed
+def set_water_reminder(user_id: int, interval_minutes: int, next_at: datetime) -> None:
+    """Включить напоминания или изменить их интервал"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO water_reminders (user_id, interval_minutes, next_at) VALUES (?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            interval_minutes = excluded.interval_minutes,
+            next_at = excluded.next_at
+    ''', (user_id, interval_minutes, next_at.isoformat(sep=' ', timespec='seconds')))
+    conn.commit()
+    conn.close()
+
+
+@_timed
+def get_water_reminder(user_id: int) -> Optional[Dict[str, Any]]:
+    """Настройки напоминаний пользователя (None, если выключены)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT interval_minutes, next_at FROM water_reminders WHERE user_id = ?',
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    if row:
+        return {'interval_minutes': row[0], 'next_at': datetime.fromisoformat(row[1])}
+    return None
+
+
+@_timed
+def delete_water_reminder(user_id: int) -> bool:
+    """Выключить напоминания (True, если они были включены)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM water_reminders WHERE user_id = ?', (user_id,))
+    deleted = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+@_timed
+def get_due_reminders(now: datetime, limit: int) -> List[Dict[str, Any]]:
+    """
+    Напоминания, время которых наступило, вместе со всем нужным для
+    расчёта отставания: профилем, водой и доп. водой от тренировок за
+    сегодня. Одним запросом на пачку из limit пользователей
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    today = now.date()
+    day_range = (today.isoformat(), (today + timedelta(days=1)).isoformat())
+    cursor.execute('''
+        SELECT r.user_id, r.interval_minutes, r.next_at,
+               u.weight, u.activity_minutes, u.city,
+               (SELECT COALESCE(SUM(amount_ml), 0) FROM water_logs
+                WHERE user_id = r.user_id AND logged_at >= ? AND logged_at < ?),
+               (SELECT COALESCE(SUM(water_extra_ml), 0) FROM workout_logs
+                WHERE user_id = r.user_id AND logged_at >= ? AND logged_at < ?)
+        FROM water_reminders r
+        JOIN users u ON u.user_id = r.user_id
+        WHERE r.next_at <= ?
+        ORDER BY r.next_at
+        LIMIT ?
+    ''', day_range * 2 + (now.isoformat(sep=' ', timespec='seconds'), limit))
     rows = cursor.fetchall()
     conn.close()
-    return [{'date': row[0], 'calories': row[1]} for row in rows]
+    
+    columns = ['user_id', 'interval_minutes', 'next_at', 'weight',
+               'activity_minutes', 'city', 'water', 'extra_water']
+    return [dict(zip(columns, row)) for row in rows]
+
+
+@_timed
+def reschedule_reminders(schedule: List[tuple]) -> None:
+    """Перенести напоминания: список пар (user_id, следующее время)"""
+    conn = get_connection()
+    conn.executemany(
+        'UPDATE water_reminders SET next_at = ? WHERE user_id = ?',
+        [(next_at.isoformat(sep=' ', timespec='seconds'), user_id)
+         for user_id, next_at in schedule]
+    )
+    conn.commit()
+    conn.close()
+
+
+@_timed
+def get_next_reminder_time() -> Optional[datetime]:
+    """Время ближайшего напоминания (по индексу next_at)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT MIN(next_at) FROM water_reminders')
+    value = cursor.fetchone()[0]
+    conn.close()
+    return datetime.fromisoformat(value) if value else None
 
 
 # Инициализация БД при импорте
@@ -5,6 +5,8 @@ from handlers.water import router as water_router
 from handlers.food import router as food_router
 from handlers.workout import router as workout_router
 from handlers.progress import router as progress_router
+from handlers.reminders import router as reminders_router
+from handlers.admin import router as admin_router
 
 # Список всех роутеров для регистрации
 all_routers = [
@@ -14,6 +16,8 @@ all_routers = [
     food_router,
     workout_router,
     progress_router,
+    reminders_router,
+    admin_router,
 ]
 
 
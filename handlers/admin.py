@@ -0,0 +1,74 @@
+import html
+
+from aiogram import Router, F
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+from config import ADMIN_IDS, PROFILE_SECONDS
+from utils.profiling import MAX_SECONDS, start_profiling
+from utils.sql_trace import get_sql_report, reset_sql_stats
+
+router = Router()
+# Команды только для администраторов из ADMIN_IDS; для остальных их нет
+router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+
+@router.message(Command("profiling"))
+async def cmd_profiling(message: Message, command: CommandObject):
+    """Профилировать процесс бота заданное число секунд"""
+    seconds = PROFILE_SECONDS
+    if command.args:
+        try:
+            seconds = float(command.args)
+        except ValueError:
+            await message.answer("❌ Пример: /profiling 30")
+            return
+        if not 1 <= seconds <= MAX_SECONDS:
+            await message.answer(f"❌ Окно профилирования — от 1 до {MAX_SECONDS} секунд")
+            return
+
+    async def on_done(result):
+        await message.answer(
+            f"🔬 <b>Профиль готов</b> ({result['seconds']:.0f} с, {result['samples']} сэмплов)\n\n"
+            f"cProfile: <code>{result['prof']}</code>\n"
+            f"Стеки для flame graph: <code>{result['folded']}</code>",
+            parse_mode="HTML"
+        )
+
+    if not start_profiling(seconds, on_done):
+        await message.answer("⏳ Профилирование уже идёт, дождитесь результата.")
+        return
+    await message.answer(f"🔬 Профилирование включено на {seconds:.0f} с.")
+
+
+@router.message(Command("sql_report"))
+async def cmd_sql_report(message: Message, command: CommandObject):
+    """Запросы SQL с наибольшим суммарным временем"""
+    args = (command.args or "").strip().lower()
+    if args == "reset":
+        reset_sql_stats()
+        await message.answer("🗑 Статистика запросов сброшена.")
+        return
+    limit = int(args) if args.isdigit() else 5
+
+    report = get_sql_report(limit)
+    if not report:
+        await message.answer("Запросов ещё не было.")
+        return
+
+    text = f"🗄 <b>Топ-{len(report)} запросов по суммарному времени</b>"
+    for i, stats in enumerate(report, 1):
+        block = (
+            f"\n\n<b>{i}. {stats['function']}</b>: {stats['calls']} раз, "
+            f"всего {stats['seconds_total'] * 1000:.0f} мс, "
+            f"ср. {stats['seconds_avg'] * 1000:.1f} мс, макс. {stats['seconds_max'] * 1000:.0f} мс, "
+            f"строк {stats['rows']}, медленных {stats['slow']}\n"
+            f"<code>{html.escape(stats['sql'][:300])}</code>"
+        )
+        if stats['plan']:
+            block += f"\n<pre>{html.escape(stats['plan'])}</pre>"
+        # Сообщение Telegram — не больше 4096 символов
+        if len(text) + len(block) > 4000:
+            break
+        text += block
+    await message.answer(text, parse_mode="HTML")
@@ -47,6 +47,7 @@ async def cmd_help(message: Message):
 <b>🍎 Еда:</b>
 /log_food [продукт] — записать съеденную еду
   <i>Пример: /log_food банан</i>
+  <i>Без аргументов — недавние продукты в одно касание</i>
 
 <b>🏃 Тренировки:</b>
 /log_workout [тип] [минуты] — записать тренировку
@@ -54,7 +55,12 @@ async def cmd_help(message: Message):
 
 <b>📊 Прогресс:</b>
 /check_progress — текущий прогресс за день
-/show_charts — графики за неделю
+/show_charts [дней] — графики за неделю
+  <i>Пример: /show_charts 30 (доступно 7, 30, 90, 365)</i>
+
+<b>⏰ Напоминания:</b>
+/water_reminders [минут|off] — напоминать, если отстаёте от нормы воды
+  <i>Пример: /water_reminders 120</i>
 
 <b>💡 Рекомендации:</b>
 /recommendations — советы по питанию и тренировкам
@@ -1,11 +1,12 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 import database as db
 from utils.food_api import get_food_info
+from utils.recent_foods import get_recent_foods, find_recent_food, invalidate_recent_foods
 
 router = Router()
 
@@ -15,6 +16,18 @@ class FoodStates(StatesGroup):
     waiting_for_grams = State()
 
 
+def build_recent_foods_keyboard(foods: list) -> InlineKeyboardMarkup:
+    """Клавиатура недавних продуктов: одно нажатие — одна запись"""
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{food['emoji']} {food['name']} — {food['grams']:.0f} г",
+            callback_data=f"refood_{food['id']}"
+        )]
+        for food in foods
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 @router.message(Command("log_food"))
 async def cmd_log_food(message: Message, command: CommandObject, state: FSMContext):
     """Записать съеденную еду"""
@@ -26,9 +39,11 @@ async def cmd_log_food(message: Message, command: CommandObject, state: FSMConte
         )
         return
     
+    recent_foods = get_recent_foods(message.from_user.id)
+    
     # Проверяем, указан ли продукт
     if not command.args:
-        await message.answer(
+        text = (
             "🍎 <b>Запись еды</b>\n\n"
             "Укажите название продукта:\n"
             "<code>/log_food банан</code>\n\n"
@@ -36,18 +51,34 @@ async def cmd_log_food(message: Message, command: CommandObject, state: FSMConte
             "• /log_food яблоко\n"
             "• /log_food курица\n"
             "• /log_food пицца\n"
-            "• /log_food овсянка",
-            parse_mode="HTML"
+            "• /log_food овсянка"
+        )
+        if recent_foods:
+            text += "\n\n⭐ <b>Или выберите из недавних:</b>"
+        await message.answer(
+            text,
+            parse_mode="HTML",
+            reply_markup=build_recent_foods_keyboard(recent_foods) if recent_foods else None
         )
         return
     
     product_name = command.args.strip()
     
-    # Показываем, что ищем продукт
-    searching_msg = await message.answer(f"🔍 Ищу информацию о '{product_name}'...")
+    # Знакомый продукт берём из недавних без поиска
+    food_info = None
+    for food in recent_foods:
+        if food["name"].lower() == product_name.lower():
+            food_info = food
+            break
     
-    # Получаем информацию о продукте
-    food_info = await get_food_info(product_name)
+    if food_info:
+        searching_msg = await message.answer(f"{food_info['emoji']} {food_info['name']}")
+    else:
+        # Показываем, что ищем продукт
+        searching_msg = await message.answer(f"🔍 Ищу информацию о '{product_name}'...")
+        
+        # Получаем информацию о продукте
+        food_info = await get_food_info(product_name)
     
     if not food_info:
         await searching_msg.edit_text(
@@ -99,7 +130,8 @@ async def process_food_grams(message: Message, state: FSMContext):
         calories = (calories_per_100g * grams) / 100
         
         # Записываем в базу
-        db.log_food(message.from_user.id, food_name, calories, grams)
+        db.log_food(message.from_user.id, food_name, calories, grams, emoji)
+        invalidate_recent_foods(message.from_user.id)
         
         # Получаем статистику за день
         today_calories = db.get_today_calories_consumed(message.from_user.id)
@@ -144,6 +176,34 @@ async def process_food_grams(message: Message, state: FSMContext):
         )
 
 
+@router.callback_query(F.data.startswith("refood_"))
+async def process_recent_food(callback: CallbackQuery):
+    """Повторная запись недавнего продукта в одно касание"""
+    try:
+        food_id = int(callback.data.split("_", 1)[1])
+    except ValueError:
+        await callback.answer()
+        return
+    
+    food = find_recent_food(callback.from_user.id, food_id)
+    if not food:
+        await callback.answer("❌ Продукт не найден, используйте /log_food", show_alert=True)
+        return
+    
+    grams = food["grams"]
+    calories = food["calories"] * grams / 100
+    db.log_food(callback.from_user.id, food["name"], calories, grams, food["emoji"])
+    invalidate_recent_foods(callback.from_user.id)
+    
+    await callback.message.edit_text(
+        f"{food['emoji']} <b>Записано: {food['name']}</b>\n"
+        f"📝 {grams:.0f} г = {calories:.1f} ккал\n\n"
+        f"📊 /check_progress — прогресс за сегодня",
+        parse_mode="HTML"
+    )
+    await callback.answer("✅ Записано")
+
+
 @router.message(Command("cancel"))
 async def cmd_cancel(message: Message, state: FSMContext):
     """Отменить текущее действие"""
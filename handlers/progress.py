@@ -1,22 +1,55 @@
+import asyncio
+import logging
+import time
+from datetime import date, timedelta
+
 from aiogram import Router
 from aiogram.types import Message, BufferedInputFile
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
 
 import database as db
 from utils.weather import get_weather
 from utils.calculations import (
     calculate_water_goal, 
+    calculate_daily_progress,
     get_workout_recommendations
 )
 from utils.food_api import (
     get_low_calorie_recommendations,
     get_high_protein_recommendations
 )
-from utils.charts import create_combined_progress_chart
+from utils.render_pool import render_chart, record_upload, RenderPoolBusy
+from utils.charts import (
+    chart_cache,
+    chart_file_ids,
+    make_chart_key,
+    get_range_chart_drawer
+)
+from utils.image_encoding import image_extension
+from utils.series import build_range_series, choose_bucket
+from utils.fanout import fan_out, in_thread
+from config import CHART_BACKEND
 
 
+logger = logging.getLogger(__name__)
+
 router = Router()
 
+# Доступные периоды графиков (дней) и их подписи
+CHART_PERIODS = {
+    7: "последнюю неделю",
+    30: "последние 30 дней",
+    90: "последние 3 месяца",
+    365: "последний год",
+}
+
+DATA_UNAVAILABLE = "⏳ Не удалось получить данные. Попробуйте ещё раз."
+
+# Новые записи пользователя сбрасывают его графики в кэше
+db.on_user_write(chart_cache.invalidate_user)
+db.on_user_write(chart_file_ids.invalidate_user)
+
 
 @router.message(Command("check_progress"))
 async def cmd_check_progress(message: Message):
@@ -29,34 +62,37 @@ async def cmd_check_progress(message: Message):
         )
         return
     
-    # Получаем данные за сегодня
-    today_water = db.get_today_water(message.from_user.id)
-    today_calories = db.get_today_calories_consumed(message.from_user.id)
-    today_burned = db.get_today_calories_burned(message.from_user.id)
-    today_extra_water = db.get_today_extra_water(message.from_user.id)
-    
-    # Рассчитываем нормы с учётом погоды
-    weather = await get_weather(user["city"]) if user.get("city") else None
-    water_calc = calculate_water_goal(
+    # Сводка за сегодня и погода запрашиваются параллельно
+    results = await fan_out(
+        "check_progress",
+        summary=in_thread(db.get_today_summary, message.from_user.id),
+        weather=get_weather(user["city"]) if user.get("city") else None
+    )
+    summary, weather = results["summary"], results["weather"]
+    if summary is None:
+        await message.answer(DATA_UNAVAILABLE)
+        return
+    # Нормы с учётом погоды и тренировок
+    progress = calculate_daily_progress(
         user["weight"],
         user["activity_minutes"],
+        user.get("calorie_goal", 2000),
+        summary,
         weather["temp"] if weather else None
     )
-    
-    # Общая цель воды с учётом тренировок
-    water_goal = water_calc["total"] + today_extra_water
-    calorie_goal = user.get("calorie_goal", 2000)
-    
-    # Расчёт прогресса по воде
-    water_remaining = max(0, water_goal - today_water)
-    water_percent = min(100, int(today_water / water_goal * 100)) if water_goal > 0 else 0
+    today_water = progress["water"]
+    water_goal = progress["water_goal"]
+    water_remaining = progress["water_remaining"]
+    water_percent = progress["water_percent"]
     water_filled = water_percent // 10
     water_bar = "█" * water_filled + "░" * (10 - water_filled)
     
-    # Расчёт прогресса по калориям
-    calorie_balance = today_calories - today_burned
-    calorie_remaining = max(0, calorie_goal - calorie_balance)
-    calorie_percent = min(150, int(calorie_balance / calorie_goal * 100)) if calorie_goal > 0 else 0
+    today_calories = progress["calories_consumed"]
+    today_burned = progress["calories_burned"]
+    calorie_goal = progress["calorie_goal"]
+    calorie_balance = progress["calorie_balance"]
+    calorie_remaining = progress["calorie_remaining"]
+    calorie_percent = progress["calorie_percent"]
     calorie_filled = min(10, calorie_percent // 10)
     calorie_bar = "█" * calorie_filled + "░" * (10 - calorie_filled)
     
@@ -90,7 +126,7 @@ async def cmd_check_progress(message: Message):
         f"Баланс: {int(calorie_balance)} / {int(calorie_goal)} ккал\n"
         f"[{calorie_bar}] {calorie_percent}%\n"
         f"{calorie_status}\n\n"
-        f"📈 /show_charts — графики за неделю\n"
+        f"📈 /show_charts — графики за неделю (/show_charts 30, 90, 365)\n"
         f"💡 /recommendations — советы"
     )
     
@@ -98,8 +134,8 @@ async def cmd_check_progress(message: Message):
 
 
 @router.message(Command("show_charts"))
-async def cmd_show_charts(message: Message):
-    """Показать графики прогресса"""
+async def cmd_show_charts(message: Message, command: CommandObject):
+    """Показать графики прогресса (/show_charts [7|30|90|365])"""
     user = db.get_user(message.from_user.id)
     
     if not user:
@@ -108,21 +144,38 @@ async def cmd_show_charts(message: Message):
         )
         return
     
-    await message.answer("📊 Генерирую графики...")
-    
-    # Получаем историю
-    water_history = db.get_water_history(message.from_user.id, 7)
-    food_history = db.get_food_history(message.from_user.id, 7)
-    workout_history = db.get_workout_history(message.from_user.id, 7)
+    # Период графика
+    try:
+        days = int(command.args) if command.args else 7
+    except ValueError:
+        days = 0
+    if days not in CHART_PERIODS:
+        await message.answer(
+            "📈 Укажите период в днях: "
+            + ", ".join(f"/show_charts {d}" for d in CHART_PERIODS)
+        )
+        return
     
-    # Текущие данные
-    today_water = db.get_today_water(message.from_user.id)
-    today_consumed = db.get_today_calories_consumed(message.from_user.id)
-    today_burned = db.get_today_calories_burned(message.from_user.id)
-    today_extra_water = db.get_today_extra_water(message.from_user.id)
+    # История (сгруппированная в SQL по дням, неделям или месяцам),
+    # сводка за сегодня и погода запрашиваются параллельно
+    today = date.today()
+    start = today - timedelta(days=days - 1)
+    results = await fan_out(
+        "show_charts",
+        totals=in_thread(db.get_range_totals, message.from_user.id, start, choose_bucket(days)),
+        summary=in_thread(db.get_today_summary, message.from_user.id),
+        weather=get_weather(user["city"]) if user.get("city") else None
+    )
+    totals, summary, weather = results["totals"], results["summary"], results["weather"]
+    if totals is None or summary is None:
+        await message.answer(DATA_UNAVAILABLE)
+        return
+    today_water = summary["water"]
+    today_consumed = summary["calories_consumed"]
+    today_burned = summary["calories_burned"]
+    today_extra_water = summary["extra_water"]
     
     # Нормы
-    weather = await get_weather(user["city"]) if user.get("city") else None
     water_calc = calculate_water_goal(
         user["weight"],
         user["activity_minutes"],
@@ -131,27 +184,65 @@ async def cmd_show_charts(message: Message):
     water_goal = water_calc["total"] + today_extra_water
     calorie_goal = user.get("calorie_goal", 2000)
     
-    # Создаём комбинированный график
-    chart_buf = create_combined_progress_chart(
-        water_history,
-        food_history,
-        workout_history,
-        water_goal,
-        calorie_goal,
-        today_water,
-        today_consumed,
-        today_burned
+    # Если данные не менялись — берём готовый график из кэша
+    chart_key = make_chart_key(
+        message.from_user.id,
+        (start.isoformat(), today.isoformat()),
+        (water_goal, calorie_goal),
+        totals, today_water, today_consumed, today_burned
     )
-    
-    # Отправляем как фото
-    photo = BufferedInputFile(chart_buf.read(), filename="progress.png")
-    await message.answer_photo(
-        photo,
-        caption="📊 <b>Ваш прогресс за последнюю неделю</b>\n\n"
-                "💧 Вода: синий цвет - не достигнута цель, зелёный - достигнута\n"
-                "🔥 Калории: красный - потреблено, зелёный - сожжено",
-        parse_mode="HTML"
+    caption = (
+        f"📊 <b>Ваш прогресс за {CHART_PERIODS[days]}</b>\n\n"
+        "💧 Вода: синий цвет - не достигнута цель, зелёный - достигнута\n"
+        "🔥 Калории: красный - потреблено, зелёный - сожжено"
     )
+    
+    # Этот график уже отправлялся — пересылаем по file_id без загрузки
+    file_id = chart_file_ids.get(chart_key)
+    if file_id is not None:
+        try:
+            await message.answer_photo(file_id, caption=caption, parse_mode="HTML")
+            return
+        except TelegramBadRequest:
+            chart_file_ids.invalidate_user(message.from_user.id)
+    
+    chart_image = chart_cache.get(chart_key)
+    
+    if chart_image is None:
+        await message.answer("📊 Генерирую графики...")
+        
+        series = build_range_series(
+            totals, days, today_water, today_consumed, today_burned, today
+        )
+        
+        # Создаём комбинированный график в пуле процессов
+        try:
+            chart_image = await render_chart(
+                get_range_chart_drawer(CHART_BACKEND),
+                series,
+                water_goal,
+                calorie_goal
+            )
+        except RenderPoolBusy:
+            await message.answer(
+                "⏳ Сейчас строится много графиков. Попробуйте через минуту."
+            )
+            return
+        except Exception as e:
+            # Таймаут, сломанный пул или ошибка рисования
+            if not isinstance(e, asyncio.TimeoutError):
+                logger.error(f"Ошибка рендеринга графика: {e!r}")
+            await message.answer("❌ Не удалось построить график. Попробуйте позже.")
+            return
+        chart_cache.put(chart_key, chart_image)
+    
+    # Отправляем как фото и запоминаем file_id для повторных запросов
+    photo = BufferedInputFile(chart_image, filename=f"progress.{image_extension(chart_image)}")
+    upload_start = time.perf_counter()
+    sent = await message.answer_photo(photo, caption=caption, parse_mode="HTML")
+    record_upload(time.perf_counter() - upload_start, len(chart_image))
+    if sent.photo:
+        chart_file_ids.put(chart_key, sent.photo[-1].file_id)
 
 
 @router.message(Command("recommendations"))
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+import database as db
+from utils.reminders import (
+    MIN_INTERVAL,
+    MAX_INTERVAL,
+    DAY_START,
+    DAY_END,
+    next_reminder_time,
+    wake_reminders
+)
+
+router = Router()
+
+
+@router.message(Command("water_reminders"))
+async def cmd_water_reminders(message: Message, command: CommandObject):
+    """Включить, выключить или показать напоминания о воде"""
+    user_id = message.from_user.id
+
+    if not db.get_user(user_id):
+        await message.answer(
+            "❌ Сначала настройте профиль с помощью /set_profile"
+        )
+        return
+
+    # Без аргументов показываем текущие настройки
+    if not command.args:
+        reminder = db.get_water_reminder(user_id)
+        if reminder:
+            status = (
+                f"✅ Включены: каждые {reminder['interval_minutes']} мин, "
+                f"следующее в {reminder['next_at']:%H:%M}"
+            )
+        else:
+            status = "🔕 Выключены"
+        await message.answer(
+            "⏰ <b>Напоминания о воде</b>\n\n"
+            f"{status}\n\n"
+            f"Напомню, если вы отстаёте от нормы воды "
+            f"(с {DAY_START}:00 до {DAY_END}:00).\n\n"
+            f"Включить: <code>/water_reminders 120</code> "
+            f"(интервал {MIN_INTERVAL}–{MAX_INTERVAL} мин)\n"
+            "Выключить: <code>/water_reminders off</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    if command.args.strip().lower() in ("off", "выкл", "0"):
+        if db.delete_water_reminder(user_id):
+            await message.answer("🔕 Напоминания о воде выключены.")
+        else:
+            await message.answer("Напоминания и так выключены.")
+        return
+
+    try:
+        interval = int(command.args)
+    except ValueError:
+        await message.answer(
+            "❌ Укажите интервал в минутах.\n"
+            "Пример: /water_reminders 120"
+        )
+        return
+
+    if not MIN_INTERVAL <= interval <= MAX_INTERVAL:
+        await message.answer(
+            f"❌ Интервал должен быть от {MIN_INTERVAL} до {MAX_INTERVAL} минут"
+        )
+        return
+
+    next_at = next_reminder_time(datetime.now(), interval)
+    db.set_water_reminder(user_id, interval, next_at)
+    wake_reminders()
+
+    await message.answer(
+        f"⏰ Напоминания включены: каждые {interval} мин, "
+        f"если вы отстаёте от нормы воды.\n"
+        f"Первое — в {next_at:%H:%M}."
+    )
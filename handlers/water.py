@@ -5,6 +5,7 @@ from aiogram.filters import Command, CommandObject
 import database as db
 from utils.weather import get_weather
 from utils.calculations import calculate_water_goal
+from utils.fanout import fan_out, in_thread
 
 router = Router()
 
@@ -43,15 +44,27 @@ async def cmd_log_water(message: Message, command: CommandObject):
             await message.answer("❌ Слишком большое количество. Введите реальное значение (до 5000 мл)")
             return
         
-        # Записываем воду в базу
-        db.log_water(message.from_user.id, amount)
+        # Запись выполняется до дедлайна: отменённая по таймауту задача не
+        # останавливает поток, и вода записалась бы, а пользователь получил ошибку
+        await in_thread(db.log_water, message.from_user.id, amount)
         
-        # Получаем текущую статистику
-        today_water = db.get_today_water(message.from_user.id)
-        today_extra_water = db.get_today_extra_water(message.from_user.id)
+        # Сводка и погода читаются параллельно под общим дедлайном
+        results = await fan_out(
+            "log_water",
+            summary=in_thread(db.get_today_summary, message.from_user.id),
+            weather=get_weather(user["city"]) if user.get("city") else None
+        )
+        summary, weather = results["summary"], results["weather"]
+        if summary is None:
+            await message.answer(
+                f"💧 Записано: {amount} мл воды.\n"
+                "Сводка сейчас недоступна — посмотрите /check_progress."
+            )
+            return
+        today_water = summary["water"]
+        today_extra_water = summary["extra_water"]
         
         # Рассчитываем норму с учётом погоды
-        weather = await get_weather(user["city"]) if user.get("city") else None
         water_calc = calculate_water_goal(
             user["weight"],
             user["activity_minutes"],
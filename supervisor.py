@@ -0,0 +1,397 @@
+"""
+Супервизор: несколько рабочих процессов бота с шардированием по user_id
+
+Запуск вместо bot.py:
+    python supervisor.py
+
+Главный процесс получает обновления через getUpdates и, не разбирая их
+в объекты aiogram, раскладывает по SUPERVISOR_WORKERS рабочим процессам:
+номер процесса — user_id по модулю их числа. Все обновления пользователя
+попадают в один процесс, поэтому его диалог FSM, кэши графиков и недавних
+продуктов остаются локальными, а внутри процесса обновления одного
+пользователя обрабатываются строго по очереди.
+
+Рабочие процессы раз в HEARTBEAT_INTERVAL секунд отмечаются из своего
+event loop. Процесс, который завершился или не отмечался дольше
+SUPERVISOR_HEARTBEAT_TIMEOUT (например, завис в CPU), перезапускается
+с новой очередью: процесс, убитый внутри Queue.get(), навсегда оставляет
+занятой блокировку чтения старой очереди. Ещё не взятые обновления
+переносятся из старой очереди в новую, если её блокировка свободна.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+
+from config import (
+    BOT_TOKEN, SUPERVISOR_WORKERS, SUPERVISOR_QUEUE_SIZE, SUPERVISOR_HEARTBEAT_TIMEOUT,
+    DIGEST_ENABLED, METRICS_PORT, LANE_CAPACITY
+)
+from utils.outbound import outbound
+
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+# Как часто рабочий процесс отмечается и супервизор проверяет процессы (сек)
+HEARTBEAT_INTERVAL = 2.0
+
+# Сколько обновлений рабочий процесс обрабатывает одновременно: столько,
+# сколько вмещают полосы, чтобы заполненная полоса не заняла все слоты
+WORKER_CONCURRENCY = LANE_CAPACITY
+
+# Сколько секунд рабочий процесс ждёт обновление за один вызов Queue.get
+# (и сколько супервизор ждёт места в полной очереди, прежде чем взять её заново)
+QUEUE_POLL_TIMEOUT = 1.0
+
+# Long polling: сколько секунд Telegram держит запрос getUpdates
+POLLING_TIMEOUT = 30
+
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    """Пользователь, от которого пришло обновление (для шардирования)"""
+    for value in update.values():
+        if isinstance(value, dict):
+            user = value.get("from") or value.get("user")
+            if user:
+                return user["id"]
+            chat = value.get("chat")
+            if chat:
+                return chat["id"]
+    return update["update_id"]
+
+
+def make_bot(api_url: str = TELEGRAM_API_URL) -> Bot:
+    """Бот, работающий через указанный сервер Bot API"""
+    session = None
+    if api_url != TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(api_url))
+    bot = Bot(
+        token=BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    bot.session.middleware(outbound)
+    return bot
+
+
+# ==================== РАБОЧИЙ ПРОЦЕСС ====================
+
+class _UserLanes:
+    """Параллельная обработка разных пользователей, последовательная — одного"""
+
+    def __init__(self, concurrency: int):
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def submit(self, user_id: int, coro) -> None:
+        """Поставить обработку в очередь пользователя (ждёт свободного слота)"""
+        await self._slots.acquire()
+        previous = self._tails.get(user_id)
+        task = asyncio.create_task(self._run(previous, coro))
+        self._tails[user_id] = task
+        task.add_done_callback(lambda t: self._done(user_id, t))
+
+    async def _run(self, previous: Optional[asyncio.Task], coro) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await coro
+        except Exception as e:
+            logger.exception(f"Ошибка обработки обновления: {e}")
+
+    def _done(self, user_id: int, task: asyncio.Task) -> None:
+        self._slots.release()
+        if self._tails.get(user_id) is task:
+            del self._tails[user_id]
+
+    async def drain(self) -> None:
+        if self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+async def _heartbeat(heartbeat) -> None:
+    while True:
+        heartbeat.value = time.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def _run_worker(index: int, workers: int, updates, heartbeat, api_url: str) -> None:
+    from bot import create_dispatcher
+    from utils.lanes import lanes
+    from utils.reminders import start_reminders, stop_reminders
+    from utils.digest import start_digest, stop_digest
+    from utils.metrics import start_metrics, stop_metrics
+    from utils.profiling import install_signal_handler, stop_profiling
+    from utils.render_pool import shutdown_render_pool
+    from utils.tracing import stop_tracing
+
+    # Лимит Telegram общий на бота, а не на процесс
+    outbound.share_global_limit(workers)
+    bot = make_bot(api_url)
+    dp = create_dispatcher()
+    workflow_data = {"dispatcher": dp, "bot": bot, "bots": [bot]}
+    await dp.emit_startup(**workflow_data)
+    await start_metrics(port=METRICS_PORT + index)
+    install_signal_handler()
+    # Напоминания и итоги дня общие для всех процессов (одна БД) —
+    # их рассылает первый
+    if index == 0:
+        start_reminders(bot)
+        if DIGEST_ENABLED:
+            start_digest(bot)
+
+    loop = asyncio.get_running_loop()
+    beat = asyncio.create_task(_heartbeat(heartbeat))
+    user_lanes = _UserLanes(WORKER_CONCURRENCY)
+    logger.info(f"👷 Рабочий процесс {index} запущен")
+    try:
+        while True:
+            try:
+                item = await loop.run_in_executor(None, updates.get, True, QUEUE_POLL_TIMEOUT)
+            except queue_module.Empty:
+                continue
+            if item is None:
+                break
+            user_id, update = item
+            await user_lanes.submit(user_id, dp.feed_raw_update(bot, update))
+        await user_lanes.drain()
+    finally:
+        beat.cancel()
+        await stop_reminders()
+        await stop_digest()
+        await stop_metrics()
+        await stop_profiling()
+        await lanes.stop()
+        await outbound.stop()
+        await dp.emit_shutdown(**workflow_data)
+        shutdown_render_pool()
+        stop_tracing()
+        await bot.session.close()
+
+
+def _worker_main(index: int, workers: int, updates, heartbeat, api_url: str) -> None:
+    """Точка входа рабочего процесса"""
+    try:
+        asyncio.run(_run_worker(index, workers, updates, heartbeat, api_url))
+    except KeyboardInterrupt:
+        pass
+
+
+# ==================== СУПЕРВИЗОР ====================
+
+class Supervisor:
+    """Запуск, проверка и перезапуск рабочих процессов"""
+
+    def __init__(self, workers: int = SUPERVISOR_WORKERS, api_url: str = TELEGRAM_API_URL):
+        self.api_url = api_url
+        self.context = multiprocessing.get_context("spawn")
+        self.queues = [self.context.Queue(maxsize=SUPERVISOR_QUEUE_SIZE) for _ in range(workers)]
+        self.heartbeats = [self.context.Value("d", 0.0, lock=False) for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.restarts = 0
+        self.routed = 0
+        # Перезапуск идёт в потоке; остановка ждёт его окончания
+        self._restart_lock = threading.Lock()
+
+    def start_worker(self, index: int) -> None:
+        # Не daemon: рабочему процессу нужен свой пул рендеринга графиков.
+        # Время на запуск процесса, пока он не начал отмечаться сам
+        self.heartbeats[index].value = time.time()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(index, len(self.processes), self.queues[index], self.heartbeats[index], self.api_url),
+            name=f"bot-worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self) -> None:
+        for index in range(len(self.processes)):
+            self.start_worker(index)
+        logger.info(f"👷 Запущено рабочих процессов: {len(self.processes)}")
+
+    def check_workers(self) -> None:
+        """
+        Перезапустить завершившиеся и зависшие процессы
+
+        Блокирует (join, разбор старой очереди, запуск процесса), поэтому
+        вызывается в потоке, а не в event loop приёма и раздачи обновлений.
+        """
+        with self._restart_lock:
+            self._check_workers()
+
+    def _check_workers(self) -> None:
+        now = time.time()
+        for index, process in enumerate(self.processes):
+            silent = now - self.heartbeats[index].value
+            if process.is_alive() and silent <= SUPERVISOR_HEARTBEAT_TIMEOUT:
+                continue
+            if process.is_alive():
+                logger.error(f"💀 Процесс {index} не отвечает {silent:.0f} с, перезапуск")
+                process.kill()
+            else:
+                logger.error(f"💀 Процесс {index} завершился (код {process.exitcode}), перезапуск")
+            process.join(timeout=5)
+            self.restarts += 1
+            self.replace_queue(index)
+            self.start_worker(index)
+
+    def signal_workers(self, signum: int) -> None:
+        """Переслать сигнал всем живым рабочим процессам"""
+        pids = [process.pid for process in self.processes if process.is_alive()]
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+        logger.info(f"👷 Сигнал {signal.Signals(signum).name} передан процессам: {pids}")
+
+    def replace_queue(self, index: int) -> None:
+        """
+        Новая очередь для перезапускаемого процесса; обновления, ещё не
+        взятые из старой, переносятся (если её блокировка чтения свободна)
+        """
+        old = self.queues[index]
+        self.queues[index] = self.context.Queue(maxsize=SUPERVISOR_QUEUE_SIZE)
+        moved = 0
+        while True:
+            try:
+                # get_nowait не ждёт блокировку чтения, оставшуюся за убитым процессом
+                self.queues[index].put_nowait(old.get_nowait())
+            except (queue_module.Empty, queue_module.Full):
+                break
+            moved += 1
+        lost = old.qsize()
+        old.close()
+        old.cancel_join_thread()
+        logger.info(f"👷 Процесс {index}: новая очередь, перенесено обновлений {moved}")
+        if lost:
+            logger.error(f"💀 Процесс {index}: потеряно обновлений из старой очереди {lost}")
+
+    async def monitor(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            await asyncio.to_thread(self.check_workers)
+
+    async def route(self, update: Dict[str, Any]) -> None:
+        """Отправить обновление процессу по user_id (ждёт, если его очередь полна)"""
+        user_id = update_user_id(update)
+        index = user_id % len(self.queues)
+        loop = asyncio.get_running_loop()
+        while True:
+            # Очередь берётся заново: процесс могли перезапустить с новой
+            target = self.queues[index]
+            try:
+                target.put_nowait((user_id, update))
+                break
+            except queue_module.Full:
+                pass
+            try:
+                await loop.run_in_executor(None, target.put, (user_id, update), True, QUEUE_POLL_TIMEOUT)
+                break
+            except queue_module.Full:
+                continue
+        self.routed += 1
+
+    def stop(self) -> None:
+        # Дождаться перезапуска, начатого монитором, — иначе новый процесс
+        # не получит сигнал остановки
+        self._restart_lock.acquire()
+        for updates in self.queues:
+            try:
+                updates.put(None, timeout=5)
+            except queue_module.Full:
+                pass
+        for process in self.processes:
+            process.join(timeout=15)
+            if process.is_alive():
+                process.kill()
+        logger.info(f"👷 Супервизор остановлен: обновлений {self.routed}, перезапусков {self.restarts}")
+
+
+async def poll_updates(supervisor: Supervisor, allowed_updates: List[str]) -> None:
+    """Long polling getUpdates без разбора обновлений в объекты aiogram"""
+    url = f"{supervisor.api_url}/bot{BOT_TOKEN}/getUpdates"
+    timeout = aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)
+    offset = 0
+    backoff = 1.0
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        while True:
+            try:
+                async with session.post(url, json={
+                    "offset": offset,
+                    "timeout": POLLING_TIMEOUT,
+                    "allowed_updates": allowed_updates,
+                }) as response:
+                    result = await response.json()
+                if not result.get("ok"):
+                    raise RuntimeError(result.get("description"))
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка getUpdates: {e}, повтор через {backoff:.0f} с")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            for update in result["result"]:
+                await supervisor.route(update)
+                offset = update["update_id"] + 1
+
+
+async def run_supervisor(workers: int = SUPERVISOR_WORKERS,
+                         api_url: str = TELEGRAM_API_URL) -> None:
+    """Запустить рабочие процессы и раздавать им обновления до остановки"""
+    from bot import set_bot_commands
+    from handlers import all_routers
+
+    bot = make_bot(api_url)
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await set_bot_commands(bot)
+    finally:
+        await bot.session.close()
+
+    # Типы обновлений, на которые есть обработчики
+    allowed_updates = sorted({update_type for router in all_routers
+                              for update_type in router.resolve_used_update_types()})
+
+    supervisor = Supervisor(workers, api_url)
+    supervisor.start()
+    # SIGUSR1 (профилирование, см. utils.profiling) по умолчанию завершает
+    # процесс: главный пересылает его рабочим, профилируется каждый из них
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGUSR1, supervisor.signal_workers, signal.SIGUSR1
+        )
+    monitor = asyncio.create_task(supervisor.monitor())
+    try:
+        logger.info("🔄 Запуск polling в супервизоре...")
+        await poll_updates(supervisor, allowed_updates)
+    finally:
+        monitor.cancel()
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    from utils.logging_setup import setup_logging
+    setup_logging()
+    try:
+        asyncio.run(run_supervisor())
+    except KeyboardInterrupt:
+        logger.info("Супервизор остановлен пользователем")
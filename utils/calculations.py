@@ -3,54 +3,7 @@
 """
 from typing import Dict, Any, Optional
 
-
-# Коэффициенты сжигания калорий для разных типов тренировок (ккал/мин на кг веса)
-WORKOUT_CALORIES = {
-    # Кардио
-    "бег": 0.13,
-    "бег трусцой": 0.10,
-    "спринт": 0.18,
-    "ходьба": 0.05,
-    "быстрая ходьба": 0.07,
-    "велосипед": 0.08,
-    "велотренажер": 0.07,
-    "плавание": 0.10,
-    "прыжки": 0.12,
-    "скакалка": 0.14,
-    "танцы": 0.08,
-    "аэробика": 0.09,
-    "степ": 0.10,
-    "эллипс": 0.08,
-    "гребля": 0.09,
-    
-    # Силовые
-    "силовая": 0.05,
-    "тренажерный зал": 0.05,
-    "качалка": 0.05,
-    "штанга": 0.06,
-    "гантели": 0.05,
-    "кроссфит": 0.12,
-    "воркаут": 0.08,
-    "отжимания": 0.07,
-    "приседания": 0.06,
-    "планка": 0.04,
-    
-    # Спортивные игры
-    "футбол": 0.10,
-    "баскетбол": 0.09,
-    "волейбол": 0.06,
-    "теннис": 0.08,
-    "бадминтон": 0.07,
-    "хоккей": 0.10,
-    "бокс": 0.12,
-    "борьба": 0.11,
-    
-    # Другое
-    "йога": 0.04,
-    "пилатес": 0.04,
-    "растяжка": 0.03,
-    "медитация": 0.01,
-}
+from utils.reference_data import get_catalog
 
 
 def calculate_water_goal(weight: float, activity_minutes: int, 
@@ -145,6 +98,38 @@ def calculate_calorie_goal(weight: float, height: float, age: int,
     }
 
 
+def calculate_daily_progress(weight: float, activity_minutes: int, calorie_goal: float,
+                             summary: Dict[str, Any],
+                             temperature: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Рассчитать прогресс за день по сводке (см. database.get_today_summary)
+    
+    Норма воды считается с учётом погоды и дополнительной воды от
+    тренировок, калории — как баланс потреблённых и сожжённых.
+    
+    Returns:
+        Dict с выпитой водой, нормой, остатком и процентом, а также
+        потреблёнными, сожжёнными калориями, балансом, остатком и процентом
+    """
+    water = summary["water"]
+    water_goal = calculate_water_goal(weight, activity_minutes, temperature)["total"] \
+        + summary["extra_water"]
+    calorie_balance = summary["calories_consumed"] - summary["calories_burned"]
+    
+    return {
+        "water": water,
+        "water_goal": water_goal,
+        "water_remaining": max(0, water_goal - water),
+        "water_percent": min(100, int(water / water_goal * 100)) if water_goal > 0 else 0,
+        "calories_consumed": summary["calories_consumed"],
+        "calories_burned": summary["calories_burned"],
+        "calorie_goal": calorie_goal,
+        "calorie_balance": calorie_balance,
+        "calorie_remaining": max(0, calorie_goal - calorie_balance),
+        "calorie_percent": min(150, int(calorie_balance / calorie_goal * 100)) if calorie_goal > 0 else 0,
+    }
+
+
 def calculate_workout_calories(workout_type: str, duration_minutes: int, 
                                 weight: float) -> Dict[str, Any]:
     """
@@ -159,11 +144,10 @@ def calculate_workout_calories(workout_type: str, duration_minutes: int,
     cal_per_min_per_kg = None
     matched_type = workout_type
     
-    for key, value in WORKOUT_CALORIES.items():
-        if key in workout_lower or workout_lower in key:
-            cal_per_min_per_kg = value
-            matched_type = key
-            break
+    # Коэффициенты сжигания калорий (ккал/мин на кг веса) — из справочника
+    match = get_catalog().find_workout(workout_lower)
+    if match:
+        matched_type, cal_per_min_per_kg = match
     
     # Если не нашли - используем среднее значение
     if cal_per_min_per_kg is None:
@@ -225,8 +209,9 @@ def get_workout_recommendations(current_calories: float, goal_calories: float,
             ("скакалка", "⏱️"),
         ]
         
+        catalog = get_catalog()
         for workout, emoji in workouts_to_suggest:
-            cal_rate = WORKOUT_CALORIES.get(workout, 0.07)
+            cal_rate = catalog.get_workout_rate(workout) or 0.07
             minutes_needed = excess / (cal_rate * weight)
             
             if minutes_needed <= 90:  # Реалистичное время тренировки
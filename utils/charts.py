@@ -1,96 +1,352 @@
 """
 Модуль для создания графиков прогресса
+
+Графики строятся через объектный API matplotlib (Figure + FigureCanvasAgg)
+без глобального состояния pyplot. Оформление фигуры (фон, шрифты, оси,
+столбцы, подписи) создаётся один раз в шаблоне, а при каждом запросе
+меняются только высоты столбцов, подписи и линия цели. Шаблоны хранятся
+отдельно для каждого потока, поэтому рендерить можно из рабочих потоков.
+
+matplotlib импортируется при создании первого шаблона: процессу, который
+только кэширует графики или рисует их через utils.charts_pil, он не нужен.
 """
+import hashlib
 import io
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
-import matplotlib
-matplotlib.use('Agg')  # Используем не-интерактивный бэкенд
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.figure import Figure
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Set, Tuple
 
+import numpy as np
 
-def create_water_progress_chart(history: List[Dict[str, Any]], 
-                                  goal: int,
-                                  today_consumed: int) -> io.BytesIO:
+from utils.series import build_week_series, goal_colors
+
+
+# ==================== КЭШ ГРАФИКОВ ====================
+
+class ChartCache:
     """
-    Создать график прогресса по воде за неделю
+    LRU-кэш готовых графиков с ограничением по количеству и по объёму
+
+    Хранит закодированные изображения (chart_cache) или file_id уже отправленных в Telegram
+    графиков (chart_file_ids); объём считается по длине значения.
+
+    Ключ — отпечаток данных графика (см. make_chart_key), поэтому при любом
+    изменении данных ключ меняется. Дополнительно записи пользователя
+    сбрасываются при новых записях в БД, чтобы не держать устаревшие графики.
+    Сброс вызывается из потоков функций БД, поэтому операции идут под блокировкой.
     """
-    fig, ax = plt.subplots(figsize=(10, 6))
     
-    # Настройка стиля
-    plt.style.use('seaborn-v0_8-whitegrid')
-    fig.patch.set_facecolor('#1a1a2e')
-    ax.set_facecolor('#16213e')
+    def __init__(self, max_items: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._user_keys: Dict[int, Set[tuple]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: tuple) -> Optional[Any]:
+        """Получить значение по ключу (None если нет в кэше)"""
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: tuple, value: Any) -> None:
+        """Сохранить значение и вытеснить самые старые записи сверх лимитов"""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = value
+            self._user_keys.setdefault(key[0], set()).add(key)
+            self.total_bytes += len(value)
+            
+            while len(self._items) > self.max_items or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._items)))
+    
+    def invalidate_user(self, user_id: int) -> None:
+        """Удалить все графики пользователя"""
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+    
+    def _remove(self, key: tuple) -> None:
+        value = self._items.pop(key)
+        self.total_bytes -= len(value)
+        user_keys = self._user_keys.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[key[0]]
+    
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+chart_cache = ChartCache()
+
+# file_id отправленных графиков: повторная отправка без загрузки PNG
+chart_file_ids = ChartCache(max_items=10000, max_bytes=2 * 1024 * 1024)
+
+
+def make_chart_key(user_id: int, date_range: Tuple[str, str],
+                   goals: Tuple[float, ...], *series: Any) -> tuple:
+    """
+    Ключ кэша графика: (user_id, диапазон дат, цели, хэш рядов данных)
+    """
+    series_hash = hashlib.blake2b(repr(series).encode(), digest_size=16).hexdigest()
+    return (user_id, date_range, goals, series_hash)
+
+
+# ==================== ШАБЛОНЫ ГРАФИКОВ ====================
+
+BACKGROUND_COLOR = '#1a1a2e'
+AXES_COLOR = '#16213e'
+GOAL_REACHED_COLOR = '#4ecca3'
+WATER_COLOR = '#00d9ff'
+CONSUMED_COLOR = '#ff6b6b'
+BURNED_COLOR = '#4ecca3'
+
+CHART_DPI = 150
+
+# Больше столбцов — подписи значений не помещаются, а подписи дат прореживаются
+MAX_ANNOTATED_BARS = 14
+MAX_TICK_LABELS = 16
+
+# Шаблоны фигур текущего потока: {(класс, число столбцов): шаблон}
+_templates = threading.local()
+
+
+def _style_axes(ax, title: str, title_size: int,
+                xlabel: Optional[str] = None, ylabel: Optional[str] = None) -> None:
+    """Общее оформление осей"""
+    ax.set_facecolor(AXES_COLOR)
+    ax.set_title(title, fontsize=title_size, color='white', fontweight='bold',
+                 pad=20 if xlabel else 6)
+    if xlabel:
+        ax.set_xlabel(xlabel, fontsize=12, color='white', fontweight='bold')
+    if ylabel:
+        ax.set_ylabel(ylabel, fontsize=12, color='white', fontweight='bold')
+    ax.tick_params(colors='white')
+    ax.grid(axis='y', color='white', alpha=0.15)
+    ax.set_axisbelow(True)
+    # Запас по оси Y под пятизначные подписи, чтобы отступы не менялись
+    ax.set_ylim(0, 10000)
+
+
+def _make_annotations(ax, positions, fontsize: int, bold: bool = False) -> list:
+    """Подписи значений над столбцами (текст и высота меняются при рендере)"""
+    return [
+        ax.annotate('', xy=(x, 0), xytext=(0, 3), textcoords="offset points",
+                    ha='center', va='bottom', fontsize=fontsize, color='white',
+                    fontweight='bold' if bold else 'normal')
+        for x in positions
+    ] if len(positions) <= MAX_ANNOTATED_BARS else []
+
+
+def _legend_text(ax, legend, handle):
+    """Текст легенды, соответствующий элементу графика"""
+    handles, _ = ax.get_legend_handles_labels()
+    return legend.get_texts()[handles.index(handle)]
+
+
+def _set_bars(bars, annotations, values, colors=None, hide_zero: bool = False) -> None:
+    """Обновить высоты столбцов, их цвета и подписи"""
+    for i, (bar, value) in enumerate(zip(bars, values)):
+        bar.set_height(value)
+        if colors is not None:
+            bar.set_facecolor(colors[i])
+        if annotations:
+            annotation = annotations[i]
+            annotation.xy = (bar.get_x() + bar.get_width() / 2, value)
+            annotation.set_text(f'{int(value)}')
+            annotation.set_visible(not hide_zero or value > 0)
+
+
+class _ChartTemplate(ABC):
+    """Базовый шаблон: фигура с холстом Agg и рендер в PNG"""
     
-    # Подготовка данных
-    dates = []
-    amounts = []
+    figsize = (10, 6)
     
-    # Создаём полный список дат за последние 7 дней
-    today = datetime.now().date()
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        dates.append(date)
+    def __init__(self, n: int):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
         
-        # Ищем данные для этой даты
-        amount = 0
-        for h in history:
-            if h['date'] == date.isoformat():
-                amount = h['amount']
-                break
+        self.n = n
+        self.fig = Figure(figsize=self.figsize, facecolor=BACKGROUND_COLOR)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.build()
+        self.fig.tight_layout()
+    
+    @abstractmethod
+    def build(self) -> None:
+        """Создать оси и неизменяемое оформление фигуры"""
+    
+    def set_xticklabels(self, ax, labels: List[str]) -> None:
+        step = -(-len(labels) // MAX_TICK_LABELS)
+        ax.set_xticks(range(self.n))
+        ax.set_xticklabels([label if i % step == 0 else '' for i, label in enumerate(labels)])
+    
+    def render(self) -> io.BytesIO:
+        buf = io.BytesIO()
+        self.fig.savefig(buf, format='png', dpi=CHART_DPI, facecolor=BACKGROUND_COLOR)
+        buf.seek(0)
+        return buf
+    
+    def render_image(self, width: int):
+        """Отрисовать в RGB-изображение Pillow шириной width пикселей"""
+        from PIL import Image
         
-        # Для сегодняшнего дня используем актуальные данные
-        if date == today:
-            amount = today_consumed
-            
-        amounts.append(amount)
-    
-    # Цвета для столбцов (зелёный если цель достигнута, синий если нет)
-    colors = ['#4ecca3' if a >= goal else '#00d9ff' for a in amounts]
-    
-    # Построение столбчатой диаграммы
-    bars = ax.bar(dates, amounts, color=colors, alpha=0.8, edgecolor='white', linewidth=1)
-    
-    # Линия цели
-    ax.axhline(y=goal, color='#ff6b6b', linestyle='--', linewidth=2, label=f'Цель: {goal} мл')
-    
-    # Добавляем значения над столбцами
-    for bar, amount in zip(bars, amounts):
-        height = bar.get_height()
-        ax.annotate(f'{int(amount)}',
-                    xy=(bar.get_x() + bar.get_width() / 2, height),
-                    xytext=(0, 3),
-                    textcoords="offset points",
-                    ha='center', va='bottom',
-                    fontsize=10, fontweight='bold',
-                    color='white')
-    
-    # Настройка осей
-    ax.set_xlabel('Дата', fontsize=12, color='white', fontweight='bold')
-    ax.set_ylabel('Вода (мл)', fontsize=12, color='white', fontweight='bold')
-    ax.set_title('💧 Потребление воды за неделю', fontsize=16, color='white', fontweight='bold', pad=20)
-    
-    # Форматирование дат
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
-    ax.tick_params(colors='white')
+        # DPI подбирается под нужную ширину: пропорции текста и отступов сохраняются
+        self.fig.set_dpi(width / self.figsize[0])
+        self.canvas.draw()
+        return Image.frombuffer('RGBA', self.canvas.get_width_height(),
+                                self.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1).convert('RGB')
+
+
+class _WaterChart(_ChartTemplate):
+    """Вода: столбцы по дням (зелёные при достижении цели) и линия цели"""
+    
+    def build(self) -> None:
+        ax = self.ax = self.fig.add_subplot()
+        _style_axes(ax, '💧 Потребление воды за неделю', 16, 'Дата', 'Вода (мл)')
+        x = range(self.n)
+        self.bars = ax.bar(x, [0] * self.n, color=WATER_COLOR, alpha=0.8,
+                           edgecolor='white', linewidth=1)
+        self.annotations = _make_annotations(ax, x, 10, bold=True)
+        self.goal_line = ax.axhline(y=0, color='#ff6b6b', linestyle='--', linewidth=2,
+                                    label='Цель')
+        self.legend = ax.legend(loc='upper right', facecolor=AXES_COLOR,
+                                edgecolor='white', labelcolor='white')
+        self.goal_text = _legend_text(ax, self.legend, self.goal_line)
+    
+    def update(self, labels: List[str], amounts: np.ndarray, goal: int) -> None:
+        colors = goal_colors(amounts, goal, GOAL_REACHED_COLOR, WATER_COLOR)
+        _set_bars(self.bars, self.annotations, amounts, colors)
+        self.goal_line.set_ydata([goal, goal])
+        self.goal_text.set_text(f'Цель: {goal} мл')
+        self.set_xticklabels(self.ax, labels)
+        self.ax.set_ylim(0, max(amounts.max() * 1.2, goal * 1.2) or 1)
+
+
+class _CaloriesChart(_ChartTemplate):
+    """Калории: пары столбцов «потреблено / сожжено» и линия цели"""
     
-    # Легенда
-    ax.legend(loc='upper right', facecolor='#16213e', edgecolor='white', labelcolor='white')
+    width = 0.35
     
-    # Установка лимитов
-    ax.set_ylim(0, max(max(amounts) * 1.2, goal * 1.2))
+    def build(self) -> None:
+        ax = self.ax = self.fig.add_subplot()
+        _style_axes(ax, '🔥 Калории за неделю', 16, 'Дата', 'Калории (ккал)')
+        self._build_bars(ax, annotate=True)
+        self.legend = ax.legend(loc='upper right', facecolor=AXES_COLOR,
+                                edgecolor='white', labelcolor='white')
+        self.goal_text = _legend_text(ax, self.legend, self.goal_line)
+    
+    def _build_bars(self, ax, annotate: bool) -> None:
+        x = range(self.n)
+        self.consumed_bars = ax.bar([i - self.width / 2 for i in x], [0] * self.n, self.width,
+                                    label='Потреблено', color=CONSUMED_COLOR, alpha=0.8,
+                                    edgecolor='white' if annotate else None)
+        self.burned_bars = ax.bar([i + self.width / 2 for i in x], [0] * self.n, self.width,
+                                  label='Сожжено', color=BURNED_COLOR, alpha=0.8,
+                                  edgecolor='white' if annotate else None)
+        self.consumed_annotations = []
+        self.burned_annotations = []
+        if annotate:
+            self.consumed_annotations = _make_annotations(ax, x, 8)
+            self.burned_annotations = _make_annotations(ax, x, 8)
+        self.goal_line = ax.axhline(y=0, color='#feca57', linestyle='--', linewidth=2,
+                                    label='Цель')
+    
+    def update(self, labels: List[str], consumed: np.ndarray, burned: np.ndarray,
+               goal: float) -> None:
+        self.update_calories(self.ax, labels, consumed, burned, goal)
+        self.goal_text.set_text(f'Цель: {int(goal)} ккал')
+        max_val = max(consumed.max(initial=0), burned.max(initial=0), goal)
+        self.ax.set_ylim(0, max_val * 1.2 or 1)
+    
+    def update_calories(self, ax, labels, consumed, burned, goal) -> None:
+        _set_bars(self.consumed_bars, self.consumed_annotations, consumed, hide_zero=True)
+        _set_bars(self.burned_bars, self.burned_annotations, burned, hide_zero=True)
+        self.goal_line.set_ydata([goal, goal])
+        self.set_xticklabels(ax, labels)
+
+
+class _CombinedChart(_CaloriesChart):
+    """Комбинированный график: вода сверху, калории снизу"""
     
-    plt.tight_layout()
+    figsize = (12, 10)
     
-    # Сохранение в буфер
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=150, facecolor=fig.get_facecolor())
-    buf.seek(0)
-    plt.close(fig)
+    def build(self) -> None:
+        ax1, ax2 = self.ax1, self.ax2 = self.fig.subplots(2, 1)
+        
+        # ===== ГРАФИК ВОДЫ =====
+        _style_axes(ax1, '💧 Вода (мл)', 14)
+        self.water_title = ax1.title
+        x = range(self.n)
+        self.water_bars = ax1.bar(x, [0] * self.n, color=WATER_COLOR, alpha=0.8,
+                                  edgecolor='white')
+        self.water_annotations = _make_annotations(ax1, x, 9)
+        self.water_goal_line = ax1.axhline(y=0, color='#ff6b6b', linestyle='--', linewidth=2)
+        
+        # ===== ГРАФИК КАЛОРИЙ =====
+        _style_axes(ax2, '🔥 Калории (ккал)', 14)
+        self.calories_title = ax2.title
+        self._build_bars(ax2, annotate=False)
+        self.goal_line.set_label('_goal')  # линия цели калорий без легенды
+        ax2.legend(loc='upper right', facecolor=AXES_COLOR,
+                   edgecolor='white', labelcolor='white')
+    
+    def update(self, labels: List[str], water_amounts: np.ndarray, water_goal: int,
+               consumed: np.ndarray, burned: np.ndarray, calorie_goal: float,
+               per_day_average: bool = False) -> None:
+        suffix = ', в среднем за день' if per_day_average else ''
+        self.water_title.set_text(f'💧 Вода (мл{suffix})')
+        self.calories_title.set_text(f'🔥 Калории (ккал{suffix})')
+        
+        colors = goal_colors(water_amounts, water_goal, GOAL_REACHED_COLOR, WATER_COLOR)
+        _set_bars(self.water_bars, self.water_annotations, water_amounts, colors)
+        self.water_goal_line.set_ydata([water_goal, water_goal])
+        self.set_xticklabels(self.ax1, labels)
+        self.ax1.set_ylim(0, max(water_amounts.max() * 1.2, water_goal * 1.2) or 1)
+        
+        self.update_calories(self.ax2, labels, consumed, burned, calorie_goal)
+        max_val = max(consumed.max(initial=0), calorie_goal)
+        self.ax2.set_ylim(0, max_val * 1.2 or 1)
+
+
+def _get_template(template_class, n: int) -> _ChartTemplate:
+    """Шаблон фигуры для текущего потока (создаётся при первом обращении)"""
+    cache = getattr(_templates, 'cache', None)
+    if cache is None:
+        cache = _templates.cache = {}
+    key = (template_class, n)
+    if key not in cache:
+        cache[key] = template_class(n)
+    return cache[key]
+
+
+# ==================== ПОСТРОЕНИЕ ГРАФИКОВ ====================
+
+def create_water_progress_chart(history: List[Dict[str, Any]], 
+                                  goal: int,
+                                  today_consumed: int) -> io.BytesIO:
+    """
+    Создать график прогресса по воде за неделю
+    """
+    series = build_week_series(history, [], [], today_water=today_consumed)
     
-    return buf
+    chart = _get_template(_WaterChart, len(series['dates']))
+    chart.update(series['labels'], series['water'], goal)
+    return chart.render()
 
 
 def create_calories_progress_chart(food_history: List[Dict[str, Any]],
@@ -101,104 +357,12 @@ def create_calories_progress_chart(food_history: List[Dict[str, Any]],
     """
     Создать график прогресса по калориям за неделю
     """
-    fig, ax = plt.subplots(figsize=(10, 6))
-    
-    # Настройка стиля
-    fig.patch.set_facecolor('#1a1a2e')
-    ax.set_facecolor('#16213e')
-    
-    # Подготовка данных
-    today = datetime.now().date()
-    dates = []
-    consumed = []
-    burned = []
-    
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        dates.append(date)
-        
-        # Потреблённые калории
-        cons = 0
-        for h in food_history:
-            if h['date'] == date.isoformat():
-                cons = h['calories']
-                break
-        
-        # Сожжённые калории
-        burn = 0
-        for h in workout_history:
-            if h['date'] == date.isoformat():
-                burn = h['calories']
-                break
-        
-        # Для сегодняшнего дня используем актуальные данные
-        if date == today:
-            cons = today_consumed
-            burn = today_burned
-            
-        consumed.append(cons)
-        burned.append(burn)
+    series = build_week_series([], food_history, workout_history,
+                               today_consumed=today_consumed, today_burned=today_burned)
     
-    # Позиции столбцов
-    x = range(len(dates))
-    width = 0.35
-    
-    # Построение столбцов
-    bars1 = ax.bar([i - width/2 for i in x], consumed, width, 
-                   label='Потреблено', color='#ff6b6b', alpha=0.8, edgecolor='white')
-    bars2 = ax.bar([i + width/2 for i in x], burned, width, 
-                   label='Сожжено', color='#4ecca3', alpha=0.8, edgecolor='white')
-    
-    # Линия цели
-    ax.axhline(y=goal, color='#feca57', linestyle='--', linewidth=2, label=f'Цель: {int(goal)} ккал')
-    
-    # Добавляем значения над столбцами
-    for bar in bars1:
-        height = bar.get_height()
-        if height > 0:
-            ax.annotate(f'{int(height)}',
-                        xy=(bar.get_x() + bar.get_width() / 2, height),
-                        xytext=(0, 3),
-                        textcoords="offset points",
-                        ha='center', va='bottom',
-                        fontsize=8, color='white')
-    
-    for bar in bars2:
-        height = bar.get_height()
-        if height > 0:
-            ax.annotate(f'{int(height)}',
-                        xy=(bar.get_x() + bar.get_width() / 2, height),
-                        xytext=(0, 3),
-                        textcoords="offset points",
-                        ha='center', va='bottom',
-                        fontsize=8, color='white')
-    
-    # Настройка осей
-    ax.set_xlabel('Дата', fontsize=12, color='white', fontweight='bold')
-    ax.set_ylabel('Калории (ккал)', fontsize=12, color='white', fontweight='bold')
-    ax.set_title('🔥 Калории за неделю', fontsize=16, color='white', fontweight='bold', pad=20)
-    
-    # Метки на оси X
-    ax.set_xticks(x)
-    ax.set_xticklabels([d.strftime('%d.%m') for d in dates])
-    ax.tick_params(colors='white')
-    
-    # Легенда
-    ax.legend(loc='upper right', facecolor='#16213e', edgecolor='white', labelcolor='white')
-    
-    # Установка лимитов
-    max_val = max(max(consumed) if consumed else 0, max(burned) if burned else 0, goal)
-    ax.set_ylim(0, max_val * 1.2)
-    
-    plt.tight_layout()
-    
-    # Сохранение в буфер
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=150, facecolor=fig.get_facecolor())
-    buf.seek(0)
-    plt.close(fig)
-    
-    return buf
+    chart = _get_template(_CaloriesChart, len(series['dates']))
+    chart.update(series['labels'], series['consumed'], series['burned'], goal)
+    return chart.render()
 
 
 def create_combined_progress_chart(water_history: List[Dict[str, Any]],
@@ -212,95 +376,52 @@ def create_combined_progress_chart(water_history: List[Dict[str, Any]],
     """
     Создать комбинированный график прогресса
     """
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-    
-    # Настройка стиля
-    fig.patch.set_facecolor('#1a1a2e')
+    series = build_week_series(water_history, food_history, workout_history,
+                               today_water, today_consumed, today_burned)
     
-    today = datetime.now().date()
-    dates = []
-    for i in range(6, -1, -1):
-        dates.append(today - timedelta(days=i))
-    
-    # ===== ГРАФИК ВОДЫ =====
-    ax1.set_facecolor('#16213e')
-    
-    water_amounts = []
-    for date in dates:
-        amount = 0
-        for h in water_history:
-            if h['date'] == date.isoformat():
-                amount = h['amount']
-                break
-        if date == today:
-            amount = today_water
-        water_amounts.append(amount)
-    
-    colors = ['#4ecca3' if a >= water_goal else '#00d9ff' for a in water_amounts]
-    bars = ax1.bar(dates, water_amounts, color=colors, alpha=0.8, edgecolor='white')
-    ax1.axhline(y=water_goal, color='#ff6b6b', linestyle='--', linewidth=2)
-    
-    for bar, amount in zip(bars, water_amounts):
-        height = bar.get_height()
-        ax1.annotate(f'{int(amount)}',
-                    xy=(bar.get_x() + bar.get_width() / 2, height),
-                    xytext=(0, 3), textcoords="offset points",
-                    ha='center', va='bottom', fontsize=9, color='white')
-    
-    ax1.set_title('💧 Вода (мл)', fontsize=14, color='white', fontweight='bold')
-    ax1.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
-    ax1.tick_params(colors='white')
-    ax1.set_ylim(0, max(max(water_amounts) * 1.2, water_goal * 1.2))
-    
-    # ===== ГРАФИК КАЛОРИЙ =====
-    ax2.set_facecolor('#16213e')
-    
-    consumed = []
-    burned = []
-    for date in dates:
-        cons = 0
-        burn = 0
-        for h in food_history:
-            if h['date'] == date.isoformat():
-                cons = h['calories']
-                break
-        for h in workout_history:
-            if h['date'] == date.isoformat():
-                burn = h['calories']
-                break
-        if date == today:
-            cons = today_consumed
-            burn = today_burned
-        consumed.append(cons)
-        burned.append(burn)
-    
-    # Баланс калорий (потреблено - сожжено)
-    balance = [c - b for c, b in zip(consumed, burned)]
-    colors = ['#4ecca3' if bal <= calorie_goal else '#ff6b6b' for bal in balance]
-    
-    x = range(len(dates))
-    width = 0.35
-    
-    ax2.bar([i - width/2 for i in x], consumed, width, label='Потреблено', color='#ff6b6b', alpha=0.8)
-    ax2.bar([i + width/2 for i in x], burned, width, label='Сожжено', color='#4ecca3', alpha=0.8)
-    ax2.axhline(y=calorie_goal, color='#feca57', linestyle='--', linewidth=2)
-    
-    ax2.set_title('🔥 Калории (ккал)', fontsize=14, color='white', fontweight='bold')
-    ax2.set_xticks(x)
-    ax2.set_xticklabels([d.strftime('%d.%m') for d in dates])
-    ax2.tick_params(colors='white')
-    ax2.legend(loc='upper right', facecolor='#16213e', edgecolor='white', labelcolor='white')
-    
-    max_val = max(max(consumed) if consumed else 0, calorie_goal)
-    ax2.set_ylim(0, max_val * 1.2)
-    
-    plt.tight_layout()
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=150, facecolor=fig.get_facecolor())
-    buf.seek(0)
-    plt.close(fig)
-    
-    return buf
+    chart = _get_template(_CombinedChart, len(series['dates']))
+    chart.update(series['labels'], series['water'], water_goal,
+                 series['consumed'], series['burned'], calorie_goal)
+    return chart.render()
+
+
+def _range_chart(series: Dict[str, Any], water_goal: int,
+                 calorie_goal: float) -> _CombinedChart:
+    chart = _get_template(_CombinedChart, len(series['dates']))
+    chart.update(series['labels'], series['water'], water_goal,
+                 series['consumed'], series['burned'], calorie_goal,
+                 per_day_average=series['bucket'] != 'day')
+    return chart
+
+
+def create_range_progress_chart(series: Dict[str, Any],
+                                water_goal: int,
+                                calorie_goal: float) -> io.BytesIO:
+    """
+    Создать комбинированный график за произвольный период
+
+    series — результат utils.series.build_range_series (дни, недели или месяцы)
+    """
+    return _range_chart(series, water_goal, calorie_goal).render()
+
 
+def draw_range_progress_chart(series: Dict[str, Any],
+                              water_goal: int,
+                              calorie_goal: float,
+                              width: int):
+    """
+    Нарисовать график за период в изображение Pillow шириной width пикселей
+    (для кодирования через utils.image_encoding)
+    """
+    return _range_chart(series, water_goal, calorie_goal).render_image(width)
 
+
+def get_range_chart_drawer(backend: str = 'matplotlib'):
+    """
+    Функция рисования графика за период для выбранного бэкенда
+    (config.CHART_BACKEND: matplotlib или pillow)
+    """
+    if backend == 'pillow':
+        from utils.charts_pil import draw_range_progress_chart as pillow_drawer
+        return pillow_drawer
+    return draw_range_progress_chart
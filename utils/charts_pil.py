@@ -0,0 +1,242 @@
+"""
+Лёгкий рендерер стандартных графиков без matplotlib
+
+Рисует ту же раскладку, что и utils.charts (вода сверху, калории снизу,
+столбцы и пунктирная линия цели), напрямую через Pillow в палитровое
+изображение. Импорт занимает десятки миллисекунд вместо сотен, а PNG
+с палитрой из полутора десятков цветов в несколько раз меньше.
+
+Выбирается в config.py: CHART_BACKEND=pillow.
+"""
+import io
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.series import build_week_series
+
+
+WIDTH = 1200
+HEIGHT = 1000
+MARGIN_LEFT = 80
+MARGIN_RIGHT = 25
+MARGIN_TOP = 50
+MARGIN_BOTTOM = 40
+
+MAX_ANNOTATED_BARS = 14
+MAX_TICK_LABELS = 16
+
+# Шрифты: DejaVu есть почти в любом дистрибутиве (в Docker — fonts-dejavu-core)
+FONT_CANDIDATES = ("DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+BOLD_FONT_CANDIDATES = ("DejaVuSans-Bold.ttf",
+                        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+
+
+def _blend(color: str, background: str, alpha: float) -> Tuple[int, int, int]:
+    """Цвет с прозрачностью alpha поверх фона (палитра без альфа-канала)"""
+    fg = [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+    bg = [int(background[i:i + 2], 16) for i in (1, 3, 5)]
+    return tuple(round(f * alpha + b * (1 - alpha)) for f, b in zip(fg, bg))
+
+
+# Палитра: имя -> индекс цвета
+_COLORS = {
+    'background': _blend('#1a1a2e', '#1a1a2e', 1),
+    'axes': _blend('#16213e', '#16213e', 1),
+    'white': (255, 255, 255),
+    'grid': _blend('#ffffff', '#16213e', 0.15),
+    'water': _blend('#00d9ff', '#16213e', 0.8),
+    'reached': _blend('#4ecca3', '#16213e', 0.8),
+    'consumed': _blend('#ff6b6b', '#16213e', 0.8),
+    'burned': _blend('#4ecca3', '#16213e', 0.8),
+    'water_goal': _blend('#ff6b6b', '#16213e', 1),
+    'calorie_goal': _blend('#feca57', '#16213e', 1),
+}
+PALETTE = {name: i for i, name in enumerate(_COLORS)}
+_PALETTE_BYTES = [channel for rgb in _COLORS.values() for channel in rgb]
+
+_fonts: Dict[Tuple[int, bool], Any] = {}
+
+
+def _font(size: int, bold: bool = False):
+    """Шрифт нужного размера (загружается один раз)"""
+    key = (size, bold)
+    if key not in _fonts:
+        for path in (BOLD_FONT_CANDIDATES if bold else FONT_CANDIDATES):
+            try:
+                _fonts[key] = ImageFont.truetype(path, size)
+                break
+            except OSError:
+                continue
+        else:
+            _fonts[key] = ImageFont.load_default(size)
+    return _fonts[key]
+
+
+def _nice_ticks(max_value: float, count: int = 6) -> List[float]:
+    """«Круглые» деления оси Y от нуля до max_value"""
+    if max_value <= 0:
+        return [0]
+    raw_step = max_value / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for multiplier in (1, 2, 2.5, 5, 10):
+        step = multiplier * magnitude
+        if step >= raw_step:
+            break
+    return [i * step for i in range(int(max_value // step) + 1)]
+
+
+def _text_center(draw: ImageDraw.ImageDraw, xy: Tuple[float, float], text: str,
+                 font, anchor: str = 'ms') -> None:
+    draw.text(xy, text, fill=PALETTE['white'], font=font, anchor=anchor)
+
+
+def _dashed_hline(draw: ImageDraw.ImageDraw, x0: int, x1: int, y: int,
+                  color: int, dash: int = 14, gap: int = 8, width: int = 3) -> None:
+    for x in range(x0, x1, dash + gap):
+        draw.line([(x, y), (min(x + dash, x1), y)], fill=color, width=width)
+
+
+def _draw_panel(draw: ImageDraw.ImageDraw, box: Tuple[int, int, int, int], title: str,
+                labels: List[str], groups: List[Tuple[np.ndarray, Any]],
+                goal: float, goal_color: int, y_max: float,
+                legend: Optional[List[Tuple[str, int]]] = None) -> None:
+    """
+    Панель со столбцами: groups — [(значения, цвет или массив цветов)],
+    столбцы групп стоят рядом внутри одной позиции по X
+    """
+    left, top, right, bottom = box
+    ax_left, ax_top = left + MARGIN_LEFT, top + MARGIN_TOP
+    ax_right, ax_bottom = right - MARGIN_RIGHT, bottom - MARGIN_BOTTOM
+    draw.rectangle([ax_left, ax_top, ax_right, ax_bottom], fill=PALETTE['axes'],
+                   outline=PALETTE['background'])
+    _text_center(draw, ((left + right) / 2, top + 32), title, _font(22, bold=True))
+
+    def y_of(value: float) -> float:
+        return ax_bottom - (ax_bottom - ax_top) * value / y_max
+
+    # Сетка и подписи оси Y
+    tick_font = _font(15)
+    for tick in _nice_ticks(y_max):
+        y = y_of(tick)
+        draw.line([(ax_left, y), (ax_right, y)], fill=PALETTE['grid'])
+        _text_center(draw, (ax_left - 8, y), f'{int(tick)}', tick_font, anchor='rm')
+
+    n = len(labels)
+    slot = (ax_right - ax_left) / n
+    group_width = slot * (0.8 if len(groups) == 1 else 0.7)
+    bar_width = group_width / len(groups)
+    annotate = n <= MAX_ANNOTATED_BARS
+    step = -(-n // MAX_TICK_LABELS)
+    value_font = _font(13)
+
+    for i in range(n):
+        center = ax_left + slot * (i + 0.5)
+        if i % step == 0:
+            _text_center(draw, (center, ax_bottom + 8), labels[i], tick_font, anchor='mt')
+        for g, (values, colors) in enumerate(groups):
+            value = float(values[i])
+            color = PALETTE[colors[i] if isinstance(colors, np.ndarray) else colors]
+            x0 = center - group_width / 2 + g * bar_width
+            if value > 0:
+                draw.rectangle([x0, y_of(value), x0 + bar_width - 1, ax_bottom], fill=color)
+            if annotate and (value > 0 or len(groups) == 1):
+                _text_center(draw, (x0 + bar_width / 2, y_of(value) - 4), f'{int(value)}',
+                             value_font)
+
+    _dashed_hline(draw, ax_left, ax_right, round(y_of(goal)), goal_color)
+
+    # Легенда в правом верхнем углу
+    if legend:
+        legend_font = _font(16)
+        x = ax_right - 170
+        y = ax_top + 12
+        draw.rectangle([x - 10, y - 6, ax_right - 10, y + 28 * len(legend)],
+                       fill=PALETTE['axes'], outline=PALETTE['white'])
+        for text, color in legend:
+            draw.rectangle([x, y + 4, x + 28, y + 16], fill=color)
+            draw.text((x + 38, y + 10), text, fill=PALETTE['white'], font=legend_font,
+                      anchor='lm')
+            y += 28
+
+
+def _draw(series: Dict[str, Any], water_goal: int, calorie_goal: float,
+          per_day_average: bool) -> Image.Image:
+    """Нарисовать комбинированный график в палитровое изображение"""
+    image = Image.new('P', (WIDTH, HEIGHT), PALETTE['background'])
+    image.putpalette(_PALETTE_BYTES)
+    draw = ImageDraw.Draw(image)
+
+    suffix = ', в среднем за день' if per_day_average else ''
+    labels = series['labels']
+    water, consumed, burned = series['water'], series['consumed'], series['burned']
+
+    water_colors = np.where(water >= water_goal, 'reached', 'water')
+    _draw_panel(
+        draw, (0, 0, WIDTH, HEIGHT // 2), f'Вода (мл{suffix})', labels,
+        [(water, water_colors)], water_goal, PALETTE['water_goal'],
+        max(water.max() * 1.2, water_goal * 1.2) or 1
+    )
+    _draw_panel(
+        draw, (0, HEIGHT // 2, WIDTH, HEIGHT), f'Калории (ккал{suffix})', labels,
+        [(consumed, 'consumed'), (burned, 'burned')], calorie_goal, PALETTE['calorie_goal'],
+        max(consumed.max(initial=0), calorie_goal) * 1.2 or 1,
+        legend=[('Потреблено', PALETTE['consumed']), ('Сожжено', PALETTE['burned'])]
+    )
+    return image
+
+
+def _render(series: Dict[str, Any], water_goal: int, calorie_goal: float,
+            per_day_average: bool) -> io.BytesIO:
+    """Нарисовать комбинированный график и сохранить в палитровый PNG"""
+    buf = io.BytesIO()
+    _draw(series, water_goal, calorie_goal, per_day_average).save(buf, format='PNG', optimize=True)
+    buf.seek(0)
+    return buf
+
+
+def create_range_progress_chart(series: Dict[str, Any],
+                                water_goal: int,
+                                calorie_goal: float) -> io.BytesIO:
+    """
+    Создать комбинированный график за период (аналог utils.charts)
+    """
+    return _render(series, water_goal, calorie_goal,
+                   per_day_average=series['bucket'] != 'day')
+
+
+def draw_range_progress_chart(series: Dict[str, Any],
+                              water_goal: int,
+                              calorie_goal: float,
+                              width: int) -> Image.Image:
+    """
+    Нарисовать график за период в изображение шириной width пикселей
+    (аналог utils.charts)
+    """
+    image = _draw(series, water_goal, calorie_goal,
+                  per_day_average=series['bucket'] != 'day')
+    if width == WIDTH:
+        return image
+    # Масштабируем в RGB (сглаживание палитрового изображения даёт лесенку)
+    # и возвращаемся к исходной палитре, чтобы PNG остался маленьким
+    height = round(HEIGHT * width / WIDTH)
+    resized = image.convert('RGB').resize((width, height), Image.Resampling.LANCZOS)
+    return resized.quantize(palette=image, dither=Image.Dither.NONE)
+
+
+def create_combined_progress_chart(water_history: List[Dict[str, Any]],
+                                   food_history: List[Dict[str, Any]],
+                                   workout_history: List[Dict[str, Any]],
+                                   water_goal: int,
+                                   calorie_goal: float,
+                                   today_water: int,
+                                   today_consumed: float,
+                                   today_burned: float) -> io.BytesIO:
+    """
+    Создать комбинированный график за неделю (аналог utils.charts)
+    """
+    series = build_week_series(water_history, food_history, workout_history,
+                               today_water, today_consumed, today_burned)
+    return _render(series, water_goal, calorie_goal, per_day_average=False)
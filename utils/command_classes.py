@@ -0,0 +1,68 @@
+"""
+Классы команд по стоимости обработки
+
+Лимиты запросов (utils.rate_limit) задаются не для каждой команды,
+а для класса:
+    interactive — дешёвые записи и шаги диалогов (вода, тренировки, профиль)
+    lookup      — запросы к внешним API (поиск продукта, погода)
+    render      — построение графиков
+"""
+from typing import Any, Optional
+
+from aiogram.types import CallbackQuery, Message
+
+
+INTERACTIVE = "interactive"
+LOOKUP = "lookup"
+RENDER = "render"
+
+COMMAND_CLASSES = {
+    "show_charts": RENDER,
+    "log_food": LOOKUP,
+    "check_progress": LOOKUP,
+    "my_profile": LOOKUP,
+    "recommendations": LOOKUP,
+}
+
+# Команды бота: значения метки command в метриках (прочие — "other")
+KNOWN_COMMANDS = frozenset({
+    "start", "help", "cancel", "set_profile", "my_profile", "log_water", "log_food",
+    "log_workout", "check_progress", "show_charts", "recommendations", "water_reminders",
+    "profiling", "sql_report",
+})
+
+# Шаги диалогов, которые обращаются к внешним API
+STATE_CLASSES = {
+    "ProfileStates:waiting_for_city": LOOKUP,  # город проверяется через API погоды
+}
+
+
+def command_name(text: Optional[str]) -> Optional[str]:
+    """Имя команды из текста сообщения: '/show_charts@bot 30' -> 'show_charts'"""
+    if not text or not text.startswith("/"):
+        return None
+    return text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+
+
+def classify_event(event: Any, raw_state: Optional[str] = None) -> str:
+    """Класс стоимости сообщения или нажатия кнопки"""
+    if isinstance(event, Message):
+        command = command_name(event.text)
+        if command is not None:
+            return COMMAND_CLASSES.get(command, INTERACTIVE)
+        return STATE_CLASSES.get(raw_state, INTERACTIVE)
+    if isinstance(event, CallbackQuery):
+        return INTERACTIVE
+    return INTERACTIVE
+
+
+def command_label(event: Any) -> str:
+    """Метка обработчика для метрик: имя команды, 'message', 'callback' или 'other'"""
+    if isinstance(event, Message):
+        command = command_name(event.text)
+        if command is None:
+            return "message"
+        return command if command in KNOWN_COMMANDS else "other"
+    if isinstance(event, CallbackQuery):
+        return "callback"
+    return "other"
@@ -0,0 +1,187 @@
+"""
+Вечерние итоги дня
+
+В DIGEST_TIME каждый пользователь, у которого за день есть записи,
+получает сообщение с теми же цифрами, что и /check_progress: вода
+относительно нормы, потреблённые и сожжённые калории, баланс.
+
+Вместо обработчика на каждого пользователя (get_user, сводка, погода)
+итоги всех пользователей считаются одним запросом с группировкой
+(database.iter_daily_totals) и читаются пачками по DIGEST_CHUNK_SIZE.
+Генератор держит открытое соединение SQLite, поэтому все пачки читаются
+в одном выделенном потоке. Погода берётся из кэша по городам, нормы —
+общей функцией calculate_daily_progress. Тексты отправляются с низким
+приоритетом через планировщик исходящих сообщений (utils.outbound);
+пока отправляется одна пачка, следующая уже читается из БД.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+import database as db
+from config import DIGEST_TIME, DIGEST_CHUNK_SIZE
+from utils.calculations import calculate_daily_progress
+from utils.outbound import send_priority, BULK
+from utils.weather import get_weather_cached
+
+
+logger = logging.getLogger(__name__)
+
+_task: Optional[asyncio.Task] = None
+_last_run: Dict[str, Any] = {}
+
+
+async def stream_daily_totals(day: date) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Пачки итогов дня, прочитанные в отдельном потоке"""
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="digest-db")
+    chunks = db.iter_daily_totals(day, DIGEST_CHUNK_SIZE)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Генератор закрывается в том же потоке, где открыто соединение
+        await loop.run_in_executor(executor, chunks.close)
+        executor.shutdown(wait=False)
+
+
+def digest_text(progress: Dict[str, Any]) -> str:
+    """Текст итогов дня"""
+    if progress["water"] >= progress["water_goal"]:
+        water_status = "🎉 норма выполнена"
+    else:
+        water_status = f"не хватило {progress['water_remaining']} мл"
+
+    balance = progress["calorie_balance"]
+    goal = progress["calorie_goal"]
+    if balance <= goal:
+        calorie_status = f"✅ в пределах нормы, запас {int(progress['calorie_remaining'])} ккал"
+    else:
+        calorie_status = f"⚠️ превышение на {int(balance - goal)} ккал"
+
+    return (
+        f"🌙 <b>Итоги дня</b>\n\n"
+        f"<b>💧 Вода:</b> {progress['water']} из {progress['water_goal']} мл "
+        f"({progress['water_percent']}%) — {water_status}\n\n"
+        f"<b>🔥 Калории:</b>\n"
+        f"Потреблено: {int(progress['calories_consumed'])} ккал\n"
+        f"Сожжено: {int(progress['calories_burned'])} ккал\n"
+        f"Баланс: {int(balance)} / {int(goal)} ккал — {calorie_status}\n\n"
+        f"📈 /show_charts — графики за неделю"
+    )
+
+
+async def _send(bot: Bot, user_id: int, text: str, counters: Dict[str, int]) -> None:
+    try:
+        await bot.send_message(user_id, text, parse_mode="HTML")
+        counters["sent"] += 1
+    except TelegramForbiddenError:
+        counters["blocked"] += 1
+    except Exception as e:
+        counters["failed"] += 1
+        logger.error(f"Ошибка отправки итогов дня {user_id}: {e}")
+
+
+async def send_digest(bot: Bot, day: Optional[date] = None) -> Dict[str, Any]:
+    """Разослать итоги дня всем пользователям с записями за день"""
+    day = day or date.today()
+    started = time.perf_counter()
+    counters = {"users": 0, "sent": 0, "blocked": 0, "failed": 0}
+    compute_seconds = 0.0
+    weather_by_city: Dict[str, Optional[Dict[str, Any]]] = {}
+    sending: Optional[asyncio.Future] = None
+
+    with send_priority(BULK):
+        chunk_started = time.perf_counter()
+        async for chunk in stream_daily_totals(day):
+            # Погода один раз на город за всю рассылку
+            cities = sorted({row["city"] for row in chunk
+                             if row["city"] and row["city"] not in weather_by_city})
+            weathers = await asyncio.gather(*(get_weather_cached(city) for city in cities))
+            weather_by_city.update(zip(cities, weathers))
+
+            messages = []
+            for row in chunk:
+                weather = weather_by_city.get(row["city"])
+                progress = calculate_daily_progress(
+                    row["weight"], row["activity_minutes"], row["calorie_goal"],
+                    row, weather["temp"] if weather else None
+                )
+                messages.append((row["user_id"], digest_text(progress)))
+            counters["users"] += len(chunk)
+            compute_seconds += time.perf_counter() - chunk_started
+
+            # Следующая пачка читается, пока отправляется эта
+            if sending is not None:
+                await sending
+            sending = asyncio.gather(*(_send(bot, user_id, text, counters)
+                                       for user_id, text in messages))
+            chunk_started = time.perf_counter()
+        if sending is not None:
+            await sending
+
+    elapsed = time.perf_counter() - started
+    result = {
+        **counters,
+        "seconds": elapsed,
+        "compute_seconds": compute_seconds,
+        "users_per_second": counters["users"] / elapsed if elapsed else 0.0,
+        "compute_users_per_second": counters["users"] / compute_seconds if compute_seconds else 0.0,
+    }
+    _last_run.update(result, day=day.isoformat())
+    logger.info(
+        f"🌙 Итоги дня: {counters['users']} пользователей за {elapsed:.1f} с "
+        f"({result['users_per_second']:.0f} польз./с, расчёт "
+        f"{result['compute_users_per_second']:.0f} польз./с), отправлено {counters['sent']}, "
+        f"заблокировали бота {counters['blocked']}, ошибок {counters['failed']}"
+    )
+    return result
+
+
+def seconds_until(at: str, now: datetime) -> float:
+    """Секунд до ближайшего наступления времени at ('ЧЧ:ММ')"""
+    hour, minute = (int(part) for part in at.split(":", 1))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+async def _run(bot: Bot) -> None:
+    while True:
+        await asyncio.sleep(seconds_until(DIGEST_TIME, datetime.now()))
+        try:
+            await send_digest(bot)
+        except Exception as e:
+            logger.exception(f"Ошибка рассылки итогов дня: {e}")
+
+
+def start_digest(bot: Bot) -> None:
+    """Запустить ежедневную рассылку итогов дня"""
+    global _task
+    _task = asyncio.create_task(_run(bot))
+    logger.info(f"🌙 Итоги дня будут рассылаться в {DIGEST_TIME}")
+
+
+async def stop_digest() -> None:
+    """Остановить ежедневную рассылку"""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+
+def get_digest_stats() -> Dict[str, Any]:
+    """Результаты последней рассылки"""
+    return dict(_last_run)
@@ -0,0 +1,106 @@
+"""
+Модуль параллельного выполнения независимых запросов в обработчиках
+
+Погода, сводка из БД и история не зависят друг от друга, поэтому
+запускаются одновременно под общим дедлайном. Синхронные функции БД
+выполняются в потоках (asyncio.to_thread), чтобы не блокировать event loop.
+Для каждого этапа замеряется время: по логу видно, какой из них
+определяет общее время ответа (критический путь).
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import HANDLER_DEADLINE
+from utils.metrics import FANOUT_STAGE_SECONDS, register_collector
+
+
+logger = logging.getLogger(__name__)
+
+# Накопленные тайминги: {обработчик: {этап: {"count", "seconds_total", "seconds_max", "failed"}}}
+_stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+
+def in_thread(func: Callable, *args, **kwargs) -> Awaitable:
+    """Выполнить синхронную функцию (например, запрос к БД) в потоке"""
+    return asyncio.to_thread(func, *args, **kwargs)
+
+
+async def _timed(coro: Awaitable, timings: Dict[str, float], stage: str, start: float) -> Any:
+    try:
+        return await coro
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def _record(name: str, stage: str, seconds: float, failed: bool) -> None:
+    stats = _stats.setdefault(name, {}).setdefault(
+        stage, {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0, "failed": 0}
+    )
+    stats["count"] += 1
+    stats["seconds_total"] += seconds
+    stats["seconds_max"] = max(stats["seconds_max"], seconds)
+    stats["failed"] += failed
+
+
+async def fan_out(name: str, deadline: Optional[float] = None,
+                  **stages: Optional[Awaitable]) -> Dict[str, Any]:
+    """
+    Выполнить независимые этапы параллельно под общим дедлайном
+
+    name — имя обработчика для логов, stages — этап: корутина (None —
+    этап пропускается). Этап, завершившийся ошибкой или не успевший
+    к дедлайну, получает результат None.
+
+    Returns:
+        Dict этап: результат
+    """
+    deadline = HANDLER_DEADLINE if deadline is None else deadline
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    tasks = {
+        stage: asyncio.ensure_future(_timed(coro, timings, stage, start))
+        for stage, coro in stages.items() if coro is not None
+    }
+    results: Dict[str, Any] = dict.fromkeys(stages)
+
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+
+    for stage, task in tasks.items():
+        failed = True
+        if not task.done():
+            task.cancel()
+            timings[stage] = deadline
+            logger.warning(f"⏱️ {name}: этап {stage} не уложился в {deadline:.1f} с")
+        elif task.exception() is not None:
+            logger.error(f"⏱️ {name}: ошибка на этапе {stage}: {task.exception()!r}")
+        else:
+            results[stage] = task.result()
+            failed = False
+        _record(name, stage, timings[stage], failed)
+
+    if timings:
+        critical = max(timings, key=timings.get)
+        logger.info(
+            f"⏱️ {name}: "
+            + ", ".join(f"{stage} {seconds * 1000:.0f} мс" for stage, seconds in timings.items())
+            + f"; критический путь — {critical}, всего {(time.perf_counter() - start) * 1000:.0f} мс"
+        )
+    return results
+
+
+def get_fanout_stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Накопленные тайминги этапов по обработчикам"""
+    return {name: {stage: dict(stats) for stage, stats in stages.items()}
+            for name, stages in _stats.items()}
+
+
+def _collect_metrics() -> None:
+    for name, stages in _stats.items():
+        for stage, stats in stages.items():
+            FANOUT_STAGE_SECONDS.set_total(stats["seconds_total"], handler=name, stage=stage)
+
+
+register_collector(_collect_metrics)
@@ -1,138 +1,19 @@
 """
 Модуль для получения информации о калорийности продуктов
-Использует OpenFoodFacts API + встроенную базу популярных продуктов
+Использует OpenFoodFacts API + справочник популярных продуктов (utils.reference_data)
 """
+import logging
+import time
 import aiohttp
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from googletrans import Translator
 
-# Встроенная база популярных продуктов (калории на 100г)
-# Для более точного определения калорийности
-FOOD_DATABASE = {
-    # Фрукты
-    "банан": {"name": "Банан", "calories": 89, "emoji": "🍌"},
-    "яблоко": {"name": "Яблоко", "calories": 52, "emoji": "🍎"},
-    "апельсин": {"name": "Апельсин", "calories": 47, "emoji": "🍊"},
-    "груша": {"name": "Груша", "calories": 57, "emoji": "🍐"},
-    "виноград": {"name": "Виноград", "calories": 67, "emoji": "🍇"},
-    "клубника": {"name": "Клубника", "calories": 33, "emoji": "🍓"},
-    "арбуз": {"name": "Арбуз", "calories": 30, "emoji": "🍉"},
-    "манго": {"name": "Манго", "calories": 60, "emoji": "🥭"},
-    "ананас": {"name": "Ананас", "calories": 50, "emoji": "🍍"},
-    "киви": {"name": "Киви", "calories": 61, "emoji": "🥝"},
-    "персик": {"name": "Персик", "calories": 39, "emoji": "🍑"},
-    "слива": {"name": "Слива", "calories": 46, "emoji": "🫐"},
-    "лимон": {"name": "Лимон", "calories": 29, "emoji": "🍋"},
-    "грейпфрут": {"name": "Грейпфрут", "calories": 42, "emoji": "🍊"},
-    
-    # Овощи
-    "помидор": {"name": "Помидор", "calories": 18, "emoji": "🍅"},
-    "огурец": {"name": "Огурец", "calories": 15, "emoji": "🥒"},
-    "морковь": {"name": "Морковь", "calories": 41, "emoji": "🥕"},
-    "картофель": {"name": "Картофель", "calories": 77, "emoji": "🥔"},
-    "капуста": {"name": "Капуста", "calories": 25, "emoji": "🥬"},
-    "брокколи": {"name": "Брокколи", "calories": 34, "emoji": "🥦"},
-    "лук": {"name": "Лук", "calories": 40, "emoji": "🧅"},
-    "чеснок": {"name": "Чеснок", "calories": 149, "emoji": "🧄"},
-    "перец": {"name": "Перец болгарский", "calories": 27, "emoji": "🌶️"},
-    "баклажан": {"name": "Баклажан", "calories": 25, "emoji": "🍆"},
-    "кабачок": {"name": "Кабачок", "calories": 17, "emoji": "🥒"},
-    "свекла": {"name": "Свёкла", "calories": 43, "emoji": "🍠"},
-    "шпинат": {"name": "Шпинат", "calories": 23, "emoji": "🥬"},
-    "салат": {"name": "Салат листовой", "calories": 15, "emoji": "🥗"},
-    
-    # Мясо и птица
-    "курица": {"name": "Курица (грудка)", "calories": 165, "emoji": "🍗"},
-    "куриная грудка": {"name": "Куриная грудка", "calories": 165, "emoji": "🍗"},
-    "говядина": {"name": "Говядина", "calories": 250, "emoji": "🥩"},
-    "свинина": {"name": "Свинина", "calories": 242, "emoji": "🥓"},
-    "индейка": {"name": "Индейка", "calories": 135, "emoji": "🦃"},
-    "баранина": {"name": "Баранина", "calories": 294, "emoji": "🍖"},
-    "утка": {"name": "Утка", "calories": 337, "emoji": "🦆"},
-    "колбаса": {"name": "Колбаса варёная", "calories": 260, "emoji": "🌭"},
-    "сосиски": {"name": "Сосиски", "calories": 277, "emoji": "🌭"},
-    "ветчина": {"name": "Ветчина", "calories": 145, "emoji": "🥓"},
-    
-    # Рыба и морепродукты
-    "рыба": {"name": "Рыба (средняя)", "calories": 120, "emoji": "🐟"},
-    "лосось": {"name": "Лосось", "calories": 208, "emoji": "🍣"},
-    "тунец": {"name": "Тунец", "calories": 132, "emoji": "🐟"},
-    "треска": {"name": "Треска", "calories": 82, "emoji": "🐟"},
-    "креветки": {"name": "Креветки", "calories": 99, "emoji": "🦐"},
-    "кальмар": {"name": "Кальмар", "calories": 92, "emoji": "🦑"},
-    "сельдь": {"name": "Сельдь", "calories": 158, "emoji": "🐟"},
-    "скумбрия": {"name": "Скумбрия", "calories": 205, "emoji": "🐟"},
-    
-    # Молочные продукты
-    "молоко": {"name": "Молоко 2.5%", "calories": 52, "emoji": "🥛"},
-    "кефир": {"name": "Кефир 2.5%", "calories": 50, "emoji": "🥛"},
-    "йогурт": {"name": "Йогурт натуральный", "calories": 60, "emoji": "🥛"},
-    "творог": {"name": "Творог 5%", "calories": 121, "emoji": "🧀"},
-    "сыр": {"name": "Сыр твёрдый", "calories": 350, "emoji": "🧀"},
-    "сметана": {"name": "Сметана 20%", "calories": 206, "emoji": "🥛"},
-    "масло сливочное": {"name": "Масло сливочное", "calories": 748, "emoji": "🧈"},
-    "мороженое": {"name": "Мороженое", "calories": 207, "emoji": "🍦"},
-    
-    # Крупы и злаки
-    "рис": {"name": "Рис (варёный)", "calories": 130, "emoji": "🍚"},
-    "гречка": {"name": "Гречка (варёная)", "calories": 110, "emoji": "🌾"},
-    "овсянка": {"name": "Овсянка (варёная)", "calories": 88, "emoji": "🥣"},
-    "макароны": {"name": "Макароны (варёные)", "calories": 131, "emoji": "🍝"},
-    "хлеб": {"name": "Хлеб белый", "calories": 265, "emoji": "🍞"},
-    "хлеб черный": {"name": "Хлеб чёрный", "calories": 201, "emoji": "🍞"},
-    "каша": {"name": "Каша молочная", "calories": 100, "emoji": "🥣"},
-    "пшено": {"name": "Пшено (варёное)", "calories": 90, "emoji": "🌾"},
-    "перловка": {"name": "Перловка (варёная)", "calories": 109, "emoji": "🌾"},
-    
-    # Напитки
-    "кофе": {"name": "Кофе без сахара", "calories": 2, "emoji": "☕"},
-    "капучино": {"name": "Капучино", "calories": 45, "emoji": "☕"},
-    "латте": {"name": "Латте", "calories": 60, "emoji": "☕"},
-    "чай": {"name": "Чай без сахара", "calories": 1, "emoji": "🍵"},
-    "сок апельсиновый": {"name": "Сок апельсиновый", "calories": 45, "emoji": "🧃"},
-    "кола": {"name": "Кока-кола", "calories": 42, "emoji": "🥤"},
-    "пиво": {"name": "Пиво светлое", "calories": 43, "emoji": "🍺"},
-    "вино": {"name": "Вино красное", "calories": 85, "emoji": "🍷"},
-    
-    # Выпечка и сладости
-    "торт": {"name": "Торт", "calories": 350, "emoji": "🎂"},
-    "пирожное": {"name": "Пирожное", "calories": 320, "emoji": "🧁"},
-    "печенье": {"name": "Печенье", "calories": 450, "emoji": "🍪"},
-    "шоколад": {"name": "Шоколад молочный", "calories": 535, "emoji": "🍫"},
-    "конфеты": {"name": "Конфеты шоколадные", "calories": 500, "emoji": "🍬"},
-    "пончик": {"name": "Пончик", "calories": 420, "emoji": "🍩"},
-    "круассан": {"name": "Круассан", "calories": 406, "emoji": "🥐"},
-    "блины": {"name": "Блины", "calories": 233, "emoji": "🥞"},
-    "вафли": {"name": "Вафли", "calories": 342, "emoji": "🧇"},
-    
-    # Фастфуд
-    "пицца": {"name": "Пицца", "calories": 266, "emoji": "🍕"},
-    "бургер": {"name": "Бургер", "calories": 295, "emoji": "🍔"},
-    "хот-дог": {"name": "Хот-дог", "calories": 290, "emoji": "🌭"},
-    "картошка фри": {"name": "Картофель фри", "calories": 312, "emoji": "🍟"},
-    "наггетсы": {"name": "Наггетсы куриные", "calories": 297, "emoji": "🍗"},
-    "шаурма": {"name": "Шаурма", "calories": 215, "emoji": "🌯"},
-    "роллы": {"name": "Роллы", "calories": 150, "emoji": "🍣"},
-    "суши": {"name": "Суши", "calories": 145, "emoji": "🍣"},
-    
-    # Супы
-    "борщ": {"name": "Борщ", "calories": 49, "emoji": "🍲"},
-    "щи": {"name": "Щи", "calories": 31, "emoji": "🍲"},
-    "куриный суп": {"name": "Куриный суп", "calories": 36, "emoji": "🍲"},
-    "солянка": {"name": "Солянка", "calories": 69, "emoji": "🍲"},
-    "окрошка": {"name": "Окрошка", "calories": 52, "emoji": "🍲"},
-    "уха": {"name": "Уха", "calories": 46, "emoji": "🍲"},
-    
-    # Другое
-    "яйцо": {"name": "Яйцо куриное", "calories": 155, "emoji": "🥚"},
-    "яичница": {"name": "Яичница", "calories": 196, "emoji": "🍳"},
-    "омлет": {"name": "Омлет", "calories": 154, "emoji": "🍳"},
-    "орехи": {"name": "Орехи (микс)", "calories": 607, "emoji": "🥜"},
-    "мёд": {"name": "Мёд", "calories": 304, "emoji": "🍯"},
-    "сахар": {"name": "Сахар", "calories": 387, "emoji": "🍬"},
-    "оливки": {"name": "Оливки", "calories": 115, "emoji": "🫒"},
-    "авокадо": {"name": "Авокадо", "calories": 160, "emoji": "🥑"},
-}
+from utils.metrics import HTTP_REQUEST_SECONDS
+from utils.tracing import span, CLIENT
+from utils.reference_data import get_catalog
+
+
+logger = logging.getLogger(__name__)
 
 
 async def get_food_info_from_api(product_name: str) -> Optional[Dict[str, Any]]:
@@ -147,36 +28,52 @@ async def get_food_info_from_api(product_name: str) -> Optional[Dict[str, Any]]:
         "page_size": 5
     }
     
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    products = data.get('products', [])
+    started = time.perf_counter()
+    status = "error"
+    with span("food.openfoodfacts", CLIENT, query=product_name) as current:
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params=params) as response:
+                    status = str(response.status)
+                    if response.status == 200:
+                        data = await response.json()
+                        products = data.get('products', [])
                     
-                    # Ищем продукт с калорийностью
-                    for product in products:
-                        calories = product.get('nutriments', {}).get('energy-kcal_100g')
-                        if calories and calories > 0:
-                            return {
-                                'name': product.get('product_name', product_name),
-                                'calories': calories,
-                                'emoji': '🍽️'
-                            }
-                    return None
-    except Exception as e:
-        print(f"Ошибка OpenFoodFacts API: {e}")
-        return None
+                        # Ищем продукт с калорийностью
+                        for product in products:
+                            calories = product.get('nutriments', {}).get('energy-kcal_100g')
+                            if calories and calories > 0:
+                                return {
+                                    'name': product.get('product_name', product_name),
+                                    'calories': calories,
+                                    'emoji': '🍽️'
+                                }
+                        return None
+        except Exception as e:
+            logger.error(f"Ошибка OpenFoodFacts API: {e}")
+            return None
+        finally:
+            current.set_attribute("http.status_code", status)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                         service="openfoodfacts", status=status)
 
 
 async def translate_to_english(text: str) -> str:
     """Перевести текст на английский для поиска в API"""
-    try:
-        translator = Translator()
-        result = translator.translate(text, dest='en')
-        return result.text
-    except Exception:
-        return text
+    started = time.perf_counter()
+    status = "error"
+    with span("food.translate", CLIENT) as current:
+        try:
+            translator = Translator()
+            result = translator.translate(text, dest='en')
+            status = "ok"
+            return result.text
+        except Exception:
+            return text
+        finally:
+            current.set_attribute("translate.status", status)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                         service="translate", status=status)
 
 
 async def get_food_info(product_name: str) -> Optional[Dict[str, Any]]:
@@ -187,22 +84,27 @@ async def get_food_info(product_name: str) -> Optional[Dict[str, Any]]:
     2. Если не найдено - ищем в OpenFoodFacts API
     3. Пробуем перевести на английский и искать снова
     """
+    with span("food.get_food_info", query=product_name) as current:
+        result, source = await _find_food(product_name)
+        current.set_attribute("food.source", source)
+        return result
+
+
+async def _find_food(product_name: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Продукт и где он найден: catalog, openfoodfacts, translated или none"""
     # Приводим к нижнему регистру для поиска
     search_name = product_name.lower().strip()
     
-    # 1. Поиск в локальной базе (точное совпадение)
-    if search_name in FOOD_DATABASE:
-        return FOOD_DATABASE[search_name]
-    
-    # 2. Поиск в локальной базе (частичное совпадение)
-    for key, value in FOOD_DATABASE.items():
-        if key in search_name or search_name in key:
-            return value
+    # 1-2. Поиск в локальной базе (точное, затем частичное совпадение)
+    with span("food.catalog"):
+        local_result = get_catalog().find_food(search_name)
+    if local_result:
+        return local_result, "catalog"
     
     # 3. Поиск в OpenFoodFacts API
     api_result = await get_food_info_from_api(product_name)
     if api_result:
-        return api_result
+        return api_result, "openfoodfacts"
     
     # 4. Пробуем перевести на английский и искать снова
     english_name = await translate_to_english(product_name)
@@ -210,15 +112,15 @@ async def get_food_info(product_name: str) -> Optional[Dict[str, Any]]:
         api_result = await get_food_info_from_api(english_name)
         if api_result:
             api_result['name'] = product_name.capitalize()  # Возвращаем русское название
-            return api_result
+            return api_result, "translated"
     
-    return None
+    return None, "none"
 
 
 def get_low_calorie_recommendations() -> List[Dict[str, Any]]:
     """Получить список низкокалорийных продуктов для рекомендаций"""
     low_cal_products = []
-    for key, value in FOOD_DATABASE.items():
+    for key, value in get_catalog().iter_foods():
         if value['calories'] <= 50:
             low_cal_products.append({
                 'name': value['name'],
@@ -0,0 +1,201 @@
+"""
+Хранилища состояний FSM (диалоги настройки профиля и записи еды)
+
+TTLMemoryStorage — хранилище в памяти процесса с ограниченным размером:
+брошенный на середине диалог удаляется через FSM_STATE_TTL секунд
+без обращений, а при превышении FSM_MAX_ENTRIES вытесняются давно не
+использованные диалоги. В отличие от MemoryStorage, чтение не создаёт
+записей, а диалог без состояния и данных сразу удаляется.
+
+PipelinedRedisStorage хранит диалог в Redis (или любом сервере с
+протоколом Redis), поэтому незавершённые диалоги переживают перезапуск
+и видны всем процессам бота. Состояние и данные диалога лежат в одном
+хэше, каждая запись — одна конвейерная (pipeline) отправка HSET + EXPIRE,
+так что ключ живёт FSM_STATE_TTL секунд с последнего изменения.
+
+Клиент Redis передаётся в конструктор, поэтому в проверках вместо
+сервера можно подставить fakeredis.aioredis.FakeRedis().
+
+Хранилище выбирается в config.py: FSM_STORAGE=memory или redis.
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+from config import FSM_STORAGE, REDIS_URL, FSM_STATE_TTL, FSM_MAX_ENTRIES
+
+
+STATE_FIELD = "state"
+DATA_FIELD = "data"
+
+
+def _decode(value: Any) -> Optional[str]:
+    """Значение из Redis в строку (клиент может отдавать bytes или str)"""
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
+
+
+class _Entry:
+    """Диалог в памяти: состояние, данные и время истечения"""
+
+    __slots__ = ("state", "data", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.state: Optional[str] = None
+        self.data: Optional[Dict[str, Any]] = None
+        self.expires_at = expires_at
+
+
+class TTLMemoryStorage(BaseStorage):
+    """
+    Хранилище FSM в памяти с TTL и LRU-вытеснением
+
+    Срок жизни продлевается при каждом обращении, поэтому порядок записей
+    в OrderedDict одновременно и порядок LRU, и порядок истечения:
+    просроченные записи всегда в начале и удаляются оттуда.
+    """
+
+    def __init__(self, ttl: Optional[int] = FSM_STATE_TTL,
+                 max_entries: int = FSM_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.expired = 0
+        self.evicted = 0
+        self._entries: "OrderedDict[StorageKey, _Entry]" = OrderedDict()
+
+    def _expires_at(self, now: float) -> float:
+        return now + self.ttl if self.ttl else float("inf")
+
+    def _sweep(self, now: float) -> None:
+        """Удалить просроченные записи из начала очереди"""
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at > now:
+                break
+            self._entries.popitem(last=False)
+            self.expired += 1
+
+    def _get(self, key: StorageKey) -> Optional[_Entry]:
+        now = time.monotonic()
+        self._sweep(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.expires_at = self._expires_at(now)
+            self._entries.move_to_end(key)
+        return entry
+
+    def _get_for_write(self, key: StorageKey) -> _Entry:
+        entry = self._get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry(self._expires_at(time.monotonic()))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        return entry
+
+    def _drop_if_empty(self, key: StorageKey, entry: _Entry) -> None:
+        if entry.state is None and not entry.data:
+            self._entries.pop(key, None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None and key not in self._entries:
+            return
+        entry = self._get_for_write(key)
+        entry.state = state
+        self._drop_if_empty(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._get(key)
+        return entry.state if entry else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not data and key not in self._entries:
+            return
+        entry = self._get_for_write(key)
+        entry.data = data.copy() if data else None
+        self._drop_if_empty(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._get(key)
+        return entry.data.copy() if entry and entry.data else {}
+
+    @property
+    def live_dialogs(self) -> int:
+        """Количество незавершённых диалогов в памяти"""
+        self._sweep(time.monotonic())
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Метрики хранилища"""
+        return {"live_dialogs": self.live_dialogs, "expired": self.expired,
+                "evicted": self.evicted}
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class PipelinedRedisStorage(BaseStorage):
+    """Хранилище FSM в Redis: один хэш на диалог, запись одним pipeline"""
+
+    def __init__(self, redis: Any, ttl: Optional[int] = FSM_STATE_TTL,
+                 prefix: str = "fsm"):
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "PipelinedRedisStorage":
+        """Создать хранилище по адресу redis://..."""
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), **kwargs)
+
+    def _key(self, key: StorageKey) -> str:
+        parts = [self.prefix, str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id:
+            parts.append(str(key.thread_id))
+        parts.append(key.destiny)
+        return ":".join(parts)
+
+    async def _write(self, key: StorageKey, field: str, value: Optional[str]) -> None:
+        """Записать или удалить поле и продлить срок жизни ключа одним pipeline"""
+        redis_key = self._key(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if value is None:
+                pipe.hdel(redis_key, field)
+            else:
+                pipe.hset(redis_key, field, value)
+                if self.ttl:
+                    pipe.expire(redis_key, self.ttl)
+            await pipe.execute()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(key, STATE_FIELD,
+                          state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return _decode(await self.redis.hget(self._key(key), STATE_FIELD))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(key, DATA_FIELD,
+                          json.dumps(data, ensure_ascii=False) if data else None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        raw = await self.redis.hget(self._key(key), DATA_FIELD)
+        return json.loads(raw) if raw else {}
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище FSM по настройке FSM_STORAGE"""
+    if FSM_STORAGE == "redis":
+        return PipelinedRedisStorage.from_url(REDIS_URL)
+    return TTLMemoryStorage()
@@ -0,0 +1,95 @@
+"""
+Модуль кодирования изображений графиков для отправки в Telegram
+
+Из нескольких кандидатов (PNG с палитрой, JPEG, WebP) выбирается самый
+компактный. Если даже он больше целевого размера, качество и разрешение
+понижаются ступенями, пока результат не уложится в него. Целевой размер —
+не гарантия: картинку уже минимальной ширины (MIN_WIDTH) не уменьшаем,
+и она может остаться больше.
+"""
+import io
+import time
+from typing import Dict, Any, Iterable
+
+from PIL import Image
+
+
+# Ступени понижения качества для JPEG/WebP
+QUALITY_STEPS = (85, 70, 55, 40)
+
+# Во сколько раз уменьшать картинку, если понижения качества не хватило
+DOWNSCALE_FACTOR = 0.8
+
+# Меньше этой ширины картинку уже не уменьшаем
+MIN_WIDTH = 320
+
+# Количество цветов для палитрового PNG
+PNG_COLORS = 64
+
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    """Закодировать изображение в один формат"""
+    buf = io.BytesIO()
+    if fmt == "png":
+        if image.mode != "P":
+            image = image.quantize(colors=PNG_COLORS, method=Image.Quantize.FASTOCTREE)
+        image.save(buf, format="PNG", compress_level=9)
+    elif fmt == "jpeg":
+        image.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+    elif fmt == "webp":
+        image.convert("RGB").save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        raise ValueError(f"Неизвестный формат изображения: {fmt}")
+    return buf.getvalue()
+
+
+def _smallest(image: Image.Image, formats: Iterable[str], quality: int) -> tuple:
+    """Самый компактный кандидат: (байты, формат)"""
+    candidates = [(_encode(image, fmt, quality), fmt) for fmt in formats]
+    return min(candidates, key=lambda candidate: len(candidate[0]))
+
+
+def encode_chart(image: Image.Image, max_bytes: int,
+                 formats: Iterable[str] = ("png", "jpeg")) -> Dict[str, Any]:
+    """
+    Закодировать график в самый компактный формат, стараясь уложиться в max_bytes
+
+    Картинки меньше MIN_WIDTH не уменьшаются: для них размер может остаться больше.
+
+    Returns:
+        Dict с ключами: data, format, width, height, encode_seconds
+    """
+    start = time.perf_counter()
+    formats = tuple(formats)
+    data, fmt = _smallest(image, formats, QUALITY_STEPS[0])
+
+    # Целевой размер: сначала качество (PNG без потерь — только JPEG/WebP),
+    # затем разрешение
+    lossy = tuple(f for f in formats if f != "png") or ("jpeg",)
+    steps = iter(QUALITY_STEPS[1:])
+    while len(data) > max_bytes:
+        quality = next(steps, None)
+        if quality is None:
+            if image.width <= MIN_WIDTH:
+                break
+            size = (int(image.width * DOWNSCALE_FACTOR), int(image.height * DOWNSCALE_FACTOR))
+            image = image.convert("RGB").resize(size, Image.Resampling.LANCZOS)
+            quality = QUALITY_STEPS[-1]
+        data, fmt = _smallest(image, lossy, quality)
+
+    return {
+        "data": data,
+        "format": fmt,
+        "width": image.width,
+        "height": image.height,
+        "encode_seconds": time.perf_counter() - start,
+    }
+
+
+def image_extension(data: bytes) -> str:
+    """Расширение файла по сигнатуре закодированного изображения"""
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "png"
@@ -0,0 +1,182 @@
+"""
+Приоритетные полосы обработки обновлений
+
+Обработчики выполняются в одной из полос со своим пулом обработчиков и
+ограниченной очередью: interactive (записи и диалоги), lookup (внешние API)
+и render (графики), см. utils.command_classes. Всплеск /show_charts
+занимает только обработчики полосы render и ждёт в её очереди, а
+/log_water сразу попадает в свободную полосу interactive.
+
+Middleware дожидается завершения обработчика и возвращает его результат
+(или исключение) aiogram: обновление считается обработанным только после
+ответа, поэтому порядок обновлений одного пользователя, который
+обеспечивают вызывающие (супервизор, FSM), сохраняется, а ошибки
+обработчиков идут обычным путём aiogram.
+
+Если очередь полосы заполнена, пользователь получает ответ «сервер занят».
+Для каждой полосы считаются глубина очереди и время ожидания.
+Обработчик выполняется в контексте (contextvars) принявшей обновление
+задачи, поэтому update_id и user_id в логах сохраняются.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import LANES
+from utils.command_classes import classify_event, command_label
+from utils.metrics import (
+    HANDLER_SECONDS, LANE_WAIT_SECONDS, LANE_DEPTH, LANE_BUSY, LANE_REJECTED,
+    register_collector
+)
+from utils.tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд при остановке ждать обработки того, что осталось в очередях
+DRAIN_TIMEOUT = 10.0
+
+BUSY_TEXT = "⏳ Сейчас много запросов такого типа. Попробуйте через минуту."
+
+
+class Lane:
+    """Полоса: ограниченная очередь и фиксированное число обработчиков"""
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue: Optional[asyncio.Queue] = None
+        self.queue_size = queue_size
+        self.busy = 0
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self) -> None:
+        # Очередь и обработчики создаются в работающем event loop
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, job: Callable[[], Awaitable[Any]]) -> Optional[asyncio.Future]:
+        """
+        Поставить обработку в очередь; вернуть future с её результатом
+        (None, если очередь заполнена)
+        """
+        if self.queue is None:
+            self._start()
+        done = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((time.perf_counter(), contextvars.copy_context(), job, done))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return None
+        return done
+
+    async def _worker(self) -> None:
+        while True:
+            enqueued_at, context, job, done = await self.queue.get()
+            if done.cancelled():
+                # Ожидающий обработку уже отменён (например, при остановке)
+                self.queue.task_done()
+                continue
+            wait = time.perf_counter() - enqueued_at
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            LANE_WAIT_SECONDS.observe(wait, lane=self.name)
+            self.busy += 1
+            try:
+                result = await context.run(asyncio.create_task, job())
+            except asyncio.CancelledError:
+                done.cancel()
+                raise
+            except Exception as e:
+                # Исключение уходит в middleware и дальше в обработку ошибок aiogram
+                self.failed += 1
+                if not done.done():
+                    done.set_exception(e)
+            else:
+                if not done.done():
+                    done.set_result(result)
+            finally:
+                self.busy -= 1
+                self.processed += 1
+                self.queue.task_done()
+
+    async def stop(self) -> None:
+        if self.queue is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Полоса {self.name}: не обработано {self.queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.queue = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.queue.qsize() if self.queue else 0,
+            "busy": self.busy,
+            "workers": self.workers,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "wait_seconds_avg": self.wait_seconds_total / self.processed if self.processed else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+class LaneMiddleware:
+    """Middleware, передающее обработчик в полосу по классу команды"""
+
+    def __init__(self, lanes: Dict[str, Tuple[int, int]] = LANES):
+        self.lanes = {name: Lane(name, workers, queue_size)
+                      for name, (workers, queue_size) in lanes.items()}
+
+    async def __call__(self, handler, event, data):
+        lane = self.lanes[classify_event(event, data.get('raw_state'))]
+        command = command_label(event)
+        submitted = time.perf_counter()
+
+        async def job():
+            started = time.perf_counter()
+            try:
+                with span("handler", **{"bot.command": command, "bot.lane": lane.name,
+                                        "bot.lane_wait_ms": (started - submitted) * 1000}):
+                    return await handler(event, data)
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - started,
+                                        command=command, lane=lane.name)
+
+        done = lane.submit(job)
+        if done is None:
+            await event.answer(BUSY_TEXT)
+            return None
+        # Ждём обработчик в полосе: число одновременных обработчиков
+        # ограничивает полоса, а aiogram получает его результат или ошибку
+        return await done
+
+    async def stop(self) -> None:
+        """Дождаться обработки очередей и остановить обработчики полос"""
+        await asyncio.gather(*(lane.stop() for lane in self.lanes.values()))
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Глубина очереди, занятость и время ожидания по полосам"""
+        return {name: lane.get_stats() for name, lane in self.lanes.items()}
+
+    def collect_metrics(self) -> None:
+        """Обновить метрики полос перед выдачей"""
+        for name, lane in self.lanes.items():
+            LANE_DEPTH.set(lane.queue.qsize() if lane.queue else 0, lane=name)
+            LANE_BUSY.set(lane.busy, lane=name)
+            LANE_REJECTED.set_total(lane.rejected, lane=name)
+
+
+lanes = LaneMiddleware()
+register_collector(lanes.collect_metrics)
@@ -0,0 +1,169 @@
+"""
+Настройка логирования: JSON, очередь и выборочная запись
+
+Записи из event loop только кладутся в очередь (QueueHandler), а
+форматирование в JSON и запись в stdout выполняет отдельный поток
+(QueueListener), поэтому медленный вывод не задерживает обработку
+обновлений.
+
+К каждой записи добавляются update_id и user_id обрабатываемого
+обновления из contextvars. Их задаёт UpdateContextMiddleware; контекст
+переходит в задачи, потоки функций БД (asyncio.to_thread) и запросы
+к внешним API, так что все записи одного обновления связаны.
+
+Записи на каждое обновление (логгеры из SAMPLED_LOGGERS уровня INFO
+и ниже) при нагрузке больше LOG_SAMPLE_THRESHOLD записей в секунду
+сохраняются с вероятностью из LOG_SAMPLE_RATES. Предупреждения и
+ошибки не отбрасываются никогда.
+
+Формат задаётся LOG_FORMAT: json (по умолчанию) или text.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATES, LOG_SAMPLE_THRESHOLD
+from utils.tracing import current_trace_id
+
+
+# Логгеры, которые пишут по записи на каждое обновление
+SAMPLED_LOGGERS = frozenset({"bot.updates", "aiogram.event"})
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+update_id_var: ContextVar[Optional[int]] = ContextVar("update_id", default=None)
+user_id_var: ContextVar[Optional[int]] = ContextVar("user_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет к записи update_id, user_id и trace_id текущего обновления"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.update_id = update_id_var.get()
+        record.user_id = user_id_var.get()
+        record.trace_id = current_trace_id()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Выборочная запись логов на каждое обновление при высокой нагрузке"""
+
+    def __init__(self, rates: Dict[int, float], threshold: int):
+        super().__init__()
+        self.rates = rates
+        self.threshold = threshold
+        self.dropped = 0
+        self._second = 0
+        self._count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name not in SAMPLED_LOGGERS or record.levelno not in self.rates:
+            return True
+        second = int(time.monotonic())
+        if second != self._second:
+            self._second = second
+            self._count = 0
+        self._count += 1
+        if self._count <= self.threshold or random.random() < self.rates[record.levelno]:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        update_id = getattr(record, "update_id", None)
+        if update_id is not None:
+            entry["update_id"] = update_id
+        user_id = getattr(record, "user_id", None)
+        if user_id is not None:
+            entry["user_id"] = user_id
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id is not None:
+            entry["trace_id"] = trace_id
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы подставляются сразу (они могут измениться), остальное —
+        # в потоке QueueListener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+
+def bind_update(update_id: Optional[int], user_id: Optional[int]) -> None:
+    """Связать последующие записи текущего контекста с обновлением"""
+    update_id_var.set(update_id)
+    user_id_var.set(user_id)
+
+
+class UpdateContextMiddleware:
+    """Outer middleware обновлений: update_id и user_id для логов"""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        bind_update(event.update_id, user.id if user else None)
+        return await handler(event, data)
+
+
+def setup_logging() -> SamplingFilter:
+    """Настроить корневой логгер; вернуть фильтр выборки (для статистики)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    sampling = SamplingFilter(
+        {logging.getLevelName(level): rate for level, rate in LOG_SAMPLE_RATES.items()},
+        LOG_SAMPLE_THRESHOLD
+    )
+    handler = _QueueHandler(queue.SimpleQueue())
+    handler.addFilter(sampling)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+    return sampling
+
+
+def stop_logging() -> None:
+    """Дописать оставшиеся в очереди записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
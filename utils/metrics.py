@@ -0,0 +1,265 @@
+"""
+Метрики в текстовом формате Prometheus
+
+Счётчики, gauge и гистограммы хранятся в памяти процесса и отдаются
+по HTTP на METRICS_PATH отдельным сервером на METRICS_HOST:METRICS_PORT
+(в том числе в режиме webhook: публичный сервер webhook их не отдаёт). Запись — словарь по меткам и bisect по
+границам корзин под коротким локом (функции БД выполняются в потоках),
+поэтому метрики можно не выключать в продакшене.
+
+Значения, которые уже считают другие модули (очереди полос, диалоги FSM,
+отклонённые лимитом запросы, этапы fan-out), не дублируются, а читаются
+в момент запроса метрик через register_collector.
+"""
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT, METRICS_PATH
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Как часто замерять задержку event loop (сек)
+LOOP_LAG_INTERVAL = 0.5
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Строки значений в формате Prometheus"""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels: str) -> None:
+        """Значение счётчика, который ведёт другой модуль (для сборщиков)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """Текущее значение"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам, сумма и количество"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # метки -> [количество по корзинам (последняя — +Inf), сумма]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+_registry: List[_Metric] = []
+_collectors: List[Callable[[], None]] = []
+
+
+def register_collector(collector: Callable[[], None]) -> None:
+    """Функция, обновляющая gauge/счётчики перед каждой выдачей метрик"""
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    for collector in _collectors:
+        try:
+            collector()
+        except Exception as e:
+            logger.error(f"Ошибка сборщика метрик: {e}")
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ==================== МЕТРИКИ БОТА ====================
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Время выполнения обработчика", ("command", "lane"))
+LANE_WAIT_SECONDS = Histogram(
+    "bot_lane_wait_seconds", "Ожидание в очереди полосы обработки", ("lane",))
+DB_QUERY_SECONDS = Histogram(
+    "bot_db_query_seconds", "Время функции database.py", ("function",))
+HTTP_REQUEST_SECONDS = Histogram(
+    "bot_http_request_seconds", "Внешние HTTP-запросы", ("service", "status"))
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    "bot_telegram_request_seconds", "Запросы отправки в Bot API", ("method",))
+CHART_RENDER_SECONDS = Histogram(
+    "bot_chart_render_seconds", "Рисование и кодирование графика", ("stage",))
+CHART_BYTES = Histogram(
+    "bot_chart_bytes", "Размер закодированного графика", (),
+    buckets=(10_000, 25_000, 50_000, 100_000, 150_000, 250_000, 500_000, 1_000_000))
+LOOP_LAG_SECONDS = Histogram(
+    "bot_event_loop_lag_seconds", "Задержка пробуждения таймера event loop", (),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+LANE_DEPTH = Gauge("bot_lane_queue_depth", "Обработчиков в очереди полосы", ("lane",))
+LANE_BUSY = Gauge("bot_lane_busy_workers", "Занятых обработчиков полосы", ("lane",))
+LANE_REJECTED = Counter("bot_lane_rejected_total", "Отклонено из-за полной очереди", ("lane",))
+FSM_LIVE_DIALOGS = Gauge("bot_fsm_live_dialogs", "Незавершённых диалогов FSM в памяти")
+THROTTLE_SHED = Counter("bot_throttle_shed_total", "Запросов отклонено лимитом", ("bucket",))
+OUTBOUND_PENDING = Gauge("bot_outbound_pending", "Сообщений в очереди отправки")
+LOGS_SAMPLED_OUT = Counter("bot_logs_sampled_out_total", "Записей лога отброшено выборкой")
+FANOUT_STAGE_SECONDS = Counter(
+    "bot_fanout_stage_seconds_total", "Суммарное время этапов fan-out", ("handler", "stage"))
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels: str):
+    """Замер блока в гистограмму: with timed(DB_QUERY_SECONDS, function='get_user'):"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+# ==================== HTTP И ФОНОВЫЕ ЗАДАЧИ ====================
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(),
+                        content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def _measure_loop_lag() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+
+
+_runner: Optional[web.AppRunner] = None
+_lag_task: Optional[asyncio.Task] = None
+
+
+async def start_metrics(port: int = METRICS_PORT) -> None:
+    """Начать замер задержки event loop и отдавать метрики отдельным сервером на port"""
+    global _runner, _lag_task
+    if not METRICS_ENABLED:
+        return
+    _lag_task = asyncio.create_task(_measure_loop_lag())
+    server = web.Application()
+    server.router.add_get(METRICS_PATH, metrics_handler)
+    _runner = web.AppRunner(server, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, METRICS_HOST, port).start()
+    logger.info(f"📈 Метрики: http://{METRICS_HOST}:{port}{METRICS_PATH}")
+
+
+async def stop_metrics() -> None:
+    global _runner, _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        await asyncio.gather(_lag_task, return_exceptions=True)
+        _lag_task = None
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
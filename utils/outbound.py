@@ -0,0 +1,283 @@
+"""
+Планировщик исходящих сообщений Bot API
+
+Подключается к сессии бота (bot.session.middleware) и пропускает
+отправку и редактирование сообщений через два набора token bucket:
+общий на бота (OUTBOUND_GLOBAL_RATE, у Telegram около 30 сообщений/с)
+и отдельный на каждый чат (OUTBOUND_CHAT_RATE, около 1 сообщения/с
+с небольшим всплеском). Остальные методы (getUpdates, answerCallbackQuery,
+setWebhook...) идут без очереди.
+
+Ожидающие отправки упорядочены по приоритету: ответы пользователю
+(INTERACTIVE) всегда уходят раньше массовых рассылок (BULK), приоритет
+задаётся для всех отправок внутри блока send_priority(BULK).
+
+Если Telegram всё же ответил 429, планировщик приостанавливает все
+отправки на retry_after секунд и повторяет запрос. Несколько подряд
+идущих правок одного сообщения (editMessageText), ещё не дождавшихся
+очереди, сливаются в одну — уходит только последний текст.
+
+Очередь устроена как в асинхронном планировщике таймеров: у каждого
+чата своя куча отправок, в общей куче ready — чаты, которым можно
+отправлять, в куче delayed — чаты, ждущие пополнения своего ведра.
+Так выбор следующей отправки не зависит от числа ожидающих сообщений.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendChatAction
+
+from config import OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE
+from utils.metrics import OUTBOUND_PENDING, TELEGRAM_REQUEST_SECONDS, register_collector, timed
+from utils.rate_limit import BucketMap, parse_rate
+from utils.tracing import span, CLIENT
+
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+# Сколько раз повторять запрос после ответа 429
+MAX_RETRIES = 3
+
+# Сколько секунд при остановке ждать отправки оставшихся сообщений
+DRAIN_TIMEOUT = 10.0
+
+GLOBAL_KEY = "global"
+
+_priority: ContextVar[int] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Приоритет всех отправок внутри блока (и запущенных в нём задач)"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_limited(method: Any) -> bool:
+    """Относится ли метод к отправке сообщений, на которую действуют лимиты"""
+    name = method.__api_method__
+    return (name.startswith(("send", "edit", "copy", "forward"))
+            and not isinstance(method, SendChatAction))
+
+
+class _Pending:
+    """Отправка в очереди"""
+
+    __slots__ = ("priority", "seq", "chat_id", "method", "enqueued_at",
+                 "granted", "result")
+
+    def __init__(self, priority: int, seq: int, chat_id: Hashable, method: Any):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.enqueued_at = time.perf_counter()
+        self.granted = asyncio.get_running_loop().create_future()
+        # Результат для слитых правок; создаётся, только если они есть
+        self.result: Optional[asyncio.Future] = None
+
+    def __lt__(self, other: "_Pending") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Middleware сессии бота: очередь отправок с лимитами и приоритетами"""
+
+    def __init__(self, global_rate: str = OUTBOUND_GLOBAL_RATE,
+                 chat_rate: str = OUTBOUND_CHAT_RATE):
+        self.global_rate = global_rate
+        self.global_bucket = BucketMap(*parse_rate(global_rate))
+        self.chat_buckets = BucketMap(*parse_rate(chat_rate))
+        self._seq = itertools.count()
+        self._chats: Dict[Hashable, List[_Pending]] = {}
+        self._ready: List[Tuple[int, int, Hashable]] = []
+        self._delayed: List[Tuple[float, Hashable]] = []
+        self._edits: Dict[Tuple[Hashable, int], _Pending] = {}
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.pending = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def share_global_limit(self, processes: int) -> None:
+        """Разделить общий лимит бота поровну между processes процессами"""
+        capacity, period = parse_rate(self.global_rate)
+        self.global_bucket = BucketMap(max(1, capacity // processes), period)
+
+    # ---------- очередь ----------
+
+    def _enqueue(self, item: _Pending) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+        queue = self._chats.get(item.chat_id)
+        if queue is None:
+            queue = self._chats[item.chat_id] = []
+            heapq.heappush(self._ready, (item.priority, item.seq, item.chat_id))
+        heapq.heappush(queue, item)
+        self.pending += 1
+        self._wakeup.set()
+
+    def _next_chat(self, now: float) -> Optional[Hashable]:
+        """Чат с самой приоритетной отправкой, которому уже можно отправлять"""
+        while self._delayed and self._delayed[0][0] <= now:
+            _, chat_id = heapq.heappop(self._delayed)
+            head = self._chats[chat_id][0]
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        while self._ready:
+            _, _, chat_id = heapq.heappop(self._ready)
+            allowed, retry_after = self.chat_buckets.acquire(chat_id, now)
+            if allowed:
+                return chat_id
+            heapq.heappush(self._delayed, (now + retry_after, chat_id))
+        return None
+
+    async def _dispatch(self) -> None:
+        """Выдавать разрешения на отправку в порядке приоритета и лимитов"""
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            chat_id = self._next_chat(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            allowed, retry_after = self.global_bucket.acquire(GLOBAL_KEY, now)
+            while not allowed:
+                await asyncio.sleep(retry_after)
+                allowed, retry_after = self.global_bucket.acquire(GLOBAL_KEY)
+
+            queue = self._chats[chat_id]
+            item = heapq.heappop(queue)
+            if queue:
+                heapq.heappush(self._ready, (queue[0].priority, queue[0].seq, chat_id))
+            else:
+                del self._chats[chat_id]
+            self.pending -= 1
+            if not item.granted.done():
+                item.granted.set_result(None)
+
+    # ---------- отправка ----------
+
+    async def _send(self, make_request, bot, item: _Pending) -> Any:
+        """Выполнить запрос, повторяя его после 429"""
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with timed(TELEGRAM_REQUEST_SECONDS, method=item.method.__api_method__):
+                    return await make_request(bot, item.method)
+            except TelegramRetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                self.retried += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"⏸ Лимит Telegram: пауза отправки {e.retry_after} с")
+                item.granted = asyncio.get_running_loop().create_future()
+                self._enqueue(item)
+                await item.granted
+
+    async def __call__(self, make_request, bot, method):
+        # Спан отправки в трассе обновления (вне трассы ничего не создаётся)
+        with span(f"telegram.{method.__api_method__}", CLIENT) as current:
+            if not is_limited(method):
+                return await make_request(bot, method)
+            return await self._schedule(make_request, bot, method, current)
+
+    async def _schedule(self, make_request, bot, method, current) -> Any:
+        """Дождаться очереди с учётом лимитов и отправить"""
+        chat_id = getattr(method, "chat_id", None) or GLOBAL_KEY
+        edit_key = None
+        if isinstance(method, EditMessageText) and method.message_id is not None:
+            edit_key = (chat_id, method.message_id)
+            queued = self._edits.get(edit_key)
+            if queued is not None:
+                # Правка ещё ждёт очереди: отправится только последний текст
+                queued.method = method
+                self.coalesced += 1
+                current.set_attribute("outbound.coalesced", True)
+                if queued.result is None:
+                    queued.result = asyncio.get_running_loop().create_future()
+                return await asyncio.shield(queued.result)
+
+        item = _Pending(_priority.get(), next(self._seq), chat_id, method)
+        if edit_key is not None:
+            self._edits[edit_key] = item
+        self._enqueue(item)
+        try:
+            await item.granted
+        except asyncio.CancelledError:
+            if item.result is not None:
+                item.result.cancel()
+            raise
+        finally:
+            if edit_key is not None and self._edits.get(edit_key) is item:
+                del self._edits[edit_key]
+
+        wait = time.perf_counter() - item.enqueued_at
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        current.set_attribute("outbound.wait_ms", wait * 1000)
+        try:
+            response = await self._send(make_request, bot, item)
+        except Exception as e:
+            if item.result is not None:
+                item.result.set_exception(e)
+            raise
+        self.sent += 1
+        if item.result is not None:
+            item.result.set_result(response)
+        return response
+
+    async def stop(self) -> None:
+        """Дождаться отправки очереди (не дольше DRAIN_TIMEOUT) и остановить планировщик"""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.pending:
+            logger.warning(f"⚠️ При остановке не отправлено сообщений: {self.pending}")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Очередь, отправлено, слито правок, повторов после 429, ожидание"""
+        return {
+            "pending": self.pending,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "wait_seconds_avg": self.wait_seconds_total / self.sent if self.sent else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+outbound = OutboundScheduler()
+register_collector(lambda: OUTBOUND_PENDING.set(outbound.pending))
@@ -0,0 +1,164 @@
+"""
+Профилирование работающего процесса по запросу
+
+Профилирование включается на заданное окно командой администратора
+/profiling или сигналом SIGUSR1 (kill -USR1 <pid>) и пишет в PROFILE_DIR
+два файла:
+
+- .prof — cProfile потока event loop (middleware, обработчики, разбор
+  ответов API); открывается pstats или snakeviz;
+- .folded — свёрнутые стеки всех потоков процесса (event loop, потоки
+  функций БД, потоки QueueListener), снятые сэмплером через
+  sys._current_frames раз в PROFILE_SAMPLE_INTERVAL; из них строится
+  flame graph (flamegraph.pl, speedscope).
+
+Рендеринг графиков выполняется в процессах пула и в профиль не попадает —
+его время видно как ожидание в обработчике и в метриках
+bot_chart_render_seconds.
+
+Профилируется один процесс. В супервизоре /profiling включает его в том
+рабочем процессе, которому досталась команда, а SIGUSR1 главному процессу
+пересылается всем рабочим — каждый пишет свои файлы (с pid в имени).
+
+Пока профилирование выключено, ничего не установлено: ни профайлера,
+ни потока сэмплера, ни middleware — накладных расходов на обновление нет.
+"""
+import asyncio
+import cProfile
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import PROFILE_DIR, PROFILE_SECONDS, PROFILE_SAMPLE_INTERVAL
+
+
+logger = logging.getLogger(__name__)
+
+# Максимальное окно профилирования (сек)
+MAX_SECONDS = 600
+
+_task: Optional[asyncio.Task] = None
+
+
+class StackSampler(threading.Thread):
+    """Поток, периодически снимающий стеки всех потоков процесса"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.stacks[_collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _collapse(thread_name: str, frame) -> str:
+    """Стек в формате flamegraph: поток;внешняя функция;...;текущая функция"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+
+def _write_results(profiler: cProfile.Profile, sampler: StackSampler) -> Dict[str, str]:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"profile-{os.getpid()}-{datetime.now():%Y%m%d-%H%M%S}"
+    prof_path = os.path.join(PROFILE_DIR, f"{name}.prof")
+    folded_path = os.path.join(PROFILE_DIR, f"{name}.folded")
+    profiler.dump_stats(prof_path)
+    with open(folded_path, "w", encoding="utf-8") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return {"prof": prof_path, "folded": folded_path}
+
+
+async def _profile(seconds: float) -> Dict[str, Any]:
+    profiler = cProfile.Profile()
+    sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+    started = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+        sampler.stop()
+    paths = await asyncio.to_thread(_write_results, profiler, sampler)
+    result = {**paths, "seconds": time.perf_counter() - started, "samples": sampler.samples}
+    logger.info(
+        f"🔬 Профиль за {result['seconds']:.0f} с ({sampler.samples} сэмплов): "
+        f"{paths['prof']}, {paths['folded']}"
+    )
+    return result
+
+
+def is_profiling() -> bool:
+    return _task is not None and not _task.done()
+
+
+def start_profiling(
+    seconds: float = PROFILE_SECONDS,
+    on_done: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> bool:
+    """
+    Включить профилирование на seconds секунд (False, если уже включено)
+
+    on_done получает пути к файлам профиля после окончания окна.
+    """
+    global _task
+    if is_profiling():
+        return False
+
+    async def run():
+        try:
+            result = await _profile(min(seconds, MAX_SECONDS))
+            if on_done is not None:
+                await on_done(result)
+        except Exception as e:
+            logger.exception(f"Ошибка профилирования: {e}")
+
+    _task = asyncio.create_task(run())
+    logger.info(f"🔬 Профилирование включено на {min(seconds, MAX_SECONDS):.0f} с")
+    return True
+
+
+def install_signal_handler() -> None:
+    """Включать профилирование на PROFILE_SECONDS по SIGUSR1"""
+    if not hasattr(signal, "SIGUSR1"):
+        return  # Windows
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGUSR1, start_profiling)
+
+
+async def stop_profiling() -> None:
+    """Прервать окно профилирования (без записи результата)"""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    await asyncio.gather(_task, return_exceptions=True)
+    _task = None
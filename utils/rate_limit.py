@@ -0,0 +1,101 @@
+"""
+Ограничение частоты запросов: token bucket на пользователя
+
+Каждому пользователю и классу команд соответствует ведро из capacity
+токенов, которое пополняется со скоростью rate токенов в секунду.
+Запрос тратит один токен; пустое ведро — запрос отклоняется.
+
+Вёдра хранятся в OrderedDict в порядке последнего обращения. Ведро,
+к которому не обращались дольше, чем нужно для полного пополнения,
+ничем не отличается от нового, поэтому такие вёдра удаляются из начала
+словаря — память занимают только активные пользователи.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class TokenBucket:
+    """Ведро токенов: текущий запас и время последнего пересчёта"""
+
+    __slots__ = ("tokens", "updated", "notified")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.notified = False
+
+
+class BucketMap:
+    """
+    Вёдра токенов с одинаковыми параметрами для множества ключей
+
+    capacity — максимальный запас (допустимый всплеск),
+    period — за сколько секунд ведро пополняется целиком.
+    """
+
+    def __init__(self, capacity: int, period: float, max_keys: int = 100000):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.idle_seconds = period
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def _expire(self, now: float) -> None:
+        """Удалить полностью пополнившиеся (неотличимые от новых) вёдра"""
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if now - bucket.updated < self.idle_seconds and len(self._buckets) <= self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def acquire(self, key: Hashable, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Потратить токен
+
+        Returns:
+            (разрешено ли, через сколько секунд появится следующий токен)
+        """
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.capacity, now)
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.notified = False
+            return True, 0.0
+        return False, (1 - bucket.tokens) / self.rate
+
+    def mark_notified(self, key: Hashable) -> bool:
+        """
+        Отметить, что пользователю сообщили об ограничении
+
+        Returns:
+            True, если сообщения ещё не было (с последнего разрешённого запроса)
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.notified:
+            return False
+        bucket.notified = True
+        return True
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def parse_rate(value: str) -> Tuple[int, float]:
+    """Лимит из строки 'запросов/секунд', например '5/60'"""
+    count, period = value.split("/", 1)
+    return int(count), float(period)
+
+
+def build_bucket_maps(rates: Dict[str, str]) -> Dict[str, BucketMap]:
+    """Вёдра для каждого класса команд по строкам лимитов"""
+    return {name: BucketMap(*parse_rate(rate)) for name, rate in rates.items()}
@@ -0,0 +1,51 @@
+"""
+Модуль недавних и любимых продуктов пользователя
+
+Хранит в памяти ограниченный LRU-кэш списков продуктов, которые пользователь
+уже записывал (калорийность на 100 г и типичная порция). Источник истины —
+таблица recent_foods в БД, поэтому кэш переживает только процесс.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import database as db
+
+
+# Сколько продуктов показывать пользователю в клавиатуре
+RECENT_FOODS_LIMIT = 8
+
+# Сколько пользователей держать в памяти одновременно
+RECENT_FOODS_MAX_USERS = 5000
+
+_cache: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+
+
+def get_recent_foods(user_id: int) -> List[Dict[str, Any]]:
+    """Получить недавние продукты пользователя (из памяти или из БД)"""
+    if user_id in _cache:
+        _cache.move_to_end(user_id)
+        return _cache[user_id]
+
+    foods = db.get_recent_foods(user_id, RECENT_FOODS_LIMIT)
+    if not foods:
+        # Старые пользователи: собираем список из истории food_logs
+        db.rebuild_recent_foods(user_id)
+        foods = db.get_recent_foods(user_id, RECENT_FOODS_LIMIT)
+
+    _cache[user_id] = foods
+    if len(_cache) > RECENT_FOODS_MAX_USERS:
+        _cache.popitem(last=False)
+    return foods
+
+
+def find_recent_food(user_id: int, food_id: int) -> Optional[Dict[str, Any]]:
+    """Найти продукт пользователя по id без обращения к внешним API"""
+    for food in get_recent_foods(user_id):
+        if food["id"] == food_id:
+            return food
+    return None
+
+
+def invalidate_recent_foods(user_id: int) -> None:
+    """Сбросить кэш пользователя после новой записи еды"""
+    _cache.pop(user_id, None)
@@ -0,0 +1,242 @@
+"""
+Модуль справочных данных: продукты и коэффициенты тренировок
+
+Исходные данные лежат в версионируемом JSON-файле, который компилируется
+в компактный бинарный индекс. Индекс отображается в память (mmap) только
+для чтения, поэтому несколько процессов бота делят одни и те же страницы.
+При изменении JSON-файла индекс пересобирается и подхватывается без
+перезапуска бота.
+
+Формат индекса (little-endian):
+    заголовок    <4sHIIII: magic, версия формата, версия данных,
+                 число продуктов, число тренировок, смещение пула строк
+    продукты     <IHIHIHf на запись: ключ, название, эмодзи (смещение
+                 и длина в пуле строк), ккал на 100 г — в исходном порядке
+    индекс       <I на запись: номера продуктов, отсортированные по ключу
+    тренировки   <IHf на запись: ключ (смещение и длина), ккал/мин/кг
+    индекс       <I на запись: номера тренировок, отсортированные по ключу
+    пул строк    UTF-8
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from config import REFERENCE_DATA_PATH, REFERENCE_INDEX_PATH
+
+
+MAGIC = b"FWRD"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<4sHIIII")
+FOOD_RECORD = struct.Struct("<IHIHIHf")
+WORKOUT_RECORD = struct.Struct("<IHf")
+INDEX_ENTRY = struct.Struct("<I")
+
+# Как часто проверять, не изменился ли файл с данными (секунды)
+RELOAD_CHECK_SECONDS = 5.0
+
+
+def compile_reference_data(source_path: str = REFERENCE_DATA_PATH,
+                           index_path: str = REFERENCE_INDEX_PATH) -> None:
+    """Скомпилировать JSON-справочник в бинарный индекс"""
+    with open(source_path, encoding="utf-8") as f:
+        source = json.load(f)
+
+    pool = bytearray()
+    pool_offsets: Dict[bytes, int] = {}
+
+    def add_string(text: str) -> Tuple[int, int]:
+        raw = text.encode("utf-8")
+        if raw not in pool_offsets:
+            pool_offsets[raw] = len(pool)
+            pool.extend(raw)
+        return pool_offsets[raw], len(raw)
+
+    foods = list(source.get("foods", {}).items())
+    workouts = list(source.get("workouts", {}).items())
+
+    body = bytearray()
+    for key, value in foods:
+        body += FOOD_RECORD.pack(
+            *add_string(key),
+            *add_string(value["name"]),
+            *add_string(value.get("emoji", "🍽️")),
+            float(value["calories"])
+        )
+    for i in sorted(range(len(foods)), key=lambda i: foods[i][0].encode("utf-8")):
+        body += INDEX_ENTRY.pack(i)
+
+    for key, rate in workouts:
+        body += WORKOUT_RECORD.pack(*add_string(key), float(rate))
+    for i in sorted(range(len(workouts)), key=lambda i: workouts[i][0].encode("utf-8")):
+        body += INDEX_ENTRY.pack(i)
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, int(source.get("version", 0)),
+        len(foods), len(workouts), HEADER.size + len(body)
+    )
+
+    # Пишем во временный файл и атомарно подменяем: процессы, которые уже
+    # отобразили старый индекс, продолжают читать его без ошибок
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.write(pool)
+    os.replace(tmp_path, index_path)
+
+
+class ReferenceCatalog:
+    """Справочник, отображённый в память из бинарного индекса"""
+
+    def __init__(self, index_path: str):
+        self.path = index_path
+        with open(index_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+
+        magic, fmt, version, food_count, workout_count, pool_offset = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Неверный формат справочника: {index_path}")
+
+        self.version = version
+        self.food_count = food_count
+        self.workout_count = workout_count
+        self._foods_offset = HEADER.size
+        self._foods_index_offset = self._foods_offset + food_count * FOOD_RECORD.size
+        self._workouts_offset = self._foods_index_offset + food_count * INDEX_ENTRY.size
+        self._workouts_index_offset = (self._workouts_offset
+                                       + workout_count * WORKOUT_RECORD.size)
+        self._pool_offset = pool_offset
+
+    def close(self) -> None:
+        self._mm.close()
+
+    # ----- низкоуровневый доступ -----
+
+    def _bytes(self, offset: int, length: int) -> bytes:
+        start = self._pool_offset + offset
+        return self._mm[start:start + length]
+
+    def _food_record(self, i: int) -> tuple:
+        return FOOD_RECORD.unpack_from(self._mm, self._foods_offset + i * FOOD_RECORD.size)
+
+    def _workout_record(self, i: int) -> tuple:
+        return WORKOUT_RECORD.unpack_from(
+            self._mm, self._workouts_offset + i * WORKOUT_RECORD.size
+        )
+
+    def _food_dict(self, record: tuple) -> Dict[str, Any]:
+        _, _, name_off, name_len, emoji_off, emoji_len, calories = record
+        calories = round(calories, 2)
+        return {
+            "name": self._bytes(name_off, name_len).decode("utf-8"),
+            "calories": int(calories) if calories.is_integer() else calories,
+            "emoji": self._bytes(emoji_off, emoji_len).decode("utf-8"),
+        }
+
+    def _search(self, key: bytes, count: int, index_offset: int, get_record) -> Optional[tuple]:
+        """Бинарный поиск по отсортированному индексу"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (i,) = INDEX_ENTRY.unpack_from(self._mm, index_offset + mid * INDEX_ENTRY.size)
+            record = get_record(i)
+            current = self._bytes(record[0], record[1])
+            if current == key:
+                return record
+            if current < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    # ----- продукты -----
+
+    def get_food(self, key: str) -> Optional[Dict[str, Any]]:
+        """Точный поиск продукта по ключу"""
+        record = self._search(key.encode("utf-8"), self.food_count,
+                              self._foods_index_offset, self._food_record)
+        return self._food_dict(record) if record else None
+
+    def find_food(self, search_name: str) -> Optional[Dict[str, Any]]:
+        """Точное, а затем частичное совпадение (в исходном порядке записей)"""
+        exact = self.get_food(search_name)
+        if exact:
+            return exact
+
+        search = search_name.encode("utf-8")
+        for i in range(self.food_count):
+            record = self._food_record(i)
+            key = self._bytes(record[0], record[1])
+            if key in search or search in key:
+                return self._food_dict(record)
+        return None
+
+    def iter_foods(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Все продукты в исходном порядке"""
+        for i in range(self.food_count):
+            record = self._food_record(i)
+            yield self._bytes(record[0], record[1]).decode("utf-8"), self._food_dict(record)
+
+    # ----- тренировки -----
+
+    def get_workout_rate(self, key: str) -> Optional[float]:
+        """Коэффициент сжигания калорий для тренировки (ккал/мин на кг)"""
+        record = self._search(key.encode("utf-8"), self.workout_count,
+                              self._workouts_index_offset, self._workout_record)
+        return round(record[2], 4) if record else None
+
+    def find_workout(self, workout_name: str) -> Optional[Tuple[str, float]]:
+        """Частичное совпадение названия тренировки (в исходном порядке)"""
+        search = workout_name.encode("utf-8")
+        for i in range(self.workout_count):
+            key_off, key_len, rate = self._workout_record(i)
+            key = self._bytes(key_off, key_len)
+            if key in search or search in key:
+                return key.decode("utf-8"), round(rate, 4)
+        return None
+
+
+_catalog: Optional[ReferenceCatalog] = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def _index_is_stale() -> bool:
+    """Индекс отсутствует или старше исходного JSON-файла"""
+    try:
+        index_mtime = os.stat(REFERENCE_INDEX_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return True
+    return os.stat(REFERENCE_DATA_PATH).st_mtime_ns > index_mtime
+
+
+def reload_catalog() -> ReferenceCatalog:
+    """Пересобрать индекс при необходимости и переоткрыть справочник"""
+    global _catalog, _last_check
+    with _lock:
+        if _index_is_stale():
+            compile_reference_data()
+
+        stat = os.stat(REFERENCE_INDEX_PATH)
+        if _catalog is None or _catalog.file_id != (stat.st_ino, stat.st_mtime_ns):
+            # Старое отображение не закрываем: на него могут ссылаться
+            # выполняющиеся сейчас запросы, его освободит сборщик мусора
+            _catalog = ReferenceCatalog(REFERENCE_INDEX_PATH)
+        _last_check = time.monotonic()
+        return _catalog
+
+
+def get_catalog() -> ReferenceCatalog:
+    """Получить актуальный справочник (с периодической проверкой обновлений)"""
+    if _catalog is None or time.monotonic() - _last_check > RELOAD_CHECK_SECONDS:
+        return reload_catalog()
+    return _catalog
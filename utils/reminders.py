@@ -0,0 +1,188 @@
+"""
+Напоминания о воде
+
+Пользователь включает напоминания командой /water_reminders с интервалом
+в минутах. Расписание хранится в таблице water_reminders: индекс по
+next_at служит очередью с приоритетом, поэтому одна фоновая задача
+обслуживает любое число пользователей без таймера на каждого.
+
+Задача берёт из БД пачку наступивших напоминаний (REMINDER_BATCH_SIZE)
+одним запросом — сразу с профилем и выпитой за сегодня водой, —
+переносит их на следующий интервал и только потом отправляет, так что
+сбой отправки не приводит к повторам. Норма считается так же, как в
+/log_water, с погодой из кэша по городам. Отставание считается от доли
+нормы, которую к этому часу стоило выпить при равномерном питье в часы
+REMINDER_HOURS: кто идёт по графику, сообщения не получает. Напоминания
+приходят только в часы REMINDER_HOURS и отправляются с низким
+приоритетом через планировщик исходящих сообщений (utils.outbound), не
+мешая ответам на команды.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+import database as db
+from config import REMINDER_HOURS, REMINDER_BATCH_SIZE, REMINDER_POLL_SECONDS
+from utils.calculations import calculate_daily_progress
+from utils.fanout import in_thread
+from utils.outbound import send_priority, BULK
+from utils.weather import get_weather_cached
+
+
+logger = logging.getLogger(__name__)
+
+# Допустимый интервал напоминаний (минут)
+MIN_INTERVAL = 30
+MAX_INTERVAL = 360
+
+DAY_START, DAY_END = (int(hour) for hour in REMINDER_HOURS.split("-", 1))
+
+_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+_stats = {"sent": 0, "on_track": 0, "failed": 0, "unsubscribed": 0}
+
+
+def next_reminder_time(now: datetime, interval_minutes: int) -> datetime:
+    """Время следующего напоминания с учётом часов REMINDER_HOURS"""
+    candidate = now + timedelta(minutes=interval_minutes)
+    day_start = candidate.replace(hour=DAY_START, minute=0, second=0, microsecond=0)
+    if candidate < day_start:
+        return day_start
+    if candidate.hour >= DAY_END:
+        return day_start + timedelta(days=1)
+    return candidate
+
+
+def expected_share(now: datetime) -> float:
+    """Доля дневной нормы, которую стоит выпить к now (равномерно в часы REMINDER_HOURS)"""
+    day_start = now.replace(hour=DAY_START, minute=0, second=0, microsecond=0)
+    elapsed = (now - day_start).total_seconds() / ((DAY_END - DAY_START) * 3600)
+    return min(1.0, max(0.0, elapsed))
+
+
+def reminder_text(reminder: Dict[str, Any], weather: Optional[Dict[str, Any]],
+                  now: datetime) -> Optional[str]:
+    """Текст напоминания или None, если пользователь не отстаёт от графика"""
+    # Калории в напоминании не нужны — считаем только воду
+    progress = calculate_daily_progress(
+        reminder["weight"],
+        reminder["activity_minutes"],
+        0,
+        {"water": reminder["water"], "extra_water": reminder["extra_water"],
+         "calories_consumed": 0, "calories_burned": 0},
+        weather["temp"] if weather else None
+    )
+    water_goal = progress["water_goal"]
+    expected = int(water_goal * expected_share(now))
+    behind = expected - progress["water"]
+    if behind <= 0:
+        return None
+    return (
+        f"💧 Вы отстаёте от графика на {behind} мл: к {now:%H:%M} "
+        f"стоило выпить {expected} мл.\n"
+        f"Выпито {progress['water']} из {water_goal} мл.\n\n"
+        f"Записать: /log_water 250\n"
+        f"Выключить напоминания: /water_reminders off"
+    )
+
+
+async def _send(bot: Bot, user_id: int, text: str) -> None:
+    try:
+        await bot.send_message(user_id, text)
+        _stats["sent"] += 1
+    except TelegramForbiddenError:
+        # Пользователь заблокировал бота
+        await in_thread(db.delete_water_reminder, user_id)
+        _stats["unsubscribed"] += 1
+    except Exception as e:
+        _stats["failed"] += 1
+        logger.error(f"Ошибка отправки напоминания {user_id}: {e}")
+
+
+async def process_due(bot: Bot, now: datetime) -> int:
+    """Обработать одну пачку наступивших напоминаний; вернуть её размер"""
+    started = time.perf_counter()
+    due: List[Dict[str, Any]] = await in_thread(db.get_due_reminders, now, REMINDER_BATCH_SIZE)
+    if not due:
+        return 0
+
+    # Погода один раз на город пачки
+    cities = sorted({r["city"] for r in due if r["city"]})
+    weathers = await asyncio.gather(*(get_weather_cached(city) for city in cities))
+    weather_by_city = dict(zip(cities, weathers))
+
+    await in_thread(db.reschedule_reminders,
+                    [(r["user_id"], next_reminder_time(now, r["interval_minutes"])) for r in due])
+
+    messages = []
+    for reminder in due:
+        text = reminder_text(reminder, weather_by_city.get(reminder["city"]), now)
+        if text is None:
+            _stats["on_track"] += 1
+        else:
+            messages.append((reminder["user_id"], text))
+
+    with send_priority(BULK):
+        await asyncio.gather(*(_send(bot, user_id, text) for user_id, text in messages))
+
+    logger.info(
+        f"⏰ Напоминания: {len(due)} пользователей, отправлено {len(messages)} "
+        f"за {time.perf_counter() - started:.2f} с"
+    )
+    return len(due)
+
+
+async def _run(bot: Bot) -> None:
+    while True:
+        try:
+            processed = await process_due(bot, datetime.now())
+            if processed == REMINDER_BATCH_SIZE:
+                # Пачка полная — наступившие напоминания ещё остались
+                continue
+            next_at = await in_thread(db.get_next_reminder_time)
+        except Exception as e:
+            logger.exception(f"Ошибка обработки напоминаний: {e}")
+            next_at = None
+
+        delay = REMINDER_POLL_SECONDS
+        if next_at is not None:
+            delay = min(delay, max(0.0, (next_at - datetime.now()).total_seconds()))
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+def wake_reminders() -> None:
+    """Проверить расписание сейчас (после изменения настроек пользователем)"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def start_reminders(bot: Bot) -> None:
+    """Запустить фоновую задачу напоминаний"""
+    global _task, _wakeup
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run(bot))
+    logger.info(f"⏰ Напоминания о воде запущены ({DAY_START}:00–{DAY_END}:00)")
+
+
+async def stop_reminders() -> None:
+    """Остановить фоновую задачу напоминаний"""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+
+def get_reminder_stats() -> Dict[str, int]:
+    """Отправлено, пропущено (норма выполнена), ошибок, отписавшихся"""
+    return dict(_stats)
@@ -0,0 +1,228 @@
+"""
+Пул процессов для рендеринга графиков
+
+matplotlib рендерит график сотни миллисекунд чистого CPU, поэтому рендеринг
+вынесен из event loop в отдельные процессы. Процессы запускаются заранее
+и импортируют библиотеку рендеринга при старте, очередь ограничена: если она заполнена,
+вызывающий код получает RenderPoolBusy и может ответить «попробуйте позже».
+
+Там же, в процессе пула, график кодируется под CHART_TARGET_WIDTH
+и CHART_MAX_BYTES (см. utils.image_encoding).
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Any, Optional, Tuple
+
+from config import (
+    CHART_BACKEND, CHART_WORKERS, CHART_QUEUE_SIZE, CHART_RENDER_TIMEOUT,
+    CHART_TARGET_WIDTH, CHART_MAX_BYTES, CHART_FORMATS
+)
+from utils.metrics import CHART_RENDER_SECONDS, CHART_BYTES
+from utils.tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenderPoolBusy(Exception):
+    """Очередь рендеринга заполнена"""
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_in_flight = 0
+
+# Метрики рендеринга
+_stats: Dict[str, Any] = {
+    "renders": 0,
+    "errors": 0,
+    "rejected": 0,
+    "render_seconds_total": 0.0,
+    "render_seconds_max": 0.0,
+    "wait_seconds_total": 0.0,
+    "last_render_seconds": 0.0,
+    "encode_seconds_total": 0.0,
+    "bytes_total": 0,
+    "last_bytes": 0,
+    "last_format": None,
+    "uploads": 0,
+    "upload_seconds_total": 0.0,
+    "last_upload_seconds": 0.0,
+}
+
+
+def _release_slot() -> None:
+    global _in_flight
+    _in_flight -= 1
+
+
+def _on_render_done(loop: asyncio.AbstractEventLoop, _job: Future) -> None:
+    """Вызывается в потоке пула по окончании рендеринга"""
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(_release_slot)
+
+
+def _init_worker(backend: str) -> None:
+    """Инициализация процесса: импортируем библиотеку рендеринга и прогреваем её"""
+    import warnings
+    from utils.charts import get_range_chart_drawer
+    from utils.series import build_range_series
+
+    warnings.filterwarnings("ignore", message="Glyph")  # нет глифов эмодзи в шрифте
+    empty = build_range_series({'water': [], 'food': [], 'workout': []}, 7)
+    _render(get_range_chart_drawer(backend), (empty, 0, 0))
+
+
+def _warmup() -> None:
+    """Пустая задача, чтобы процессы пула запустились заранее"""
+    return None
+
+
+def _render(drawer: Callable, args: tuple) -> Tuple[bytes, str, float, float]:
+    """
+    Нарисовать и закодировать график (выполняется в процессе пула)
+
+    Returns:
+        (байты изображения, формат, время рисования, время кодирования)
+    """
+    from utils.image_encoding import encode_chart
+
+    start = time.perf_counter()
+    image = drawer(*args, width=CHART_TARGET_WIDTH)
+    draw_seconds = time.perf_counter() - start
+    encoded = encode_chart(image, CHART_MAX_BYTES, CHART_FORMATS)
+    return encoded["data"], encoded["format"], draw_seconds, encoded["encode_seconds"]
+
+
+def start_render_pool() -> None:
+    """Запустить пул процессов и прогреть его"""
+    global _executor
+    if _executor is not None:
+        return
+
+    # spawn: дочерние процессы не наследуют event loop и потоки бота
+    _executor = ProcessPoolExecutor(
+        max_workers=CHART_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(CHART_BACKEND,)
+    )
+    for _ in range(CHART_WORKERS):
+        _executor.submit(_warmup)
+    logger.info(f"🖼️ Пул рендеринга графиков: {CHART_WORKERS} процессов ({CHART_BACKEND})")
+
+
+def shutdown_render_pool() -> None:
+    """Остановить пул процессов"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _restart_render_pool(broken: ProcessPoolExecutor) -> None:
+    """Заменить сломанный пул новым, если его ещё не заменил другой вызов"""
+    if _executor is broken:
+        logger.warning("🖼️ Процесс пула рендеринга завершился аварийно, перезапускаем пул")
+        shutdown_render_pool()
+        start_render_pool()
+
+
+async def render_chart(drawer: Callable, *args) -> bytes:
+    """
+    Отрендерить график в пуле процессов
+
+    drawer — функция рисования графика из utils.charts (например,
+    draw_range_progress_chart), args — её аргументы без ширины.
+    Возвращает закодированное изображение (PNG, JPEG или WebP).
+
+    Если процесс пула погиб (OOM, падение, ошибка инициализации), пул
+    перезапускается и рендеринг повторяется один раз.
+
+    Raises:
+        RenderPoolBusy: очередь рендеринга заполнена
+        asyncio.TimeoutError: рендеринг не уложился в CHART_RENDER_TIMEOUT
+        BrokenProcessPool: пул сломался и после перезапуска
+    """
+    global _in_flight
+
+    if _in_flight >= CHART_QUEUE_SIZE:
+        _stats["rejected"] += 1
+        raise RenderPoolBusy()
+
+    if _executor is None:
+        start_render_pool()
+
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    with span("chart.render", **{"chart.drawer": drawer.__name__}) as current:
+        for attempt in range(2):
+            executor = _executor
+            try:
+                # Место в очереди освобождается, когда процесс пула закончил работу:
+                # после таймаута рендеринг продолжается и всё ещё занимает пул
+                job = executor.submit(_render, drawer, args)
+                _in_flight += 1
+                job.add_done_callback(functools.partial(_on_render_done, loop))
+                data, fmt, render_seconds, encode_seconds = await asyncio.wait_for(
+                    asyncio.wrap_future(job), timeout=CHART_RENDER_TIMEOUT
+                )
+                break
+            except BrokenProcessPool:
+                _restart_render_pool(executor)
+                if attempt:
+                    _stats["errors"] += 1
+                    raise
+            except Exception:
+                _stats["errors"] += 1
+                raise
+
+        total_seconds = time.perf_counter() - start
+        wait_seconds = total_seconds - render_seconds - encode_seconds
+        # Этапы выполняются в процессе пула — в трассу они попадают атрибутами
+        current.set_attribute("chart.wait_ms", wait_seconds * 1000)
+        current.set_attribute("chart.draw_ms", render_seconds * 1000)
+        current.set_attribute("chart.encode_ms", encode_seconds * 1000)
+        current.set_attribute("chart.bytes", len(data))
+        current.set_attribute("chart.format", fmt)
+
+    _stats["renders"] += 1
+    _stats["render_seconds_total"] += render_seconds
+    _stats["render_seconds_max"] = max(_stats["render_seconds_max"], render_seconds)
+    _stats["wait_seconds_total"] += wait_seconds
+    _stats["last_render_seconds"] = render_seconds
+    _stats["encode_seconds_total"] += encode_seconds
+    _stats["bytes_total"] += len(data)
+    _stats["last_bytes"] = len(data)
+    _stats["last_format"] = fmt
+    CHART_RENDER_SECONDS.observe(wait_seconds, stage="wait")
+    CHART_RENDER_SECONDS.observe(render_seconds, stage="draw")
+    CHART_RENDER_SECONDS.observe(encode_seconds, stage="encode")
+    CHART_BYTES.observe(len(data))
+
+    logger.info(
+        f"🖼️ График: рендер {render_seconds * 1000:.0f} мс, "
+        f"кодирование {encode_seconds * 1000:.0f} мс ({fmt}, {len(data) // 1024} КБ), "
+        f"ожидание {wait_seconds * 1000:.0f} мс, в очереди {_in_flight}"
+    )
+    if len(data) > CHART_MAX_BYTES:
+        logger.warning(f"🖼️ График {len(data)} байт больше CHART_MAX_BYTES даже при минимальной ширине")
+    return data
+
+
+def record_upload(seconds: float, size: int) -> None:
+    """Учесть время загрузки графика в Telegram"""
+    _stats["uploads"] += 1
+    _stats["upload_seconds_total"] += seconds
+    _stats["last_upload_seconds"] = seconds
+    CHART_RENDER_SECONDS.observe(seconds, stage="upload")
+    logger.info(f"🖼️ График загружен за {seconds * 1000:.0f} мс ({size // 1024} КБ)")
+
+
+def get_render_stats() -> Dict[str, Any]:
+    """Метрики пула рендеринга"""
+    return {**_stats, "in_flight": _in_flight}
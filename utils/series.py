@@ -0,0 +1,205 @@
+"""
+Модуль выравнивания рядов данных для графиков
+
+История из БД приходит разреженной: строки только за дни, когда что-то
+записывалось. Здесь она за один проход раскладывается в плотный массив
+NumPy, индексированный днём от начала периода, — без поиска по списку
+для каждой даты.
+"""
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+# Размер корзины в зависимости от длины периода: число столбцов ограничено
+# (не больше ~31 столбца даже за год)
+BUCKET_DAY = 'day'
+BUCKET_WEEK = 'week'
+BUCKET_MONTH = 'month'
+
+BUCKET_LABEL_FORMATS = {
+    BUCKET_DAY: '%d.%m',
+    BUCKET_WEEK: '%d.%m',
+    BUCKET_MONTH: '%m.%y',
+}
+
+
+def period_dates(end: date, days: int) -> List[date]:
+    """Список дат периода длиной days, заканчивающегося end (включительно)"""
+    start = end - timedelta(days=days - 1)
+    return [start + timedelta(days=i) for i in range(days)]
+
+
+def align_daily(history: List[Dict[str, Any]], value_key: str,
+                start: date, days: int) -> np.ndarray:
+    """
+    Разложить историю [{'date': 'YYYY-MM-DD', value_key: ...}] в плотный массив
+
+    Индекс элемента — номер дня от start; дни без записей равны нулю,
+    строки вне периода отбрасываются.
+    """
+    values = np.zeros(days, dtype=np.float64)
+    if not history:
+        return values
+
+    offsets = (np.array([row['date'] for row in history], dtype='datetime64[D]')
+               - np.datetime64(start, 'D')).astype(np.int64)
+    amounts = np.array([row[value_key] or 0 for row in history], dtype=np.float64)
+
+    in_range = (offsets >= 0) & (offsets < days)
+    values[offsets[in_range]] = amounts[in_range]
+    return values
+
+
+def override_day(values: np.ndarray, start: date, day: date,
+                 value: Optional[float]) -> np.ndarray:
+    """Заменить значение за день (например, сегодня — актуальными данными)"""
+    index = (day - start).days
+    if value is not None and 0 <= index < len(values):
+        values[index] = value
+    return values
+
+
+def goal_colors(values: np.ndarray, goal: float,
+                reached_color: str, missed_color: str) -> np.ndarray:
+    """Цвета столбцов: reached_color там, где значение достигло цели"""
+    return np.where(values >= goal, reached_color, missed_color)
+
+
+def build_week_series(water_history: List[Dict[str, Any]],
+                      food_history: List[Dict[str, Any]],
+                      workout_history: List[Dict[str, Any]],
+                      today_water: Optional[int] = None,
+                      today_consumed: Optional[float] = None,
+                      today_burned: Optional[float] = None,
+                      days: int = 7,
+                      today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Плотные ряды воды и калорий за последние days дней
+
+    Значения за сегодня заменяются актуальными данными, если они переданы.
+    """
+    today = today or date.today()
+    dates = period_dates(today, days)
+    start = dates[0]
+
+    water = override_day(align_daily(water_history, 'amount', start, days),
+                         start, today, today_water)
+    consumed = override_day(align_daily(food_history, 'calories', start, days),
+                            start, today, today_consumed)
+    burned = override_day(align_daily(workout_history, 'calories', start, days),
+                          start, today, today_burned)
+
+    return {
+        'dates': dates,
+        'labels': [d.strftime('%d.%m') for d in dates],
+        'water': water,
+        'consumed': consumed,
+        'burned': burned,
+    }
+
+
+# ==================== ДЛИННЫЕ ПЕРИОДЫ ====================
+
+def choose_bucket(days: int) -> str:
+    """Размер корзины для периода: дни, недели или месяцы"""
+    if days <= 31:
+        return BUCKET_DAY
+    if days <= 120:
+        return BUCKET_WEEK
+    return BUCKET_MONTH
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    """Начало корзины, в которую попадает день (неделя — с понедельника)"""
+    if bucket == BUCKET_WEEK:
+        return day - timedelta(days=day.weekday())
+    if bucket == BUCKET_MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(start: date, end: date, bucket: str) -> List[date]:
+    """Начала всех корзин, пересекающихся с периодом [start, end]"""
+    starts = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        starts.append(current)
+        if bucket == BUCKET_MONTH:
+            current = (current + timedelta(days=32)).replace(day=1)
+        elif bucket == BUCKET_WEEK:
+            current += timedelta(days=7)
+        else:
+            current += timedelta(days=1)
+    return starts
+
+
+def align_buckets(history: List[Dict[str, Any]], value_key: str,
+                  starts: np.ndarray) -> np.ndarray:
+    """
+    Разложить суммы по корзинам [{'date': начало корзины, value_key: ...}]
+    в плотный массив по отсортированным началам корзин starts (datetime64[D])
+    """
+    values = np.zeros(len(starts), dtype=np.float64)
+    if not history:
+        return values
+
+    row_dates = np.array([row['date'] for row in history], dtype='datetime64[D]')
+    amounts = np.array([row[value_key] or 0 for row in history], dtype=np.float64)
+
+    index = np.searchsorted(starts, row_dates)
+    found = index < len(starts)
+    found[found] = starts[index[found]] == row_dates[found]
+    values[index[found]] = amounts[found]
+    return values
+
+
+def build_range_series(totals: Dict[str, List[Dict[str, Any]]],
+                       days: int,
+                       today_water: Optional[int] = None,
+                       today_consumed: Optional[float] = None,
+                       today_burned: Optional[float] = None,
+                       today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Ряды воды и калорий за последние days дней по корзинам
+
+    totals — результат database.get_range_totals. Для дневных корзин значения
+    за сегодня заменяются актуальными данными; для недель и месяцев
+    показывается среднее за день внутри корзины, чтобы столбцы можно было
+    сравнивать с дневной целью.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    bucket = choose_bucket(days)
+    starts = bucket_starts(start, today, bucket)
+    starts_array = np.array(starts, dtype='datetime64[D]')
+
+    water = align_buckets(totals['water'], 'amount', starts_array)
+    consumed = align_buckets(totals['food'], 'calories', starts_array)
+    burned = align_buckets(totals['workout'], 'calories', starts_array)
+
+    if bucket == BUCKET_DAY:
+        last = len(starts) - 1
+        for values, value in ((water, today_water), (consumed, today_consumed),
+                              (burned, today_burned)):
+            if value is not None:
+                values[last] = value
+    else:
+        # Сколько дней каждой корзины попадает в период
+        ends = np.append(starts_array[1:], np.datetime64(today + timedelta(days=1), 'D'))
+        begins = np.maximum(starts_array, np.datetime64(start, 'D'))
+        days_in_bucket = (ends - begins).astype(np.int64)
+        water /= days_in_bucket
+        consumed /= days_in_bucket
+        burned /= days_in_bucket
+
+    label_format = BUCKET_LABEL_FORMATS[bucket]
+    return {
+        'bucket': bucket,
+        'dates': starts,
+        'labels': [d.strftime(label_format) for d in starts],
+        'water': water,
+        'consumed': consumed,
+        'burned': burned,
+    }
@@ -0,0 +1,205 @@
+"""
+Трассировка SQL-запросов
+
+database.get_connection открывает соединение TracingConnection: его
+курсоры замеряют каждый запрос (выполнение и чтение строк) и считают
+строки — прочитанные для SELECT и изменённые для INSERT/UPDATE/DELETE.
+
+Статистика копится по паре (функция database.py, текст запроса) и
+доступна отчётом top-N (команда администратора /sql_report). Запросы
+дольше SQL_SLOW_MS пишутся в лог вместе с EXPLAIN QUERY PLAN: по нему
+видно, каким функциям get_* нужен индекс или предрасчёт. План снимается
+один раз на запрос и дальше берётся из кэша.
+"""
+import functools
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import SQL_SLOW_MS
+
+
+logger = logging.getLogger(__name__)
+
+# Функция database.py, выполняющая запрос (задаёт декоратор database._timed)
+db_function_var: ContextVar[str] = ContextVar("db_function", default="-")
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Запросы, для которых есть план выполнения (DDL в лог медленных не пишется)
+PLANNED_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_lock = threading.Lock()
+# (функция, запрос) -> статистика
+_stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_plans: Dict[str, str] = {}
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalize(sql: str) -> Tuple[str, bool]:
+    """Запрос в одну строку и есть ли у него план выполнения"""
+    text = _WHITESPACE.sub(" ", sql).strip()
+    return text, text.upper().startswith(PLANNED_STATEMENTS)
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Курсор, замеряющий время и число строк каждого запроса"""
+
+    _sql: Optional[str] = None
+
+    def _begin(self, sql: str, params: Any) -> None:
+        self._finish()
+        self._sql = sql
+        self._params = params
+        self._seconds = 0.0
+        self._rows = 0
+        self._function = db_function_var.get()
+
+    def _finish(self) -> None:
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        rows = self._rows if self._rows or self.rowcount < 0 else self.rowcount
+        _record(self, self._function, sql, self._params, self._seconds, rows)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._begin(sql, seq_of_parameters[0] if seq_of_parameters else ())
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._seconds += time.perf_counter() - started
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._seconds += time.perf_counter() - started
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._seconds += time.perf_counter() - started
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class TracingConnection(sqlite3.Connection):
+    """Соединение, курсоры которого трассируют запросы"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors: List[TracingCursor] = []
+
+    def cursor(self, factory=TracingCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, TracingCursor):
+            self._cursors.append(cursor)
+        return cursor
+
+    # Connection.execute создаёт курсор в обход cursor(), поэтому явно
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        # Запросы, строки которых дочитаны не до конца (fetchone), и
+        # изменения завершаются здесь, пока соединение ещё открыто
+        for cursor in self._cursors:
+            cursor._finish()
+        self._cursors.clear()
+        super().close()
+
+
+def _query_plan(conn: sqlite3.Connection, sql: str, params: Any) -> str:
+    """EXPLAIN QUERY PLAN запроса, по строке на шаг с отступами"""
+    cursor = sqlite3.Connection.cursor(conn)
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        depth: Dict[int, int] = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in cursor.fetchall():
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append("  " * (depth[node_id] - 1) + detail)
+        return "\n".join(lines)
+    except sqlite3.Error as e:
+        return f"(план недоступен: {e})"
+    finally:
+        cursor.close()
+
+
+def _record(cursor: TracingCursor, function: str, sql: str, params: Any,
+            seconds: float, rows: int) -> None:
+    text, planned = _normalize(sql)
+    slow = planned and seconds * 1000 >= SQL_SLOW_MS
+    with _lock:
+        stats = _stats.get((function, text))
+        if stats is None:
+            stats = _stats[(function, text)] = {
+                "function": function, "sql": text, "calls": 0, "rows": 0,
+                "seconds_total": 0.0, "seconds_max": 0.0, "slow": 0,
+            }
+        stats["calls"] += 1
+        stats["rows"] += rows
+        stats["seconds_total"] += seconds
+        stats["seconds_max"] = max(stats["seconds_max"], seconds)
+        stats["slow"] += slow
+        plan = _plans.get(text)
+
+    if not slow:
+        return
+    if plan is None:
+        plan = _plans[text] = _query_plan(cursor.connection, sql, params)
+    logger.warning(
+        f"🐢 Медленный запрос ({function}): {seconds * 1000:.0f} мс, строк {rows}\n"
+        f"{text}\nПлан:\n{plan or '-'}"
+    )
+
+
+def get_sql_report(limit: int = 10) -> List[Dict[str, Any]]:
+    """Запросы с наибольшим суммарным временем"""
+    with _lock:
+        items = [dict(stats) for stats in _stats.values()]
+    items.sort(key=lambda stats: stats["seconds_total"], reverse=True)
+    for stats in items:
+        stats["seconds_avg"] = stats["seconds_total"] / stats["calls"]
+        stats["plan"] = _plans.get(stats["sql"])
+    return items[:limit]
+
+
+def reset_sql_stats() -> None:
+    """Начать сбор статистики заново"""
+    with _lock:
+        _stats.clear()
+        _plans.clear()
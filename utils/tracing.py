@@ -0,0 +1,268 @@
+"""
+Трассировка обработки обновлений (спаны, совместимые с OpenTelemetry)
+
+Каждое обновление — отдельная трасса: корневой спан update охватывает
+всю обработку — цепочку middleware, ожидание в полосе и сам обработчик
+(LaneMiddleware ждёт его завершения). Дочерние спаны — обработчик,
+функции database.py, запросы погоды и OpenFoodFacts, рендеринг графика
+и отправка ответа через Bot API. Текущий спан хранится в
+contextvars и вместе с update_id переходит в полосы обработки и потоки
+функций БД (asyncio.to_thread).
+
+Законченные спаны отдаются экспортёру в отдельном потоке:
+
+- file — строки OTLP JSON (ExportTraceServiceRequest) в TRACING_FILE;
+  файл читает OpenTelemetry Collector (приёмник otlpjsonfile), откуда
+  трассы можно отправить в Jaeger или Tempo;
+- console — строка на спан в stdout.
+
+По умолчанию трассировка выключена (TRACING_ENABLED); тогда span()
+возвращает общий пустой контекст и ничего не создаёт. TRACING_SAMPLE_RATE —
+доля трассируемых обновлений.
+"""
+import atexit
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from config import (
+    TRACING_ENABLED, TRACING_EXPORTER, TRACING_FILE, TRACING_SAMPLE_RATE,
+    TRACING_SERVICE_NAME
+)
+from utils.command_classes import command_label
+
+
+# Виды спанов OTLP
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+# Как часто экспортёр записывает накопленные спаны (сек)
+EXPORT_INTERVAL = 1.0
+
+# Коды статуса OTLP
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """Спан: имя, идентификаторы трассы и родителя, время и атрибуты"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id",
+                 "start_ns", "end_ns", "attributes", "status", "status_message")
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+class _NoopSpan:
+    """Спан, который ничего не записывает (трассировка выключена)"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+class _NoopScope:
+    def __enter__(self) -> _NoopSpan:
+        return _NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_NOOP_SCOPE = _NoopScope()
+
+
+class _SpanScope:
+    """Делает спан текущим на время блока with и завершает его"""
+
+    __slots__ = ("span", "token")
+
+    def __init__(self, span: Span):
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        span = self.span
+        span.end_ns = time.time_ns()
+        if exc_type is not None:
+            span.status = STATUS_ERROR
+            span.status_message = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self.token)
+        _export(span)
+        return False
+
+
+def start_trace(name: str, kind: int = SERVER, **attributes: Any):
+    """Начать трассу (с вероятностью TRACING_SAMPLE_RATE): with start_trace('update'):"""
+    if not TRACING_ENABLED or random.random() >= TRACING_SAMPLE_RATE:
+        return _NOOP_SCOPE
+    return _SpanScope(Span(name, kind, f"{random.getrandbits(128):032x}", None, attributes))
+
+
+def span(name: str, kind: int = INTERNAL, **attributes: Any):
+    """
+    Дочерний спан текущей трассы: with span('db.get_user') as s: ...
+
+    Вне трассы (фоновые задачи, трассировка выключена) ничего не создаёт.
+    """
+    parent = _current_span.get() if TRACING_ENABLED else None
+    if parent is None:
+        return _NOOP_SCOPE
+    return _SpanScope(Span(name, kind, parent.trace_id, parent.span_id, attributes))
+
+
+def current_trace_id() -> Optional[str]:
+    """Идентификатор текущей трассы (для логов)"""
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+class TracingMiddleware:
+    """Outer middleware обновлений: корневой спан трассы"""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        attributes = {"bot.update_id": event.update_id, "bot.update_type": event.event_type,
+                      "bot.command": command_label(event.event)}
+        if user:
+            attributes["bot.user_id"] = user.id
+        with start_trace("update", **attributes):
+            return await handler(event, data)
+
+
+# ==================== ЭКСПОРТ ====================
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    data = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)}
+                       for key, value in span.attributes.items()],
+        "status": {"code": span.status, "message": span.status_message},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+
+def _otlp_request(spans: List[Span]) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": TRACING_SERVICE_NAME}}
+        ]},
+        "scopeSpans": [{
+            "scope": {"name": "bot"},
+            "spans": [_otlp_span(span) for span in spans],
+        }],
+    }]}
+
+
+def _console_line(span: Span) -> str:
+    attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+    error = f" ❌ {span.status_message}" if span.status == STATUS_ERROR else ""
+    return (f"🧵 {span.trace_id[:8]} {span.name} "
+            f"{(span.end_ns - span.start_ns) / 1e6:.1f} мс {attributes}{error}\n")
+
+
+class _Exporter(threading.Thread):
+    """Поток, записывающий законченные спаны пачками раз в EXPORT_INTERVAL"""
+
+    def __init__(self):
+        super().__init__(name="tracing-exporter", daemon=True)
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.stopping = threading.Event()
+
+    def _drain(self) -> List[Span]:
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def run(self) -> None:
+        output = open(TRACING_FILE, "a", encoding="utf-8") if TRACING_EXPORTER == "file" else sys.stdout
+        try:
+            # Поток не просыпается на каждый спан, чтобы не отнимать GIL у event loop
+            while not self.stopping.wait(EXPORT_INTERVAL):
+                self._write(output, self._drain())
+            self._write(output, self._drain())
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+    def _write(self, output, batch: List[Span]) -> None:
+        if not batch:
+            return
+        if TRACING_EXPORTER == "file":
+            output.write(json.dumps(_otlp_request(batch), ensure_ascii=False) + "\n")
+        else:
+            output.write("".join(_console_line(span) for span in batch))
+        output.flush()
+
+
+_exporter: Optional[_Exporter] = None
+_exporter_lock = threading.Lock()
+
+
+def _export(span: Span) -> None:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = _Exporter()
+                _exporter.start()
+    _exporter.queue.put(span)
+
+
+def stop_tracing() -> None:
+    """Дописать оставшиеся спаны и остановить экспортёр"""
+    global _exporter
+    with _exporter_lock:
+        exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.stopping.set()
+        exporter.join()
+
+
+atexit.register(stop_tracing)
@@ -1,9 +1,23 @@
 """
 Модуль для получения данных о погоде через OpenWeatherMap API
 """
+import logging
+import time
 import aiohttp
-from typing import Optional, Dict, Any
-from config import WEATHER_API_KEY
+from typing import Optional, Dict, Any, Tuple
+from config import WEATHER_API_KEY, WEATHER_CACHE_TTL
+from utils.metrics import HTTP_REQUEST_SECONDS
+from utils.tracing import span, CLIENT
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько помнить неудачный запрос погоды (сек): сбой сети или API не
+# должен на весь WEATHER_CACHE_TTL убирать поправку на жару
+WEATHER_FAILURE_TTL = 60
+
+# Погода по городам для фоновых задач: город -> (срок годности, данные)
+_weather_cache: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
 
 
 async def get_weather(city: str) -> Optional[Dict[str, Any]]:
@@ -22,26 +36,53 @@ async def get_weather(city: str) -> Optional[Dict[str, Any]]:
         "lang": "ru"  # Описание на русском
     }
     
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "temp": data["main"]["temp"],
-                        "feels_like": data["main"]["feels_like"],
-                        "description": data["weather"][0]["description"],
-                        "humidity": data["main"]["humidity"],
-                        "city_name": data["name"]
-                    }
-                elif response.status == 404:
-                    return None
-                else:
-                    print(f"Ошибка API погоды: {response.status}")
-                    return None
-    except Exception as e:
-        print(f"Ошибка при получении погоды: {e}")
-        return None
+    started = time.perf_counter()
+    status = "error"
+    with span("weather.get_weather", CLIENT, city=city) as current:
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params=params) as response:
+                    status = str(response.status)
+                    if response.status == 200:
+                        data = await response.json()
+                        return {
+                            "temp": data["main"]["temp"],
+                            "feels_like": data["main"]["feels_like"],
+                            "description": data["weather"][0]["description"],
+                            "humidity": data["main"]["humidity"],
+                            "city_name": data["name"]
+                        }
+                    elif response.status == 404:
+                        return None
+                    else:
+                        logger.warning(f"Ошибка API погоды: {response.status}")
+                        return None
+        except Exception as e:
+            logger.error(f"Ошибка при получении погоды: {e}")
+            return None
+        finally:
+            current.set_attribute("http.status_code", status)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                         service="weather", status=status)
+
+
+async def get_weather_cached(city: str) -> Optional[Dict[str, Any]]:
+    """
+    Погода из кэша, если она получена не раньше WEATHER_CACHE_TTL секунд
+    назад. Для фоновых задач, которые обходят много пользователей одного
+    города: API запрашивается не чаще раза за TTL на город. Неудача
+    (город не найден, ошибка сети или API) кэшируется на WEATHER_FAILURE_TTL
+    """
+    key = city.strip().lower()
+    now = time.monotonic()
+    cached = _weather_cache.get(key)
+    if cached is not None and now < cached[0]:
+        return cached[1]
+    
+    weather = await get_weather(city)
+    ttl = WEATHER_CACHE_TTL if weather is not None else WEATHER_FAILURE_TTL
+    _weather_cache[key] = (now + ttl, weather)
+    return weather
 
 
 def get_extra_water_for_weather(temperature: float) -> int:
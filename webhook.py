@@ -0,0 +1,134 @@
+"""
+Режим webhook: приём обновлений встроенным aiohttp-сервером
+
+Telegram присылает обновления POST-запросами на WEBHOOK_URL + WEBHOOK_PATH.
+Сервер проверяет секрет из заголовка X-Telegram-Bot-Api-Secret-Token,
+сразу отвечает 200 и кладёт обновление в очередь, из которой его берут
+WEBHOOK_WORKERS обработчиков. Telegram не ждёт окончания обработки
+и может держать до WEBHOOK_MAX_CONNECTIONS keep-alive соединений.
+
+Если очередь заполнена, сервер отвечает 503 — Telegram повторит доставку
+позже, а обновление не теряется.
+"""
+import asyncio
+import hmac
+import json
+import logging
+from typing import Any, Dict, List
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_KEEPALIVE, WEBHOOK_MAX_CONNECTIONS
+)
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Сколько секунд ждать обработки оставшихся в очереди обновлений при остановке
+DRAIN_TIMEOUT = 10.0
+
+
+class WebhookServer:
+    """aiohttp-приложение webhook с очередью обработки обновлений"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: str = WEBHOOK_SECRET,
+                 workers: int = WEBHOOK_WORKERS, queue_size: int = WEBHOOK_QUEUE_SIZE):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret.encode()
+        self.workers = workers
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=queue_size)
+        self.received = 0
+        self.rejected = 0
+        self.failed = 0
+        self._tasks: List[asyncio.Task] = []
+
+        self.app = web.Application()
+        self.app.router.add_post(WEBHOOK_PATH, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Принять обновление: проверить секрет, поставить в очередь и сразу ответить"""
+        secret = request.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(secret, self.secret):
+            return web.Response(status=401)
+
+        try:
+            update = json.loads(await request.read())
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dp.feed_raw_update(self.bot, update)
+            except Exception as e:
+                self.failed += 1
+                logger.exception(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def start_workers(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop_workers(self) -> None:
+        """Дождаться обработки очереди (не дольше DRAIN_TIMEOUT) и остановить обработчики"""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ При остановке не обработано обновлений: {self.queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Зарегистрировать webhook в Telegram и обслуживать его до остановки"""
+    server = WebhookServer(dp, bot)
+    workflow_data = {"dispatcher": dp, "bot": bot, "bots": [bot]}
+
+    await dp.emit_startup(**workflow_data)
+    server.start_workers()
+
+    runner = web.AppRunner(server.app, keepalive_timeout=WEBHOOK_KEEPALIVE,
+                           access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True
+    )
+    logger.info(
+        f"🌐 Webhook: {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}, "
+        f"обработчиков {server.workers}, очередь {server.queue.maxsize}"
+    )
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await server.stop_workers()
+        logger.info(
+            f"🌐 Webhook остановлен: принято {server.received}, "
+            f"отклонено {server.rejected}, ошибок {server.failed}"
+        )
+        await dp.emit_shutdown(**workflow_data)